@@ -1,34 +1,75 @@
 from django.contrib import admin
 
-from .models import Device, DeviceHistory, UserProfile
+from .models import Device, DeviceHistory, DeviceModel, UserProfile, imei_to_int
+from .pagination import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables that grow into millions of rows."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Поле с целочисленным IMEI: полный IMEI в поиске ищется по уникальному индексу.
+    imei_number_lookup = None
+    # Префикс запроса → текстовое поле. Поиск по подстроке читает всю таблицу, поэтому
+    # он не входит в search_fields и включается только явно: «comment: текст».
+    prefixed_search_fields = {}
+
+    def get_search_results(self, request, queryset, search_term):
+        prefix, _, text = search_term.partition(':')
+        field = self.prefixed_search_fields.get(prefix.strip().lower()) if text.strip() else None
+        if field:
+            return queryset.filter(**{f'{field}__icontains': text.strip()}), False
+        imei_number = imei_to_int(search_term)
+        if self.imei_number_lookup and imei_number is not None:
+            return queryset.filter(**{self.imei_number_lookup: imei_number}), False
+        return super().get_search_results(request, queryset, search_term)
 
 
 @admin.register(Device)
-class DeviceAdmin(admin.ModelAdmin):
+class DeviceAdmin(LargeTableAdmin):
     list_display = ('imei', 'model_name', 'status', 'date_added', 'added_by')
-    search_fields = ('imei', 'model_name', 'comment')
-    list_filter = ('status', 'date_added')
-    autocomplete_fields = ('added_by',)
+    list_select_related = ('added_by',)
+    search_fields = ('^imei', '^model_name')
+    prefixed_search_fields = {'comment': 'comment'}
+    search_help_text = 'Полный IMEI, начало IMEI или модели; «comment: текст» — поиск по комментарию (медленнее)'
+    imei_number_lookup = 'imei_number'
+    list_filter = ('status',)
+    date_hierarchy = 'date_added'
+    autocomplete_fields = ('added_by', 'device_model')
+
+
+@admin.register(DeviceModel)
+class DeviceModelAdmin(admin.ModelAdmin):
+    list_display = ('brand', 'name', 'model_code', 'created_at')
+    list_filter = ('brand',)
+    search_fields = ('^brand', '^name', '=model_code')
 
 
 @admin.register(DeviceHistory)
-class DeviceHistoryAdmin(admin.ModelAdmin):
+class DeviceHistoryAdmin(LargeTableAdmin):
     list_display = ('device', 'previous_status', 'new_status', 'changed_by', 'changed_at')
-    list_filter = ('new_status', 'changed_at')
-    search_fields = ('device__imei', 'changed_by__username')
+    list_select_related = ('device', 'changed_by')
+    list_filter = ('new_status',)
+    date_hierarchy = 'changed_at'
+    search_fields = ('^changed_by__username',)
+    search_help_text = 'Полный IMEI устройства или начало логина'
+    imei_number_lookup = 'device__imei_number'
+    raw_id_fields = ('device', 'changed_by')
 
 
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('username', 'email', 'role', 'can_delete_devices', 'updated_at')
+    list_select_related = ('user',)
     list_filter = ('role', 'can_delete_devices')
     search_fields = ('user__username', 'user__email', 'user__first_name', 'user__last_name')
-    
+
     def username(self, obj):
         return obj.user.username
     username.short_description = 'Логин'
-    
+
     def email(self, obj):
         return obj.user.email
-    email.short_description = 'Email'
\ No newline at end of file
+    email.short_description = 'Email'
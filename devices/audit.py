@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import base64
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from typing import AsyncIterator, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import DeviceHistory
+
+AUDIT_FIELDS = (
+    'id',
+    'changed_at',
+    'device_id',
+    'device__imei',
+    'changed_by_id',
+    'changed_by__username',
+    'previous_status',
+    'new_status',
+    'previous_comment',
+    'new_comment',
+)
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class InvalidCursor(ValueError):
+    """The ``after`` token was not produced by encode_cursor."""
+
+
+def _parse_moment(value: str, end_of_day: bool = False) -> Optional[datetime]:
+    """ISO datetime, or a date meaning its start (``end_of_day``: the start of the next day)."""
+    value = (value or '').strip()
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Некорректная дата: {value}')
+        moment = datetime.combine(day + timedelta(days=1) if end_of_day else day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def audit_queryset(params: Mapping[str, str]) -> QuerySet:
+    """History across all devices, filtered by ?user, ?from_status, ?to_status, ?since and ?until.
+
+    ``since`` is inclusive, ``until`` exclusive; a bare date in ``until``
+    covers that whole day. Raises ValueError for unparsable values.
+    """
+    queryset = DeviceHistory.objects.all()
+    user = (params.get('user') or '').strip()
+    if user:
+        if not user.isdigit():
+            raise ValueError('Параметр user должен быть id пользователя')
+        queryset = queryset.filter(changed_by_id=int(user))
+    from_status = (params.get('from_status') or '').strip()
+    if from_status:
+        queryset = queryset.filter(previous_status=from_status)
+    to_status = (params.get('to_status') or '').strip()
+    if to_status:
+        queryset = queryset.filter(new_status=to_status)
+    since = _parse_moment(params.get('since'))
+    if since:
+        queryset = queryset.filter(changed_at__gte=since)
+    until = _parse_moment(params.get('until'), end_of_day=True)
+    if until:
+        queryset = queryset.filter(changed_at__lt=until)
+    return queryset
+
+
+def encode_cursor(changed_at: datetime, pk: int) -> str:
+    # Целые микросекунды, без float: курсор должен совпадать со значением в базе точно.
+    micros = (changed_at - EPOCH) // MICROSECOND
+    return base64.urlsafe_b64encode(f'{micros}:{pk}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> Tuple[datetime, int]:
+    # Курсор приходит из URL: любой мусор в нём — InvalidCursor, а не 500.
+    # binascii.Error и UnicodeDecodeError — подклассы ValueError.
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        micros, pk = (int(part) for part in raw.split(':'))
+        if not 0 < pk < 2 ** 63:
+            raise ValueError(pk)  # в bigint базы такой id не влезет
+        return EPOCH + micros * MICROSECOND, pk
+    except (ValueError, OverflowError):
+        raise InvalidCursor('Некорректный курсор')
+
+
+def _after(queryset: QuerySet, cursor: Optional[Tuple[datetime, int]]) -> QuerySet:
+    # Ключевая пагинация: (changed_at, id) строго «старше» последней отданной строки,
+    # по индексу без OFFSET — страница N стоит столько же, сколько первая.
+    queryset = queryset.order_by('-changed_at', '-id')
+    if cursor is None:
+        return queryset
+    changed_at, pk = cursor
+    return queryset.filter(Q(changed_at__lt=changed_at) | Q(changed_at=changed_at, id__lt=pk))
+
+
+def _serialize(row: Dict) -> Dict:
+    return {
+        'id': row['id'],
+        'changed_at': row['changed_at'].isoformat(),
+        'device_id': row['device_id'],
+        'imei': row['device__imei'],
+        'user_id': row['changed_by_id'],
+        'username': row['changed_by__username'],
+        'from_status': row['previous_status'],
+        'to_status': row['new_status'],
+        'previous_comment': row['previous_comment'],
+        'comment': row['new_comment'],
+    }
+
+
+def keyset_page(queryset: QuerySet, after: str = '', limit: int = 100) -> Tuple[list, Optional[str]]:
+    """One page of history entries (objects or ``values()`` rows), newest first.
+
+    Returns the page and the cursor for the next one, None on the last page.
+    """
+    cursor = decode_cursor(after) if after else None
+    items = list(_after(queryset, cursor)[: limit + 1])
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        if isinstance(last, dict):
+            next_cursor = encode_cursor(last['changed_at'], last['id'])
+        else:
+            next_cursor = encode_cursor(last.changed_at, last.pk)
+    return items, next_cursor
+
+
+def audit_page(queryset: QuerySet, after: str = '', limit: int = 100) -> Tuple[List[Dict], Optional[str]]:
+    rows, next_cursor = keyset_page(queryset.values(*AUDIT_FIELDS), after, limit)
+    return [_serialize(row) for row in rows], next_cursor
+
+
+def iter_audit_rows(queryset: QuerySet, chunk_size: int = 2000) -> Iterator[Dict]:
+    """Every matching row, newest first, read in keyset chunks so memory stays flat."""
+    cursor = None
+    while True:
+        rows = list(_after(queryset, cursor).values(*AUDIT_FIELDS)[:chunk_size])
+        for row in rows:
+            yield _serialize(row)
+        if len(rows) < chunk_size:
+            return
+        cursor = (rows[-1]['changed_at'], rows[-1]['id'])
+
+
+async def aiter_audit_rows(queryset: QuerySet, chunk_size: int = 2000) -> AsyncIterator[Dict]:
+    """Async twin of iter_audit_rows for ASGI, where a sync iterator would be buffered whole."""
+    cursor = None
+    while True:
+        rows = [row async for row in _after(queryset, cursor).values(*AUDIT_FIELDS)[:chunk_size]]
+        for row in rows:
+            yield _serialize(row)
+        if len(rows) < chunk_size:
+            return
+        cursor = (rows[-1]['changed_at'], rows[-1]['id'])
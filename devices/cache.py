@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import time
+import uuid
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+
+_MISSING = object()
+DATA_VERSION_KEY = 'data:version'
+
+
+class TwoTierCache:
+    """Small per-process LRU (``local``) in front of the shared ``default`` cache.
+
+    Each local entry remembers when it was last confirmed against the
+    shared tier and is re-read from there at most once per
+    ``check_interval`` seconds, so another worker's ``set`` or ``delete``
+    of that key becomes visible here within that interval. Versions are
+    tracked per key: a write never invalidates other keys of the
+    namespace, and there is no shared counter for concurrent writers to
+    race on. The local tier is shared with row fragments and other
+    per-process caches, so it is never cleared as a whole.
+    """
+
+    def __init__(
+        self,
+        local_alias: str = 'local',
+        shared_alias: str = 'default',
+        local_timeout: int | None = None,
+        check_interval: float | None = None,
+        namespace: str = 'twotier',
+    ):
+        self.namespace = namespace
+        self.local_alias = local_alias
+        self.shared_alias = shared_alias
+        self.local_timeout = local_timeout
+        self.check_interval = check_interval
+
+    @property
+    def local(self):
+        return caches[self.local_alias]
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _local_timeout(self, timeout):
+        limit = self.local_timeout
+        if limit is None:
+            limit = getattr(settings, 'LOCAL_CACHE_TIMEOUT', 300)
+        return limit if timeout is None else min(timeout, limit)
+
+    def _local_key(self, key: str) -> str:
+        return f'{self.namespace}:{key}'
+
+    def _check_interval(self) -> float:
+        if self.check_interval is None:
+            return getattr(settings, 'LOCAL_CACHE_CHECK_INTERVAL', 2)
+        return self.check_interval
+
+    def _store_local(self, key: str, value: Any, timeout: int | None) -> None:
+        # Рядом со значением — момент последней сверки с общим уровнем.
+        self.local.set(self._local_key(key), (value, time.monotonic()), timeout=self._local_timeout(timeout))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self.local.get(self._local_key(key))
+        if entry is not None:
+            value, checked_at = entry
+            if time.monotonic() - checked_at < self._check_interval():
+                return value
+        value = self.shared.get(key, _MISSING)
+        if value is _MISSING:
+            if entry is not None:
+                self.local.delete(self._local_key(key))
+            return default
+        self._store_local(key, value, None)
+        return value
+
+    def set(self, key: str, value: Any, timeout: int | None = None) -> None:
+        self.shared.set(key, value, timeout=timeout)
+        self._store_local(key, value, timeout)
+
+    def delete(self, key: str) -> None:
+        self.shared.delete(key)
+        self.local.delete(self._local_key(key))
+
+
+lookup_cache = TwoTierCache(namespace='imeicheck')
+
+
+def shared_cache():
+    """The cross-worker tier; counters and locks must always live here."""
+    return caches['default']
+
+
+def derived_cache():
+    """Tier for values rebuilt from the database: row fragments, facet and count results.
+
+    The shared tier when it is a separate service, so workers reuse each
+    other's work. With DatabaseCache as the shared tier, storing them there
+    would turn every cold page read into INSERTs; they stay per process then.
+    """
+    shared = caches['default']
+    if isinstance(shared, DatabaseCache):
+        return caches['local']
+    return shared
+
+
+def data_version() -> str:
+    """Opaque stamp that changes on every Device, DeviceHistory or UserProfile write.
+
+    A random token rather than a counter, so losing the key (eviction, cache
+    flush) produces a new stamp instead of reviving an old one.
+    """
+    cache = shared_cache()
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(DATA_VERSION_KEY, version, timeout=None):
+            version = cache.get(DATA_VERSION_KEY, version)
+    return version
+
+
+def bump_data_version() -> None:
+    shared_cache().set(DATA_VERSION_KEY, uuid.uuid4().hex, timeout=None)
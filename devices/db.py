@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import logging
+import re
+from itertools import islice
+from typing import Iterator, List
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+SQLITE_PRAGMA_NAMES = frozenset(
+    {'auto_vacuum', 'journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size'}
+)
+_PRAGMA_VALUE_RE = re.compile(r'^-?\w+$')
+
+
+def apply_sqlite_pragmas(connection) -> None:
+    """Apply settings.SQLITE_PRAGMAS to a freshly opened SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            value = str(value or '').strip()
+            if not value:
+                continue
+            if name not in SQLITE_PRAGMA_NAMES or not _PRAGMA_VALUE_RE.match(value):
+                logger.warning('Пропущена некорректная прагма SQLite: %s=%s', name, value)
+                continue
+            cursor.execute(f'PRAGMA {name}={value}')
+
+
+def optimize_database(using: str = DEFAULT_DB_ALIAS) -> None:
+    """Refresh planner statistics and give freed pages back after a large purge."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA optimize')
+        # No-op unless the file was created (or VACUUMed) with auto_vacuum=incremental.
+        cursor.execute('PRAGMA incremental_vacuum')
+
+
+def maybe_optimize_after_purge(deleted: int, using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Run optimize_database when a purge removed at least SQLITE_OPTIMIZE_AFTER_PURGE rows."""
+    threshold = getattr(settings, 'SQLITE_OPTIMIZE_AFTER_PURGE', 500)
+    if threshold <= 0 or deleted < threshold:
+        return False
+    optimize_database(using)
+    return True
+
+
+def estimated_row_count(model, using: str = DEFAULT_DB_ALIAS) -> int | None:
+    """Planner statistics for the model's table, or None when the database has none.
+
+    SQLite reads sqlite_stat1 (filled by ANALYZE / PRAGMA optimize), Postgres
+    reads pg_class.reltuples. Both may lag behind the real row count.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # sqlite_stat1 appears only after the first ANALYZE.
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s AND idx IS NULL', [table])
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] >= 0 else None
+    return None
+
+
+def iterator_chunk_size() -> int:
+    return getattr(settings, 'DB_ITERATOR_CHUNK_SIZE', 2000)
+
+
+def iter_pk_batches(queryset, batch_size: int | None = None) -> Iterator[List]:
+    """Primary keys of ``queryset`` in lists of ``batch_size``, for batched deletes.
+
+    On PostgreSQL the keys stream from a server-side cursor, so a purge never
+    holds the full key list. SQLite has no such cursor and keeps reading the
+    same table we are deleting from, so there the (small) key list is read
+    up front.
+    """
+    batch_size = batch_size or iterator_chunk_size()
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    if connections[queryset.db].vendor == 'postgresql':
+        keys = pks.iterator(chunk_size=batch_size)
+    else:
+        keys = iter(list(pks))
+    while batch := list(islice(keys, batch_size)):
+        yield batch
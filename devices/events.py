@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from datetime import timedelta
+from typing import Optional, Set, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Device, DeviceEvent
+
+BATCH_SIZE = 100
+HEARTBEAT_SECONDS = 15
+
+
+def event_type_for_transition(previous_status: str, new_status: str) -> Optional[str]:
+    if previous_status == new_status:
+        return None
+    if new_status == Device.STATUS_TRASH:
+        return DeviceEvent.Types.TRASHED
+    if previous_status == Device.STATUS_TRASH:
+        return DeviceEvent.Types.RESTORED
+    return DeviceEvent.Types.STATUS_CHANGED
+
+
+def record_device_event(device: Device, event_type: str, previous_status: str = '') -> DeviceEvent:
+    added_by = device.added_by
+    return DeviceEvent.objects.create(
+        device_id=device.pk,
+        event_type=event_type,
+        status=device.status,
+        previous_status=previous_status,
+        payload={
+            'imei': device.imei,
+            'model_name': device.model_name,
+            'status_label': device.get_status_display(),
+            'added_by': added_by.get_short_name() or added_by.username,
+            'date_added': timezone.localtime(device.date_added).strftime('%d.%m.%Y %H:%M'),
+        },
+    )
+
+
+def latest_event_id() -> int:
+    return DeviceEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def parse_last_event_id(raw: str | None) -> Optional[int]:
+    try:
+        return max(int(raw), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_stream_cursor(raw: str | None) -> Optional[Tuple[int, int]]:
+    """(cursor, floor) from an SSE event id written by stream_id, None if absent or malformed.
+
+    A plain number, as sent by older pages, is both the cursor and the floor.
+    """
+    cursor_raw, _, floor_raw = (raw or '').partition(':')
+    cursor = parse_last_event_id(cursor_raw)
+    if cursor is None:
+        return None
+    floor = parse_last_event_id(floor_raw)
+    return cursor, cursor if floor is None else min(floor, cursor)
+
+
+def stream_id(cursor: int, floor: int) -> str:
+    return f'{cursor}:{floor}'
+
+
+def format_event(event: DeviceEvent, cursor: int, floor: int) -> str:
+    data = {
+        'event_id': event.pk,
+        'type': event.event_type,
+        'device_id': event.device_id,
+        'status': event.status,
+        'previous_status': event.previous_status,
+        **event.payload,
+    }
+    return f'id: {stream_id(cursor, floor)}\nevent: device\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def _new_events(cursor: int):
+    return DeviceEvent.objects.filter(id__gt=cursor).order_by('id')[:BATCH_SIZE]
+
+
+def _late_events(cursor: int, floor: int):
+    """Recent events below the cursor, read again in case they committed late.
+
+    Primary keys are handed out at INSERT, not at COMMIT: on PostgreSQL a
+    transaction holding id 10 can commit after the one holding id 11, and a
+    reader that already moved its cursor to 11 would never see 10. Events
+    created within DEVICE_EVENTS_REORDER_WINDOW are sent again and the client
+    drops the ones it has already applied by ``event_id``. Nothing at or below
+    ``floor``, where this page's stream started, is read again: the page was
+    rendered with those changes.
+    """
+    window = getattr(settings, 'DEVICE_EVENTS_REORDER_WINDOW', 10)
+    return DeviceEvent.objects.filter(
+        id__gt=floor, id__lte=cursor, created_at__gte=timezone.now() - timedelta(seconds=window)
+    ).order_by('-id')[:BATCH_SIZE]
+
+
+def _stream_limits():
+    poll = getattr(settings, 'DEVICE_EVENTS_POLL_INTERVAL', 2)
+    lifetime = getattr(settings, 'DEVICE_EVENTS_STREAM_TIMEOUT', 300)
+    return poll, lifetime
+
+
+def event_poll(cursor: int, floor: int) -> str:
+    """One-shot SSE body for WSGI: what is in the log now, then the connection closes.
+
+    A sync worker must not sit in a polling loop for the stream lifetime, so
+    under WSGI the browser polls instead: ``retry`` makes EventSource
+    reconnect after the poll interval and the ``id`` line carries the cursor
+    into its Last-Event-ID header, even when there was nothing to send.
+    """
+    poll, _ = _stream_limits()
+    parts = [f'retry: {int(poll * 1000)}\nid: {stream_id(cursor, floor)}\n\n']
+    for event in _late_events(cursor, floor):
+        parts.append(format_event(event, cursor, floor))
+    for event in _new_events(cursor):
+        cursor = event.pk
+        parts.append(format_event(event, cursor, floor))
+    return ''.join(parts)
+
+
+async def aevent_stream(cursor: int, floor: int):
+    """SSE body for ASGI: poll the log until the stream lifetime ends, without holding a thread.
+
+    The browser reconnects on close and sends Last-Event-ID, so nothing is lost.
+    """
+    poll, lifetime = _stream_limits()
+    started = last_beat = time.monotonic()
+    sent: Set[int] = set()
+    yield f'retry: {int(poll * 1000)}\nid: {stream_id(cursor, floor)}\n\n'
+    while time.monotonic() - started < lifetime:
+        late = [event async for event in _late_events(cursor, floor) if event.pk not in sent]
+        events = [event async for event in _new_events(cursor)]
+        for event in late:
+            sent.add(event.pk)
+            yield format_event(event, cursor, floor)
+        for event in events:
+            sent.add(event.pk)
+            cursor = event.pk
+            yield format_event(event, cursor, floor)
+        if not events and not late and time.monotonic() - last_beat >= HEARTBEAT_SECONDS:
+            last_beat = time.monotonic()
+            yield ': ping\n\n'
+        if len(events) < BATCH_SIZE:
+            await asyncio.sleep(poll)
+
+
+def prune_device_events() -> int:
+    days = getattr(settings, 'DEVICE_EVENTS_RETENTION_DAYS', 7)
+    # DELETED — единственная запись о полном удалении: по ней inventory.day_deltas досчитывает
+    # остатки за любой день в прошлом, поэтому срок хранения ленты на неё не распространяется.
+    expired = DeviceEvent.objects.filter(created_at__lt=timezone.now() - timedelta(days=days))
+    deleted, _ = expired.exclude(event_type=DeviceEvent.Types.DELETED).delete()
+    return deleted
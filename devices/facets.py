@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import hashlib
+from collections import Counter
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, QuerySet
+
+from .cache import data_version, derived_cache
+
+# Параметр запроса → поле группировки.
+FACET_FIELDS = {
+    'status': 'status',
+    'user': 'added_by_id',
+    'brand': 'device_model__brand',
+}
+
+
+def _normalize(facet: str, value) -> Optional[str]:
+    if value is None or value == '':
+        return None
+    value = str(value).strip()
+    return value.casefold() if facet == 'brand' else value
+
+
+def _grouped_counts(queryset: QuerySet) -> List[Tuple]:
+    """(status, added_by_id, brand, count) for ``queryset``, cached until the next device write.
+
+    The key is the query's SQL, so two requests that differ only in how the
+    filter was spelled (parameter order, page, sort) share one entry, and the
+    data version in the key drops every entry as soon as a device changes.
+    """
+    queryset = queryset.order_by()
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(f'{queryset.db}|{sql}|{params!r}'.encode(), usedforsecurity=False).hexdigest()
+    cache_key = f'facets:{data_version()}:{digest}'
+    cache = derived_cache()
+    groups = cache.get(cache_key)
+    if groups is None:
+        groups = list(
+            queryset.values_list(*FACET_FIELDS.values()).annotate(total=Count('id')).order_by()
+        )
+        cache.set(cache_key, groups, timeout=getattr(settings, 'COUNT_CACHE_TIMEOUT', 300))
+    return groups
+
+
+def facet_counts(queryset: QuerySet, selected: Mapping[str, str]) -> Dict[str, Counter]:
+    """Counts per status, adding user and brand for the filtered list.
+
+    ``queryset`` carries every filter except the facets themselves; one
+    grouped query over it is enough to answer all three. Each facet is
+    counted under the other two selections but not its own, so the numbers
+    show what picking a different value would return. Brands are keyed in
+    casefold, devices without a catalog entry are left out of the brand facet.
+    """
+    chosen = {facet: _normalize(facet, selected.get(facet)) for facet in FACET_FIELDS}
+    counts: Dict[str, Counter] = {facet: Counter() for facet in FACET_FIELDS}
+    for *values, total in _grouped_counts(queryset):
+        row = {facet: _normalize(facet, value) for facet, value in zip(FACET_FIELDS, values)}
+        for facet in FACET_FIELDS:
+            if row[facet] is None:
+                continue
+            if all(chosen[other] in (None, row[other]) for other in FACET_FIELDS if other != facet):
+                counts[facet][row[facet]] += total
+    return counts
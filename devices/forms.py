@@ -1,7 +1,5 @@
 from django import forms
 from django.contrib.auth import get_user_model
-from crispy_forms.helper import FormHelper
-from crispy_forms.layout import Column, Layout, Row, Submit
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
 from .models import Device, UserProfile
@@ -18,6 +16,10 @@ class DeviceForm(forms.ModelForm):
         }
 
     def __init__(self, *args, **kwargs):
+        # crispy-формы нужны только при отрисовке формы, а не при загрузке URLconf
+        from crispy_forms.helper import FormHelper
+        from crispy_forms.layout import Column, Layout, Row, Submit
+
         super().__init__(*args, **kwargs)
         self.fields['status'].choices = Device.PUBLIC_STATUS_CHOICES
         self.helper = FormHelper()
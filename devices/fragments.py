@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Iterable, List
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .cache import derived_cache
+
+# Bump when templates/devices/_device_row.html changes so old fragments are ignored.
+ROW_TEMPLATE_VERSION = 1
+
+
+def _row_cache_key(device, is_manager: bool, can_delete: bool, is_owner: bool) -> str:
+    author = device.added_by
+    author_hash = hashlib.md5(
+        f'{author.username}|{author.get_full_name()}'.encode(), usedforsecurity=False
+    ).hexdigest()[:8]
+    flags = f'{int(is_manager)}{int(can_delete)}{int(is_owner)}'
+    return (
+        f'device_row:v{ROW_TEMPLATE_VERSION}:{device.pk}:'
+        f'{device.updated_at.timestamp():.6f}:{flags}:{author_hash}'
+    )
+
+
+def render_device_rows(devices: Iterable, user, is_manager: bool, can_delete: bool) -> List[str]:
+    """Render the device table rows, reusing cached fragments.
+
+    Keys include the device's updated_at, so a save produces a new key and the
+    old fragment simply ages out; nothing has to be deleted. Lookups hit the
+    per-process tier first and the derived tier (see derived_cache) with one
+    get_many for the rest.
+    """
+    devices = list(devices)
+    keyed = []
+    for device in devices:
+        is_owner = device.added_by_id == user.pk
+        keyed.append((_row_cache_key(device, is_manager, can_delete, is_owner), device, is_owner))
+    keys = [key for key, _, _ in keyed]
+
+    local = caches['local']
+    shared = derived_cache()
+    found = local.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing and shared is not local:
+        from_shared = shared.get_many(missing)
+        if from_shared:
+            local.set_many(from_shared)
+            found.update(from_shared)
+
+    timeout = getattr(settings, 'DEVICE_ROW_CACHE_TIMEOUT', 24 * 60 * 60)
+    rendered = {}
+    for key, device, is_owner in keyed:
+        if key in found or key in rendered:
+            continue
+        rendered[key] = str(render_to_string('devices/_device_row.html', {
+            'device': device,
+            'is_manager': is_manager,
+            'can_delete': can_delete,
+            'is_owner': is_owner,
+        }))
+    if rendered:
+        if shared is not local:
+            shared.set_many(rendered, timeout=timeout)
+        local.set_many(rendered, timeout=min(timeout, getattr(settings, 'LOCAL_CACHE_TIMEOUT', 300)))
+        found.update(rendered)
+
+    return [mark_safe(found[key]) for key in keys]
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import importlib.util
+import os
+import subprocess
+import sys
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Dict, Iterable, List
+
+
+class LazyModule(ModuleType):
+    """Stand-in that imports the real module on first attribute access.
+
+    Unlike importlib's LazyLoader it never swaps its own class or
+    ``__dict__`` while another thread reads from it: the import goes through
+    the regular import lock and attributes are then looked up on the real
+    module. Attributes set on the stand-in (``mock.patch``) shadow the
+    module's own.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_lazy_lock'] = threading.Lock()
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with self.__dict__['_lazy_lock']:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Module object for ``name`` whose code runs on first attribute access.
+
+    Keeps the usual ``module.attr`` call sites (and ``mock.patch`` targets
+    such as ``devices.services.requests.get``) while moving the import cost
+    out of process start-up. Safe to use from several threads at once. An
+    already imported module is returned as is.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+    return LazyModule(name)
+
+
+@dataclass
+class ImportTiming:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(lines: Iterable[str]) -> List[ImportTiming]:
+    """Rows of ``python -X importtime`` output, in the order they were printed."""
+    timings = []
+    for line in lines:
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        if not self_us.strip().isdigit():
+            continue  # строка заголовка
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        timings.append(ImportTiming(name.strip(), int(self_us), int(cumulative_us), depth))
+    return timings
+
+
+def profile_imports(targets: Iterable[str], settings_module: str) -> List[ImportTiming]:
+    """Import ``targets`` after django.setup() in a fresh interpreter and return the timings.
+
+    A subprocess is the only way to see cold start-up: in the current
+    process everything is already in ``sys.modules``.
+    """
+    code = 'import django; django.setup()\n' + ''.join(f'import {target}\n' for target in targets)
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, env=env, check=False
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+    return parse_importtime(result.stderr.splitlines())
+
+
+def totals_by_package(timings: Iterable[ImportTiming]) -> Dict[str, int]:
+    """Self time per top-level package, microseconds."""
+    totals: Dict[str, int] = defaultdict(int)
+    for timing in timings:
+        totals[timing.module.split('.', 1)[0]] += timing.self_us
+    return dict(totals)
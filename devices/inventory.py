@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+from .models import Device, DeviceEvent, DeviceHistory, InventorySnapshot
+
+
+def _day_bounds(day: date) -> Tuple[datetime, datetime]:
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def current_counts() -> Counter:
+    rows = Device.objects.values('model_name', 'status').annotate(total=Count('id')).order_by()
+    return Counter({(row['model_name'], row['status']): row['total'] for row in rows})
+
+
+def snapshot_counts(day: date) -> Counter:
+    rows = InventorySnapshot.objects.filter(day=day).values_list('model_name', 'status', 'count')
+    return Counter({(model_name, status): count for model_name, status, count in rows})
+
+
+def day_deltas(day: date) -> Counter:
+    """How the (model, status) counts changed during ``day``.
+
+    Added devices count under the status they were created with (the first
+    history entry's previous status, or the current one if there is none);
+    every history entry moves one unit between statuses; hard deletions come
+    from the DELETED events. History does not track model renames, so a
+    renamed device is counted under its current model name.
+    """
+    start, end = _day_bounds(day)
+    deltas: Counter = Counter()
+
+    created = list(
+        Device.objects.filter(date_added__gte=start, date_added__lt=end).values_list('id', 'model_name', 'status')
+    )
+    initial_status: Dict[int, str] = {}
+    first_entries = (
+        DeviceHistory.objects.filter(device_id__in=[pk for pk, _, _ in created])
+        .exclude(previous_status=F('new_status'))
+        .order_by('device_id', 'changed_at', 'id')
+        .values_list('device_id', 'previous_status')
+    )
+    for device_id, previous_status in first_entries:
+        initial_status.setdefault(device_id, previous_status)
+    for pk, model_name, status in created:
+        deltas[(model_name, initial_status.get(pk, status))] += 1
+
+    moves = (
+        DeviceHistory.objects.filter(changed_at__gte=start, changed_at__lt=end)
+        .exclude(previous_status=F('new_status'))
+        .values('device__model_name', 'previous_status', 'new_status')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    for row in moves:
+        deltas[(row['device__model_name'], row['previous_status'])] -= row['total']
+        deltas[(row['device__model_name'], row['new_status'])] += row['total']
+
+    deleted = DeviceEvent.objects.filter(
+        event_type=DeviceEvent.Types.DELETED, created_at__gte=start, created_at__lt=end
+    ).values_list('status', 'payload')
+    for status, payload in deleted:
+        deltas[(payload.get('model_name', ''), status)] -= 1
+    return deltas
+
+
+def _apply(counts: Counter, deltas: Counter, sign: int = 1) -> Counter:
+    # Промежуточные значения не обрезаем: при обратном проходе отрицательный шаг
+    # компенсируется следующими днями, а обрезка на каждом шаге копила бы дрейф.
+    result = Counter(counts)
+    for key, delta in deltas.items():
+        result[key] += sign * delta
+    return Counter({key: value for key, value in result.items() if value})
+
+
+def _store(day: date, counts: Counter) -> None:
+    # Отрицательный остаток в сохранённом снимке возможен только при дрейфе
+    # (например, удалённая история) — в таблицу пишем только положительные.
+    with transaction.atomic():
+        InventorySnapshot.objects.filter(day=day).delete()
+        InventorySnapshot.objects.bulk_create(
+            [
+                InventorySnapshot(day=day, model_name=model_name, status=status, count=count)
+                for (model_name, status), count in sorted(counts.items())
+                if count > 0
+            ],
+            batch_size=500,
+        )
+
+
+def take_snapshots(until: Optional[date] = None, backfill_days: int = 0) -> List[date]:
+    """Write end-of-day snapshots for every missing day up to ``until`` (default: yesterday).
+
+    Each day is the previous snapshot plus that day's deltas, so re-running is
+    a no-op once caught up. With no snapshots yet, the last day is derived from
+    the live table by undoing the deltas of the days after it, and
+    ``backfill_days`` more days are reconstructed backwards the same way.
+    Returns the days written.
+    """
+    today = timezone.localdate()
+    until = min(until or today - timedelta(days=1), today)
+    latest = InventorySnapshot.objects.aggregate(latest=Max('day'))['latest']
+    written: List[date] = []
+
+    if latest is None:
+        counts = current_counts()
+        day = today
+        while day > until:
+            counts = _apply(counts, day_deltas(day), sign=-1)
+            day -= timedelta(days=1)
+        _store(until, counts)
+        written.append(until)
+        for _ in range(backfill_days):
+            counts = _apply(counts, day_deltas(day), sign=-1)
+            day -= timedelta(days=1)
+            _store(day, counts)
+            written.append(day)
+        return written
+
+    counts = snapshot_counts(latest)
+    day = latest + timedelta(days=1)
+    while day <= until:
+        counts = _apply(counts, day_deltas(day))
+        _store(day, counts)
+        written.append(day)
+        day += timedelta(days=1)
+    return written
+
+
+def stock_trend(start: date, end: date, status: str = Device.STATUS_IN_STOCK, model_name: Optional[str] = None) -> List[Dict]:
+    """Daily counts for ``status`` between ``start`` and ``end``, oldest first, from snapshots only."""
+    snapshots = InventorySnapshot.objects.filter(day__range=(start, end), status=status)
+    if model_name is not None:
+        snapshots = snapshots.filter(model_name=model_name)
+    return list(snapshots.order_by('day', 'model_name').values('day', 'model_name', 'count'))
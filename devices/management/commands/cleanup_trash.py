@@ -1,10 +1,14 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
+from devices.db import iter_pk_batches, maybe_optimize_after_purge
+from devices.events import prune_device_events
 from devices.models import Device
 
 class Command(BaseCommand):
     help = 'Удаляет устройства из корзины старше 30 дней'
+    # Проверки загружают URLconf со всеми представлениями; для cron-задачи это лишний старт.
+    requires_system_checks = []
     
     def handle(self, *args, **options):
         thirty_days_ago = timezone.now() - timedelta(days=30)
@@ -13,9 +17,15 @@ class Command(BaseCommand):
             deleted_at__lt=thirty_days_ago
         )
         
-        count = old_devices.count()
-        old_devices.delete()
+        # Пачками: delete() собирает объекты (и их историю) в памяти ради сигналов.
+        count = 0
+        for batch in iter_pk_batches(old_devices):
+            Device.objects.filter(pk__in=batch).delete()
+            count += len(batch)
         
         self.stdout.write(
             self.style.SUCCESS(f'Удалено {count} устройств из корзины старше 30 дней')
-        )
\ No newline at end of file
+        )
+        pruned = prune_device_events()
+        if maybe_optimize_after_purge(count + pruned):
+            self.stdout.write('Выполнены PRAGMA optimize и incremental_vacuum')
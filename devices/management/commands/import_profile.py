@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from devices.imports import profile_imports, totals_by_package
+
+# Что загружает воркер при первом запросе: URLconf тянет все представления.
+DEFAULT_TARGETS = ('imei_manager.urls',)
+
+
+class Command(BaseCommand):
+    help = 'Показывает, сколько времени уходит на импорт модулей при старте (python -X importtime)'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'modules', nargs='*', help='Модули для импорта после django.setup() (по умолчанию URLconf проекта)'
+        )
+        parser.add_argument('--top', type=int, default=20, help='Сколько самых медленных модулей показать')
+        parser.add_argument(
+            '--by-package', action='store_true', help='Суммировать собственное время по пакетам верхнего уровня'
+        )
+
+    def handle(self, *args, **options):
+        targets = options['modules'] or list(DEFAULT_TARGETS)
+        try:
+            timings = profile_imports(targets, settings.SETTINGS_MODULE)
+        except RuntimeError as exc:
+            raise CommandError(f'Импорт не удался: {exc}')
+
+        total_ms = sum(timing.self_us for timing in timings) / 1000
+        self.stdout.write(f'Всего: {total_ms:.1f} мс, модулей: {len(timings)}')
+        if options['by_package']:
+            rows = sorted(totals_by_package(timings).items(), key=lambda item: -item[1])[: options['top']]
+            for package, self_us in rows:
+                self.stdout.write(f'{self_us / 1000:9.1f} мс  {package}')
+            return
+
+        self.stdout.write(f'{"своё, мс":>9}  {"всего, мс":>9}  модуль')
+        for timing in sorted(timings, key=lambda t: -t.cumulative_us)[: options['top']]:
+            self.stdout.write(
+                f'{timing.self_us / 1000:9.1f}  {timing.cumulative_us / 1000:9.1f}  {"  " * timing.depth}{timing.module}'
+            )
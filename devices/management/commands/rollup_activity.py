@@ -0,0 +1,33 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from devices.models import OperatorDailyActivity
+from devices.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Досчитывает сводку активности операторов по дням (с последнего посчитанного дня)'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Пересчитать начиная с даты ГГГГ-ММ-ДД')
+        parser.add_argument('--full', action='store_true', help='Пересчитать всю сводку заново')
+
+    def handle(self, *args, **options):
+        if options['full'] and options['since']:
+            # --full стёр бы всю сводку, а пересчёт с --since восстановил бы только её хвост.
+            raise CommandError('--full и --since взаимоисключающие: --since уже пересчитывает всё с указанной даты')
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('Дата должна быть в формате ГГГГ-ММ-ДД')
+        if options['full']:
+            # Пустая таблица пересчитывается целиком.
+            OperatorDailyActivity.objects.all().delete()
+        start = rebuild_rollups(since)
+        label = start.isoformat() if start else 'начала'
+        self.stdout.write(self.style.SUCCESS(f'Сводка активности пересчитана с {label}'))
+
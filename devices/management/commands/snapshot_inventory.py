@@ -0,0 +1,36 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from devices.inventory import take_snapshots
+from devices.models import InventorySnapshot
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError('Дата должна быть в формате ГГГГ-ММ-ДД')
+
+
+class Command(BaseCommand):
+    help = 'Записывает остатки на конец дня по моделям и статусам за все недостающие дни'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until', help='Последний день снимка ГГГГ-ММ-ДД (по умолчанию вчера)')
+        parser.add_argument('--rebuild-from', help='Удалить снимки начиная с даты ГГГГ-ММ-ДД и посчитать заново')
+        parser.add_argument(
+            '--backfill', type=int, default=0, help='При первом запуске восстановить ещё N дней назад по истории'
+        )
+
+    def handle(self, *args, **options):
+        until = _parse_date(options['until']) if options['until'] else None
+        if options['rebuild_from']:
+            InventorySnapshot.objects.filter(day__gte=_parse_date(options['rebuild_from'])).delete()
+        written = take_snapshots(until=until, backfill_days=options['backfill'])
+        if written:
+            first, last = min(written), max(written)
+            self.stdout.write(self.style.SUCCESS(f'Снимков записано: {len(written)} ({first} — {last})'))
+        else:
+            self.stdout.write('Снимки уже актуальны')
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+PRIMARY_PIN_COOKIE = 'primary_pin'
+SAFE_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'TRACE'})
+
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """After a write, keep the client's reads on primary for REPLICA_PIN_SECONDS.
+
+    A short-lived cookie rather than session state: it is visible to every
+    worker and costs no database write. Views that read from the replica
+    (see ``ReplicaReadMixin``) skip it while the cookie is present, so users
+    see their own changes despite replication lag.
+    """
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE,
+                '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10),
+                httponly=True,
+                samesite='Lax',
+                secure=request.is_secure(),
+            )
+        return response
+
+
+def is_pinned_to_primary(request) -> bool:
+    return PRIMARY_PIN_COOKIE in request.COOKIES
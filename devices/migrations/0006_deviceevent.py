@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-19 08:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0005_userprofile_is_super_admin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.BigIntegerField(verbose_name='ID устройства')),
+                ('event_type', models.CharField(choices=[('created', 'Добавлено'), ('status_changed', 'Изменён статус'), ('trashed', 'Перемещено в корзину'), ('restored', 'Восстановлено')], max_length=20, verbose_name='Событие')),
+                ('status', models.CharField(choices=[('in_stock', 'В наличии'), ('sold', 'Продано'), ('written_off', 'Списан'), ('trash', 'В корзине')], max_length=20, verbose_name='Статус')),
+                ('previous_status', models.CharField(blank=True, choices=[('in_stock', 'В наличии'), ('sold', 'Продано'), ('written_off', 'Списан'), ('trash', 'В корзине')], max_length=20, verbose_name='Был статус')),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Когда')),
+            ],
+            options={
+                'verbose_name': 'Событие устройства',
+                'verbose_name_plural': 'События устройств',
+                'ordering': ['id'],
+            },
+        ),
+    ]
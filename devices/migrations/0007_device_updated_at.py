@@ -0,0 +1,20 @@
+# Generated by Django 5.1.2 on 2026-10-19 08:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0006_deviceevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Изменено'),
+            preserve_default=False,
+        ),
+    ]
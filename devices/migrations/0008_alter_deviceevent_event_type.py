@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0007_device_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deviceevent',
+            name='event_type',
+            field=models.CharField(choices=[('created', 'Добавлено'), ('status_changed', 'Изменён статус'), ('trashed', 'Перемещено в корзину'), ('restored', 'Восстановлено'), ('deleted', 'Удалено навсегда')], max_length=20, verbose_name='Событие'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-19 08:52
+
+from django.db import migrations, models
+
+
+def backfill_imei_number(apps, schema_editor):
+    Device = apps.get_model('devices', 'Device')
+    batch = []
+    for device in Device.objects.only('pk', 'imei').iterator(chunk_size=2000):
+        imei = (device.imei or '').strip()
+        if len(imei) == 15 and imei.isdigit():
+            device.imei_number = int(imei)
+            batch.append(device)
+        if len(batch) >= 2000:
+            Device.objects.bulk_update(batch, ['imei_number'])
+            batch = []
+    if batch:
+        Device.objects.bulk_update(batch, ['imei_number'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0008_alter_deviceevent_event_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='imei_number',
+            field=models.BigIntegerField(editable=False, null=True, unique=True, verbose_name='IMEI (число)'),
+        ),
+        migrations.RunPython(backfill_imei_number, migrations.RunPython.noop),
+    ]
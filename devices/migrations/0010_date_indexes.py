@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-19 08:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0009_device_imei_number'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='device',
+            name='date_added',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AlterField(
+            model_name='devicehistory',
+            name='changed_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Когда'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-19 09:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0010_date_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OperatorDailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('kind', models.CharField(choices=[('added', 'Добавлено'), ('sold', 'Продано'), ('written_off', 'Списано')], max_length=20, verbose_name='Действие')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to=settings.AUTH_USER_MODEL, verbose_name='Оператор')),
+            ],
+            options={
+                'verbose_name': 'Активность оператора за день',
+                'verbose_name_plural': 'Активность операторов по дням',
+                'ordering': ['-day', 'user_id', 'kind'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'user', 'kind'), name='unique_operator_daily_activity')],
+            },
+        ),
+    ]
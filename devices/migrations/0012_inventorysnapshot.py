@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-19 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0011_operatordailyactivity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('model_name', models.CharField(blank=True, max_length=255, verbose_name='Модель телефона')),
+                ('status', models.CharField(choices=[('in_stock', 'В наличии'), ('sold', 'Продано'), ('written_off', 'Списан'), ('trash', 'В корзине')], max_length=20, verbose_name='Статус')),
+                ('count', models.PositiveIntegerField(verbose_name='Количество')),
+            ],
+            options={
+                'verbose_name': 'Снимок остатков',
+                'verbose_name_plural': 'Снимки остатков',
+                'ordering': ['-day', 'model_name', 'status'],
+                'indexes': [models.Index(fields=['status', 'day'], name='inventory_status_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'model_name', 'status'), name='unique_inventory_snapshot')],
+            },
+        ),
+    ]
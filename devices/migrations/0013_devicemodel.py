@@ -0,0 +1,73 @@
+# Generated by Django 5.1.2 on 2026-10-19 09:05
+
+import re
+
+import django.db.models.deletion
+import django.db.models.functions.text
+import django.utils.timezone
+from django.db import migrations, models
+
+# Копия devices.models.split_model_name на момент миграции: код приложения может измениться,
+# а миграция должна разбирать названия так же, как при первом применении.
+_FORMATTED_MODEL_RE = re.compile(r'^\((?P<brand>[^)]*)\)\s*-\s*(?P<name>.+)$')
+
+
+def split_model_name(value):
+    value = ' '.join((value or '').split())
+    match = _FORMATTED_MODEL_RE.match(value)
+    if match:
+        return match['brand'].strip(), match['name'].strip()
+    return '', value
+
+
+def backfill_device_models(apps, schema_editor):
+    Device = apps.get_model('devices', 'Device')
+    DeviceModel = apps.get_model('devices', 'DeviceModel')
+    entries = {}
+    tacs = {}
+    for model_name, imei in Device.objects.exclude(model_name='').values_list('model_name', 'imei').iterator():
+        brand, name = split_model_name(model_name)
+        if name:
+            tacs.setdefault((brand.lower(), name.lower()), set()).add(imei[:8])
+            entries.setdefault((brand.lower(), name.lower()), (brand, name))
+    by_key = {}
+    for key, (brand, name) in entries.items():
+        by_key[key] = DeviceModel.objects.create(brand=brand, name=name, tacs=sorted(tacs[key]))
+    for model_name in Device.objects.exclude(model_name='').values_list('model_name', flat=True).distinct():
+        brand, name = split_model_name(model_name)
+        entry = by_key.get((brand.lower(), name.lower()))
+        if entry is not None:
+            Device.objects.filter(model_name=model_name).update(device_model=entry)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0012_inventorysnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('brand', models.CharField(blank=True, db_index=True, max_length=100, verbose_name='Бренд')),
+                ('name', models.CharField(max_length=255, verbose_name='Модель')),
+                ('model_code', models.CharField(blank=True, max_length=100, verbose_name='Код модели')),
+                ('tacs', models.JSONField(blank=True, default=list, verbose_name='TAC')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Добавлена')),
+            ],
+            options={
+                'verbose_name': 'Модель устройства',
+                'verbose_name_plural': 'Модели устройств',
+                'ordering': ['brand', 'name'],
+                'constraints': [models.UniqueConstraint(django.db.models.functions.text.Lower('brand'), django.db.models.functions.text.Lower('name'), name='unique_device_model_ci')],
+            },
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='device_model',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='devices', to='devices.devicemodel', verbose_name='Модель (справочник)'),
+        ),
+        migrations.RunPython(backfill_device_models, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-19 09:14
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_missing_profiles(apps, schema_editor):
+    # Профиль больше не досоздаётся при каждом сохранении пользователя — добиваем старые записи один раз.
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserProfile = apps.get_model('devices', 'UserProfile')
+    missing = User.objects.filter(profile__isnull=True).values_list('pk', flat=True)
+    UserProfile.objects.bulk_create([UserProfile(user_id=pk) for pk in missing], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0013_devicemodel'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
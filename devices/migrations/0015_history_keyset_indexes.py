@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-19 09:19
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0014_create_missing_profiles'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='devicehistory',
+            name='changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Когда'),
+        ),
+        migrations.AddIndex(
+            model_name='devicehistory',
+            index=models.Index(fields=['changed_at', 'id'], name='history_changed_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='devicehistory',
+            index=models.Index(fields=['changed_by', 'changed_at', 'id'], name='history_user_changed_at_idx'),
+        ),
+    ]
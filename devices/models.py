@@ -1,7 +1,10 @@
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
-from django.db import models
+import re
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 User = get_user_model()
@@ -25,6 +28,121 @@ def validate_imei(value: str) -> None:
     if not luhn_checksum(value):
         raise ValidationError("IMEI не прошел проверку по алгоритму Луна.")
 
+def imei_to_int(value) -> int | None:
+    """Integer form of a 15-digit IMEI, or None if the value is not one."""
+    value = str(value or '').strip()
+    if len(value) != 15 or not value.isdigit():
+        return None
+    return int(value)
+
+class DeviceQuerySet(models.QuerySet):
+    # save() выставляет imei_number сам; массовые операции его обходят, поэтому число считаем здесь.
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.imei_number = imei_to_int(obj.imei)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'imei' in fields:
+            objs = list(objs)
+            for obj in objs:
+                obj.imei_number = imei_to_int(obj.imei)
+            fields = [*fields, 'imei_number']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        if isinstance(kwargs.get('imei'), str):
+            kwargs.setdefault('imei_number', imei_to_int(kwargs['imei']))
+        return super().update(**kwargs)
+
+    def with_imei(self, imei):
+        """Exact IMEI match through the integer unique index."""
+        number = imei_to_int(imei)
+        if number is None:
+            return self.none()
+        return self.filter(imei_number=number)
+
+_FORMATTED_MODEL_RE = re.compile(r'^\((?P<brand>[^)]*)\)\s*-\s*(?P<name>.+)$')
+
+
+def split_model_name(value: str) -> tuple[str, str]:
+    """"(brand) - model" from the IMEI lookup → (brand, model); other text → ('', text)."""
+    value = ' '.join((value or '').split())
+    match = _FORMATTED_MODEL_RE.match(value)
+    if match:
+        return match['brand'].strip(), match['name'].strip()
+    return '', value
+
+
+class DeviceModelQuerySet(models.QuerySet):
+    def resolve(self, brand: str, name: str, model_code: str = '', tac: str = ''):
+        """Catalog entry for (brand, name), ignoring case; created on first use."""
+        brand, name = brand.strip(), name.strip()
+        if not name:
+            return None
+        entry = self.filter(brand__iexact=brand, name__iexact=name).first()
+        if entry is None:
+            try:
+                with transaction.atomic():
+                    entry = self.create(brand=brand, name=name, model_code=model_code, tacs=[tac] if tac else [])
+            except IntegrityError:
+                entry = self.get(brand__iexact=brand, name__iexact=name)
+            else:
+                return entry
+        entry.remember(model_code=model_code, tac=tac)
+        return entry
+
+    def brand_ids(self, brand: str):
+        return self.filter(brand__iexact=brand.strip()).values('pk')
+
+    def brands(self) -> list[str]:
+        return list(self.exclude(brand='').order_by('brand').values_list('brand', flat=True).distinct())
+
+    def for_model_name(self, model_name: str, tac: str = ''):
+        brand, name = split_model_name(model_name)
+        return self.resolve(brand, name, tac=tac)
+
+
+class DeviceModel(models.Model):
+    """Справочник моделей: заполняется из ответов IMEI-сервиса и существующих model_name."""
+
+    brand = models.CharField(max_length=100, blank=True, db_index=True, verbose_name="Бренд")
+    name = models.CharField(max_length=255, verbose_name="Модель")
+    model_code = models.CharField(max_length=100, blank=True, verbose_name="Код модели")
+    tacs = models.JSONField(default=list, blank=True, verbose_name="TAC")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Добавлена")
+
+    objects = DeviceModelQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['brand', 'name']
+        constraints = [
+            models.UniqueConstraint(Lower('brand'), Lower('name'), name='unique_device_model_ci'),
+        ]
+        verbose_name = "Модель устройства"
+        verbose_name_plural = "Модели устройств"
+
+    def __str__(self):
+        return self.display_name
+
+    @property
+    def display_name(self) -> str:
+        return f"({self.brand}) - {self.name}" if self.brand else self.name
+
+    def remember(self, model_code: str = '', tac: str = '') -> None:
+        """Record a newly seen model code or TAC (8-digit IMEI prefix) for this model."""
+        update_fields = []
+        if model_code and not self.model_code:
+            self.model_code = model_code
+            update_fields.append('model_code')
+        if tac and tac not in self.tacs:
+            self.tacs = [*self.tacs, tac]
+            update_fields.append('tacs')
+        if update_fields:
+            self.save(update_fields=update_fields)
+
+
 class Device(models.Model):
     STATUS_IN_STOCK = 'in_stock'
     STATUS_SOLD = 'sold'
@@ -44,13 +162,25 @@ class Device(models.Model):
         (STATUS_WRITTEN_OFF, 'Списан'),
     ]
 
+    # Уникальность держится на самой строке IMEI: imei_number заполняет ORM, а не база,
+    # и строка, вставленная в обход (сырой SQL), не должна обойти защиту от дубликатов.
     imei = models.CharField(
         max_length=15,
         unique=True,
         verbose_name="IMEI",
         validators=[RegexValidator(r'^\d{15}$', "Допустимы только 15 цифр"), validate_imei],
     )
+    # Уникальный индекс по числу: вдвое меньше строкового и сравнивается как integer — по нему идут поиски.
+    imei_number = models.BigIntegerField(unique=True, null=True, editable=False, verbose_name="IMEI (число)")
     model_name = models.CharField(max_length=255, blank=True, verbose_name="Модель телефона")
+    device_model = models.ForeignKey(
+        DeviceModel,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="devices",
+        verbose_name="Модель (справочник)",
+    )
     status = models.CharField(
         max_length=20,
         choices=STATUS_CHOICES,
@@ -58,7 +188,7 @@ class Device(models.Model):
         verbose_name="Статус",
     )
     comment = models.TextField(blank=True, verbose_name="Комментарий")
-    date_added = models.DateTimeField(auto_now_add=True, verbose_name="Дата добавления")
+    date_added = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Дата добавления")
     added_by = models.ForeignKey(
         User,
         on_delete=models.PROTECT,
@@ -66,40 +196,43 @@ class Device(models.Model):
         related_name="devices",
     )
     deleted_at = models.DateTimeField(null=True, blank=True)
-    
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Изменено")
+
+    objects = DeviceQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_model_name = instance.__dict__.get('model_name')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.imei_number = imei_to_int(self.imei)
+        update_fields = kwargs.get('update_fields')
+        extra_fields = {'imei_number'} if update_fields is not None and 'imei' in update_fields else set()
+        if update_fields is None or 'model_name' in update_fields:
+            # Справочник ищем, если модель ещё не привязана или model_name изменился после загрузки.
+            renamed = not self._state.adding and self.model_name != getattr(self, '_loaded_model_name', None)
+            if self.device_model_id is None or renamed:
+                self.device_model = DeviceModel.objects.for_model_name(self.model_name, tac=self.imei[:8])
+                extra_fields.add('device_model')
+            self._loaded_model_name = self.model_name
+        if update_fields is not None and extra_fields:
+            kwargs['update_fields'] = {*update_fields, *extra_fields}
+        super().save(*args, **kwargs)
+
     def soft_delete(self, user=None):
         """Мягкое удаление устройства"""
-        self.status = self.STATUS_TRASH
-        self.deleted_at = timezone.now()
-        self.save()
-        
-        # Логируем действие
-        if user:
-            log_device_history(
-                device=self,
-                changed_by=user,
-                previous_status=self.status,  # Сохраняем предыдущий статус
-                new_status=self.STATUS_TRASH,
-                previous_comment=self.comment,
-                new_comment=self.comment,
-            )
+        from .transitions import transition_device  # transitions импортирует модели
+
+        return transition_device(self, self.STATUS_TRASH, changed_by=user)
     
     def restore(self, user=None):
         """Восстановление устройства из корзины"""
-        self.status = self.STATUS_IN_STOCK
-        self.deleted_at = None
-        self.save()
-        
-        # Логируем действие
-        if user:
-            log_device_history(
-                device=self,
-                changed_by=user,
-                previous_status=self.STATUS_TRASH,
-                new_status=self.STATUS_IN_STOCK,
-                previous_comment=self.comment,
-                new_comment=self.comment,
-            )
+        from .transitions import transition_device
+
+        return transition_device(self, self.STATUS_IN_STOCK, changed_by=user, expected_status=self.STATUS_TRASH)
+
     def days_until_permanent_deletion(self):
         """Возвращает количество дней до полного удаления"""
         if self.status != self.STATUS_TRASH or not self.deleted_at:
@@ -131,6 +264,11 @@ class DeviceHistory(models.Model):
 
     class Meta:
         ordering = ['-changed_at']
+        # Ключевая пагинация журнала идёт по (changed_at, id): общий и по пользователю.
+        indexes = [
+            models.Index(fields=['changed_at', 'id'], name='history_changed_at_id_idx'),
+            models.Index(fields=['changed_by', 'changed_at', 'id'], name='history_user_changed_at_idx'),
+        ]
         verbose_name = "История устройства"
         verbose_name_plural = "История устройств"
 
@@ -165,4 +303,75 @@ class UserProfile(models.Model):
 
     def __str__(self):
         role_display = "Суперадмин" if self.is_super_admin else self.get_role_display()
-        return f"{self.user.get_username()} ({role_display})"
\ No newline at end of file
+        return f"{self.user.get_username()} ({role_display})"
+
+class DeviceEvent(models.Model):
+    """Compact append-only log of device changes, polled by the live update feed."""
+
+    class Types(models.TextChoices):
+        CREATED = 'created', 'Добавлено'
+        STATUS_CHANGED = 'status_changed', 'Изменён статус'
+        TRASHED = 'trashed', 'Перемещено в корзину'
+        RESTORED = 'restored', 'Восстановлено'
+        DELETED = 'deleted', 'Удалено навсегда'
+
+    device_id = models.BigIntegerField(verbose_name='ID устройства')
+    event_type = models.CharField(max_length=20, choices=Types.choices, verbose_name='Событие')
+    status = models.CharField(max_length=20, choices=Device.STATUS_CHOICES, verbose_name='Статус')
+    previous_status = models.CharField(max_length=20, choices=Device.STATUS_CHOICES, blank=True, verbose_name='Был статус')
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name='Когда')
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Событие устройства'
+        verbose_name_plural = 'События устройств'
+
+    def __str__(self):
+        return f"#{self.pk} {self.event_type} device={self.device_id}"
+
+
+class OperatorDailyActivity(models.Model):
+    """Сводка по операторам: сколько устройств добавил / продал / списал за день."""
+
+    class Kinds(models.TextChoices):
+        ADDED = 'added', 'Добавлено'
+        SOLD = 'sold', 'Продано'
+        WRITTEN_OFF = 'written_off', 'Списано'
+
+    day = models.DateField(verbose_name='День')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_activity', verbose_name='Оператор')
+    kind = models.CharField(max_length=20, choices=Kinds.choices, verbose_name='Действие')
+    count = models.PositiveIntegerField(default=0, verbose_name='Количество')
+
+    class Meta:
+        ordering = ['-day', 'user_id', 'kind']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'user', 'kind'], name='unique_operator_daily_activity'),
+        ]
+        verbose_name = 'Активность оператора за день'
+        verbose_name_plural = 'Активность операторов по дням'
+
+    def __str__(self):
+        return f"{self.day} {self.user_id} {self.kind}: {self.count}"
+
+
+class InventorySnapshot(models.Model):
+    """Остатки на конец дня по модели и статусу (заполняет команда snapshot_inventory)."""
+
+    day = models.DateField(verbose_name='День')
+    model_name = models.CharField(max_length=255, blank=True, verbose_name='Модель телефона')
+    status = models.CharField(max_length=20, choices=Device.STATUS_CHOICES, verbose_name='Статус')
+    count = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        ordering = ['-day', 'model_name', 'status']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'model_name', 'status'], name='unique_inventory_snapshot'),
+        ]
+        indexes = [models.Index(fields=['status', 'day'], name='inventory_status_day_idx')]
+        verbose_name = 'Снимок остатков'
+        verbose_name_plural = 'Снимки остатков'
+
+    def __str__(self):
+        return f"{self.day} {self.model_name or '—'} {self.status}: {self.count}"
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import hashlib
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from .cache import derived_cache
+from .db import estimated_row_count
+
+NBSP = '\u00a0'  # число и единица не должны разрываться переносом
+
+
+def format_count(value: int, approximate: bool = False) -> str:
+    """1 234 / ~12,3 тыс. / ~1,2 млн — compact form only when the number is an estimate."""
+    if not approximate:
+        return f'{value:,}'.replace(',', NBSP)
+    for divisor, unit in ((1_000_000_000, 'млрд'), (1_000_000, 'млн'), (1_000, 'тыс.')):
+        if value >= divisor:
+            return f'~{value / divisor:.1f}'.replace('.', ',') + f'{NBSP}{unit}'
+    return f'~{value}'
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that stops counting exactly once the result is large.
+
+    Up to EXACT_COUNT_LIMIT rows the count is exact (a ``COUNT(*)`` over a
+    ``LIMIT`` subquery, so it never reads more than that). Beyond it an
+    unfiltered queryset reports the planner's table estimate; a filtered one
+    (or a table without statistics) runs the full count once and reuses it
+    from the derived cache for COUNT_CACHE_TIMEOUT seconds. ``is_estimated``
+    tells the template to show the number as approximate.
+    """
+
+    def __init__(self, *args, exact_limit: int | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if exact_limit is None:
+            exact_limit = getattr(settings, 'EXACT_COUNT_LIMIT', 10000)
+        self.exact_limit = exact_limit
+        self.is_estimated = False
+
+    def _cached_count(self, queryset) -> int:
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.md5(f'{queryset.db}|{sql}|{params!r}'.encode(), usedforsecurity=False).hexdigest()
+        cache_key = f'count:{digest}'
+        cache = derived_cache()
+        count = cache.get(cache_key)
+        if count is None:
+            count = queryset.count()
+            cache.set(cache_key, count, timeout=getattr(settings, 'COUNT_CACHE_TIMEOUT', 300))
+        return count
+
+    @cached_property
+    def count(self):
+        object_list = self.object_list
+        if not hasattr(object_list, 'query'):
+            return super().count
+        queryset = object_list.order_by()
+        capped = queryset[: self.exact_limit + 1].count()
+        if capped <= self.exact_limit:
+            return capped
+        self.is_estimated = True
+        if not queryset.query.has_filters():
+            estimate = estimated_row_count(queryset.model, using=queryset.db)
+            if estimate:
+                return max(estimate, capped)
+        return max(self._cached_count(queryset), capped)
+
+    @property
+    def count_display(self) -> str:
+        count = self.count  # заполняет is_estimated
+        return format_count(count, approximate=self.is_estimated)
+
+    def nearby_pages(self, number: int, on_each_side: int = 2) -> range:
+        """Page numbers around ``number`` without materialising the full page_range."""
+        return range(max(1, number - on_each_side), min(self.num_pages, number + on_each_side) + 1)
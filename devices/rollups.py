@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Device, DeviceHistory, OperatorDailyActivity
+
+Kinds = OperatorDailyActivity.Kinds
+
+# Переходы в истории, которые попадают в сводку.
+STATUS_KINDS = {
+    Device.STATUS_SOLD: Kinds.SOLD,
+    Device.STATUS_WRITTEN_OFF: Kinds.WRITTEN_OFF,
+}
+
+
+def record_activity(day: date, user_id: Optional[int], kind: str, delta: int = 1) -> None:
+    """Add ``delta`` to one (day, user, kind) counter, creating the row on first use."""
+    if not user_id:
+        return
+    counters = OperatorDailyActivity.objects.filter(day=day, user_id=user_id, kind=kind)
+    if counters.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            OperatorDailyActivity.objects.create(day=day, user_id=user_id, kind=kind, count=delta)
+    except IntegrityError:
+        # Параллельная запись успела создать строку.
+        counters.update(count=F('count') + delta)
+
+
+def record_device_added(device: Device) -> None:
+    record_activity(timezone.localdate(device.date_added), device.added_by_id, Kinds.ADDED)
+
+
+def record_history_entry(entry: DeviceHistory) -> None:
+    kind = STATUS_KINDS.get(entry.new_status)
+    if kind and entry.previous_status != entry.new_status:
+        record_activity(timezone.localdate(entry.changed_at), entry.changed_by_id, kind)
+
+
+def _start_of(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rebuild_rollups(since: Optional[date] = None) -> Optional[date]:
+    """Recompute the rollups from ``since`` onwards from Device and DeviceHistory.
+
+    Without ``since`` it resumes from the last day already in the table (that
+    day is recomputed too, it may have been partial); an empty table is
+    rebuilt from scratch. Devices purged from the trash are gone from the
+    source tables, so rebuilding a period older than the purge window
+    undercounts it. Returns the first recomputed day.
+    """
+    if since is None:
+        latest = OperatorDailyActivity.objects.aggregate(latest=Max('day'))['latest']
+        since = latest - timedelta(days=1) if latest else None
+
+    devices = Device.objects.all()
+    history = DeviceHistory.objects.filter(new_status__in=list(STATUS_KINDS), changed_by__isnull=False).exclude(
+        previous_status=F('new_status')
+    )
+    rollups = OperatorDailyActivity.objects.all()
+    if since is not None:
+        devices = devices.filter(date_added__gte=_start_of(since))
+        history = history.filter(changed_at__gte=_start_of(since))
+        rollups = rollups.filter(day__gte=since)
+
+    added = (
+        devices.annotate(day=TruncDate('date_added'))
+        .values('day', 'added_by_id')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    changed = (
+        history.annotate(day=TruncDate('changed_at'))
+        .values('day', 'changed_by_id', 'new_status')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    rows = [
+        OperatorDailyActivity(day=row['day'], user_id=row['added_by_id'], kind=Kinds.ADDED, count=row['total'])
+        for row in added
+    ]
+    rows += [
+        OperatorDailyActivity(
+            day=row['day'], user_id=row['changed_by_id'], kind=STATUS_KINDS[row['new_status']], count=row['total']
+        )
+        for row in changed
+    ]
+    with transaction.atomic():
+        rollups.delete()
+        OperatorDailyActivity.objects.bulk_create(rows, batch_size=500)
+    return since
+
+
+def activity_rows(start: date, end: date) -> List[Dict]:
+    """Per-day, per-operator counters between ``start`` and ``end`` inclusive, newest first."""
+    rows: Dict[tuple, Dict] = {}
+    counters = (
+        OperatorDailyActivity.objects.filter(day__range=(start, end))
+        .values('day', 'user_id', 'user__username', 'kind', 'count')
+        .order_by('-day', 'user__username')
+    )
+    for counter in counters:
+        row = rows.setdefault(
+            (counter['day'], counter['user_id']),
+            {
+                'day': counter['day'].isoformat(),
+                'user_id': counter['user_id'],
+                'username': counter['user__username'],
+                **{kind: 0 for kind in Kinds.values},
+            },
+        )
+        row[counter['kind']] = counter['count']
+    return list(rows.values())
+
+
+def activity_totals(start: date, end: date) -> List[Dict]:
+    """Per-operator totals for the period, busiest operator first."""
+    totals: Dict[int, Dict] = {}
+    counters = (
+        OperatorDailyActivity.objects.filter(day__range=(start, end))
+        .values('user_id', 'user__username', 'kind')
+        .annotate(total=Sum('count'))
+        .order_by('user__username')
+    )
+    for counter in counters:
+        row = totals.setdefault(
+            counter['user_id'],
+            {'user_id': counter['user_id'], 'username': counter['user__username'], **{kind: 0 for kind in Kinds.values}},
+        )
+        row[counter['kind']] = counter['total']
+    return sorted(totals.values(), key=lambda row: -sum(row[kind] for kind in Kinds.values))
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = 'replica'
+# Только данные приложения; кэш (django_cache), сессии и т.п. всегда читаются с primary.
+REPLICA_APP_LABELS = frozenset({'devices', 'auth'})
+
+_read_from_replica: ContextVar[bool] = ContextVar('read_from_replica', default=False)
+
+
+def replica_configured() -> bool:
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def reading_from_replica():
+    """Route reads of application models to the replica for the enclosed block."""
+    token = _read_from_replica.set(True)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    """Send reads inside ``reading_from_replica()`` to the replica; everything else to primary.
+
+    The replica is kept up to date by the database itself (streaming
+    replication, or a copied SQLite file locally), so Django never migrates it.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            _read_from_replica.get()
+            and model._meta.app_label in REPLICA_APP_LABELS
+            and replica_configured()
+        ):
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Без явного ответа Django записал бы объект туда, откуда он был прочитан.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
@@ -1,29 +1,48 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from dataclasses import dataclass
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, time
-from typing import Dict, Mapping
+from enum import Enum
+from itertools import chain
+from time import sleep
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
 
-import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.core.cache import cache
+from django.db import connections, transaction
 from django.db.models import Q, QuerySet
 from django.utils import timezone
 from django.utils.dateparse import parse_date
 
-from .models import Device
+from .cache import lookup_cache, shared_cache
+from .imports import lazy_import
+from .models import Device, DeviceModel, imei_to_int
 
 logger = logging.getLogger(__name__)
 
+# HTTP-клиенты нужны только при запросе к провайдеру, а их импорт — основная часть старта воркера.
+httpx = lazy_import('httpx')
+requests = lazy_import('requests')
+
 
 class ImeiLookupError(Exception):
     """Base exception for IMEI lookup issues."""
 
+    def __init__(self, message: str = '', error_class: str = 'error'):
+        super().__init__(message)
+        self.error_class = error_class
+
 
 class ImeiLookupRateLimitError(ImeiLookupError):
     """Raised when the external API rate limit is reached."""
 
+    def __init__(self, message: str = ''):
+        super().__init__(message, error_class='rate_limited')
+
 
 @dataclass(frozen=True)
 class ImeiLookupResult:
@@ -39,8 +58,28 @@ def _normalized_imei(imei: str) -> str:
     return ''.join(ch for ch in imei if ch.isdigit())
 
 
+def _lookup_key(imei: str) -> str:
+    """Model data depends only on the TAC, so identical models share one entry."""
+    if getattr(settings, 'IMEICHECK_SHARE_BY_TAC', True):
+        return imei[:8]
+    return imei
+
+
 def _cache_key_for_imei(imei: str) -> str:
-    return f'imeicheck:payload:{imei}'
+    return f'imeicheck:entry:{_lookup_key(imei)}'
+
+
+def _failure_key_for_imei(imei: str) -> str:
+    # Отказ провайдера относится к конкретному IMEI, а не ко всей модели.
+    return f'imeicheck:failure:{imei}'
+
+
+def _refresh_lock_key(imei: str) -> str:
+    return f'imeicheck:refreshing:{_lookup_key(imei)}'
+
+
+def _inflight_lock_key(imei: str) -> str:
+    return f'imeicheck:inflight:{_lookup_key(imei)}'
 
 
 def _rate_limit_key() -> str:
@@ -48,66 +87,97 @@ def _rate_limit_key() -> str:
     return f'imeicheck:rate:{now.strftime("%Y%m%d%H%M")}'
 
 
-def _hit_rate_limit() -> bool:
-    """Returns True when the minute rate limit has been exceeded."""
-    limit = getattr(settings, 'IMEICHECK_RATE_LIMIT', 30)
-    window = getattr(settings, 'IMEICHECK_RATE_WINDOW', 60)
-    cache_key = _rate_limit_key()
-    added = cache.add(cache_key, 1, timeout=window)
-    if added:
-        return False
-    try:
-        current = cache.incr(cache_key)
-    except ValueError:
-        cache.set(cache_key, 1, timeout=window)
-        return False
-    return current > limit
+class LookupPriority(str, Enum):
+    """Who is waiting for a provider call, most urgent first."""
 
+    INTERACTIVE = 'interactive'  # оператор ждёт ответа: форма добавления, сканер
+    BACKGROUND = 'background'  # пакетное обогащение списка IMEI
+    WARMUP = 'warmup'  # фоновое обновление устаревших записей кэша
 
-def lookup_device_by_imei(imei: str, force_refresh: bool = False) -> ImeiLookupResult:
-    """Fetch device details from IMEICheck API."""
-    normalized = _normalized_imei(imei)
-    if len(normalized) != 15:
-        raise ImeiLookupError('IMEI должен содержать 15 цифр.')
 
-    cache_key = _cache_key_for_imei(normalized)
-    if not force_refresh:
-        cached = cache.get(cache_key)
-        if cached:
-            return ImeiLookupResult(**cached)
+# Доля минутного лимита, до которой класс может поднять общий счётчик.
+DEFAULT_PRIORITY_SHARES = {
+    LookupPriority.INTERACTIVE.value: 1.0,
+    LookupPriority.BACKGROUND.value: 0.8,
+    LookupPriority.WARMUP.value: 0.5,
+}
 
-    if _hit_rate_limit():
-        raise ImeiLookupRateLimitError('Достигнут лимит внешнего API. Повторите попытку через минуту.')
 
-    params = {
+def _count_call(cache, key: str, window: int) -> int:
+    if cache.add(key, 1, timeout=window):
+        return 1
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=window)
+        return 1
+
+
+def _hit_rate_limit(user_id: Optional[int] = None, priority: LookupPriority = LookupPriority.INTERACTIVE) -> bool:
+    """True when the call does not fit the minute's quota, its priority share or the operators' floors."""
+    limit = getattr(settings, 'IMEICHECK_RATE_LIMIT', 30)
+    window = getattr(settings, 'IMEICHECK_RATE_WINDOW', 60)
+    shares = {**DEFAULT_PRIORITY_SHARES, **getattr(settings, 'IMEICHECK_PRIORITY_SHARES', {})}
+    ceiling = max(1, int(limit * shares[LookupPriority(priority).value]))
+    floor = getattr(settings, 'IMEICHECK_OPERATOR_FLOOR', max(1, limit // 10))
+    cache = shared_cache()
+    cache_key = _rate_limit_key()
+    user_key = f'{cache_key}:user:{user_id}'
+    users_key = f'{cache_key}:users'
+    floor_key = f'{cache_key}:floor'
+    with transaction.atomic():
+        total = _count_call(cache, cache_key, window)
+        within_floor = False
+        if user_id is None:
+            active = cache.get(users_key) or 0
+        else:
+            if cache.add(f'{user_key}:seen', 1, timeout=window):
+                active = _count_call(cache, users_key, window)
+            else:
+                active = cache.get(users_key) or 1
+            within_floor = _count_call(cache, user_key, window) <= floor
+        if within_floor:
+            # Свой резерв: занимаем его и пропускаем, пока не исчерпан общий лимит класса.
+            _count_call(cache, floor_key, window)
+            admitted = total <= ceiling
+        else:
+            # Сверх резерва и без пользователя (прогрев) — только то, что не зарезервировано
+            # за операторами этой минуты и ещё одним, который пока не появился.
+            unused = max(0, (active + 1) * floor - (cache.get(floor_key) or 0))
+            admitted = total + unused <= ceiling
+        if admitted:
+            return False
+        cache.decr(cache_key)
+        if user_id is not None:
+            cache.decr(user_key)
+        if within_floor:
+            cache.decr(floor_key)
+    return True
+
+
+def _provider_params(normalized: str) -> Dict:
+    return {
         'key': settings.IMEICHECK_API_KEY,
         'imei': normalized,
         'format': 'json',
     }
 
-    try:
-        response = requests.get(
-            settings.IMEICHECK_API_URL,
-            params=params,
-            timeout=10,
-        )
-    except requests.RequestException as exc:
-        logger.exception('Ошибка сети при обращении к IMEICheck: %s', exc)
-        raise ImeiLookupError('Не удалось подключиться к сервису IMEICheck.')
 
+def _parse_provider_response(normalized: str, response) -> Dict:
+    """Turn a requests/httpx response into a result dict; raises ImeiLookupError."""
     if response.status_code != 200:
         logger.error('IMEICheck ответил статусом %s для IMEI %s', response.status_code, normalized)
-        raise ImeiLookupError('Сервис IMEICheck временно недоступен.')
+        raise ImeiLookupError('Сервис IMEICheck временно недоступен.', error_class='unavailable')
 
     try:
         payload = response.json()
     except ValueError as exc:
         logger.exception('Не удалось преобразовать ответ IMEICheck в JSON: %s', exc)
-        raise ImeiLookupError('IMEICheck вернул некорректный ответ.')
+        raise ImeiLookupError('IMEICheck вернул некорректный ответ.', error_class='bad_response')
 
     if payload.get('status') != 'succes':
         logger.warning('IMEICheck вернул ошибку: %s', payload)
-        raise ImeiLookupError('IMEI не найден или сервис вернул ошибку.')
+        raise ImeiLookupError('IMEI не найден или сервис вернул ошибку.', error_class='not_found')
 
     obj = payload.get('object') or {}
     brand = obj.get('brand') or 'Неизвестный бренд'
@@ -116,7 +186,7 @@ def lookup_device_by_imei(imei: str, force_refresh: bool = False) -> ImeiLookupR
 
     formatted_name = f'({brand}) - {model}'.strip()
 
-    result_dict = {
+    return {
         'imei': normalized,
         'brand': brand,
         'model': model_code,
@@ -125,24 +195,475 @@ def lookup_device_by_imei(imei: str, force_refresh: bool = False) -> ImeiLookupR
         'raw_payload': payload,
     }
 
-    cache.set(cache_key, result_dict, timeout=24 * 60 * 60)  # Cache for 1 day
+
+def _fetch_from_provider(normalized: str) -> Dict:
+    """Call IMEICheck once and return the result dict; raises ImeiLookupError."""
+    try:
+        response = requests.get(
+            settings.IMEICHECK_API_URL,
+            params=_provider_params(normalized),
+            timeout=10,
+        )
+    except requests.RequestException as exc:
+        logger.exception('Ошибка сети при обращении к IMEICheck: %s', exc)
+        raise ImeiLookupError('Не удалось подключиться к сервису IMEICheck.', error_class='network')
+    return _parse_provider_response(normalized, response)
+
+
+async def _afetch_from_provider(normalized: str) -> Dict:
+    """Async twin of _fetch_from_provider built on httpx."""
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            response = await client.get(settings.IMEICHECK_API_URL, params=_provider_params(normalized))
+    except httpx.HTTPError as exc:
+        logger.exception('Ошибка сети при обращении к IMEICheck: %s', exc)
+        raise ImeiLookupError('Не удалось подключиться к сервису IMEICheck.', error_class='network')
+    return _parse_provider_response(normalized, response)
+
+
+def _store_result(normalized: str, result_dict: Dict) -> None:
+    """Cache a successful lookup: fresh for SOFT_TTL, served stale until HARD_TTL."""
+    soft_ttl = getattr(settings, 'IMEICHECK_CACHE_SOFT_TTL', 24 * 60 * 60)
+    hard_ttl = getattr(settings, 'IMEICHECK_CACHE_HARD_TTL', 30 * 24 * 60 * 60)
+    entry = {
+        'result': result_dict,
+        'fresh_until': timezone.now().timestamp() + soft_ttl,
+    }
+    lookup_cache.set(_cache_key_for_imei(normalized), entry, timeout=max(hard_ttl, soft_ttl))
+
+
+def _store_failure(normalized: str, exc: ImeiLookupError) -> None:
+    """Negatively cache a provider failure of this IMEI for the TTL configured for its class."""
+    ttl = getattr(settings, 'IMEICHECK_NEGATIVE_TTL', {}).get(exc.error_class, 0)
+    if ttl <= 0:
+        return
+    entry = {'error': str(exc), 'error_class': exc.error_class}
+    lookup_cache.set(_failure_key_for_imei(normalized), entry, timeout=ttl)
+
+
+def _cached_entry(normalized: str) -> Dict | None:
+    """The cached result for the IMEI's TAC, else a cached failure of this very IMEI."""
+    return lookup_cache.get(_cache_key_for_imei(normalized)) or lookup_cache.get(
+        _failure_key_for_imei(normalized)
+    )
+
+
+def _refresh_stale_entry(normalized: str) -> None:
+    """Re-fetch a stale entry; on any failure the stale value stays in place."""
+    try:
+        if _hit_rate_limit(priority=LookupPriority.WARMUP):
+            return
+        _store_result(normalized, _fetch_from_provider(normalized))
+    except ImeiLookupError as exc:
+        logger.info('Фоновое обновление IMEI %s не удалось: %s', normalized, exc)
+    finally:
+        shared_cache().delete(_refresh_lock_key(normalized))
+
+
+def _run_in_background(func, *args) -> None:
+    """Run func in a daemon thread that closes its own DB connections."""
+    def target():
+        try:
+            func(*args)
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=target, daemon=True).start()
+
+
+def _schedule_refresh(normalized: str) -> None:
+    """Start at most one background refresh per IMEI across all workers."""
+    if not getattr(settings, 'IMEICHECK_BACKGROUND_REFRESH', True):
+        return
+    if not shared_cache().add(_refresh_lock_key(normalized), 1, timeout=60):
+        return
+    _run_in_background(_refresh_stale_entry, normalized)
+
+
+class _Flight:
+    """One outstanding provider call that concurrent callers in this process wait on."""
+
+    def __init__(self, imei: str):
+        self.imei = imei
+        self.done = threading.Event()
+        self.result: Dict | None = None
+        self.error: ImeiLookupError | None = None
+
+    def wait(self) -> Dict:
+        timeout = getattr(settings, 'IMEICHECK_INFLIGHT_TIMEOUT', 15)
+        if not self.done.wait(timeout):
+            raise ImeiLookupError('Сервис IMEICheck не ответил вовремя.', error_class='network')
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+_flights: Dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+
+
+def _entry_to_result(entry: Dict, normalized: str) -> Dict:
+    if 'error' in entry:
+        raise ImeiLookupError(entry['error'], error_class=entry['error_class'])
+    return {**entry['result'], 'imei': normalized}
+
+
+def _wait_for_other_worker(normalized: str) -> Dict | None:
+    """Poll the shared cache while another worker holds the in-flight lock."""
+    timeout = getattr(settings, 'IMEICHECK_INFLIGHT_TIMEOUT', 15)
+    cache = shared_cache()
+    lock_key = _inflight_lock_key(normalized)
+    deadline = timezone.now().timestamp() + timeout
+    while timezone.now().timestamp() < deadline:
+        sleep(0.1)
+        entry = _cached_entry(normalized)
+        if entry:
+            return entry
+        if cache.get(lock_key) is None:
+            return None
+    return None
+
+
+def _fetch_and_store(
+    normalized: str,
+    force_refresh: bool,
+    user_id: Optional[int] = None,
+    priority: LookupPriority = LookupPriority.INTERACTIVE,
+) -> Dict:
+    """Fetch from the provider, or reuse the result another worker is fetching."""
+    cache = shared_cache()
+    lock_key = _inflight_lock_key(normalized)
+    timeout = getattr(settings, 'IMEICHECK_INFLIGHT_TIMEOUT', 15)
+    if not cache.add(lock_key, 1, timeout=timeout):
+        entry = _wait_for_other_worker(normalized)
+        if entry:
+            return _entry_to_result(entry, normalized)
+        # The other worker failed without caching anything; fetch ourselves.
+        cache.add(lock_key, 1, timeout=timeout)
+    elif not force_refresh:
+        entry = _cached_entry(normalized)
+        if entry:
+            cache.delete(lock_key)
+            return _entry_to_result(entry, normalized)
+
+    try:
+        if _hit_rate_limit(user_id, priority):
+            raise ImeiLookupRateLimitError('Достигнут лимит внешнего API. Повторите попытку через минуту.')
+        try:
+            result_dict = _fetch_from_provider(normalized)
+        except ImeiLookupError as exc:
+            _store_failure(normalized, exc)
+            raise
+        _store_result(normalized, result_dict)
+        return result_dict
+    finally:
+        cache.delete(lock_key)
+
+
+def _fetch_single_flight(
+    normalized: str,
+    force_refresh: bool,
+    user_id: Optional[int] = None,
+    priority: LookupPriority = LookupPriority.INTERACTIVE,
+) -> Dict:
+    """Coalesce concurrent misses for the same key into one provider call.
+
+    A follower shares the leader's answer but not its quota or its IMEI:
+    when the leader was refused by the rate limiter, or failed for another
+    IMEI of the same TAC, the follower asks again on its own.
+    """
+    key = _lookup_key(normalized)
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight(normalized)
+    if not leader:
+        try:
+            return {**flight.wait(), 'imei': normalized}
+        except ImeiLookupError as exc:
+            # Отказ квоты относится к лидеру (его пользователю и приоритету), а ошибка
+            # провайдера — к IMEI лидера; чужой IMEI той же модели спрашиваем сами.
+            if flight.imei == normalized and not isinstance(exc, ImeiLookupRateLimitError):
+                raise
+            return _fetch_and_store(normalized, force_refresh, user_id, priority)
+
+    try:
+        flight.result = _fetch_and_store(normalized, force_refresh, user_id, priority)
+        return flight.result
+    except ImeiLookupError as exc:
+        flight.error = exc
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+def lookup_device_by_imei(
+    imei: str,
+    force_refresh: bool = False,
+    user_id: Optional[int] = None,
+    priority: LookupPriority = LookupPriority.INTERACTIVE,
+) -> ImeiLookupResult:
+    """Fetch device details from IMEICheck API.
+
+    Stale cached results are returned immediately and refreshed in the
+    background; recent failures are replayed from the negative cache.
+    Concurrent misses for the same TAC share a single provider call.
+    ``user_id`` and ``priority`` decide the call's place in the quota.
+    """
+    normalized = _normalized_imei(imei)
+    if len(normalized) != 15:
+        raise ImeiLookupError('IMEI должен содержать 15 цифр.', error_class='invalid_imei')
+
+    if not force_refresh:
+        entry = _cached_entry(normalized)
+        if entry:
+            result_dict = _entry_to_result(entry, normalized)
+            if entry['fresh_until'] <= timezone.now().timestamp():
+                _schedule_refresh(normalized)
+            return ImeiLookupResult(**result_dict)
+
+    return ImeiLookupResult(**_fetch_single_flight(normalized, force_refresh, user_id, priority))
+
+
+@dataclass
+class BatchLookupResult:
+    results: Dict[str, ImeiLookupResult] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    deferred: List[str] = field(default_factory=list)
+
+
+def lookup_devices_batch(
+    imeis: Iterable[str],
+    user_id: Optional[int] = None,
+    priority: LookupPriority = LookupPriority.BACKGROUND,
+) -> BatchLookupResult:
+    """Resolve many IMEIs: collapse by TAC, serve from cache, fetch the rest in parallel.
+
+    Misses go through a bounded thread pool (IMEICHECK_BATCH_WORKERS) and the
+    shared rate limiter at background priority; once the limit is hit, the
+    remaining TACs are reported in ``deferred`` instead of being requested.
+    """
+    batch = BatchLookupResult()
+    groups: Dict[str, List[str]] = {}
+    for raw in imeis:
+        normalized = _normalized_imei(raw or '')
+        if len(normalized) != 15:
+            batch.errors[raw] = 'IMEI должен содержать 15 цифр.'
+            continue
+        groups.setdefault(_lookup_key(normalized), []).append(normalized)
+    # A repeated IMEI must not appear twice in the output lists.
+    groups = {key: list(dict.fromkeys(members)) for key, members in groups.items()}
+
+    def resolve(members: List[str], result_dict: Dict) -> None:
+        for member in members:
+            batch.results[member] = ImeiLookupResult(**{**result_dict, 'imei': member})
+
+    def fail(members: List[str], message: str) -> None:
+        for member in members:
+            batch.errors[member] = message
+
+    misses = []
+    for members in groups.values():
+        entry = lookup_cache.get(_cache_key_for_imei(members[0]))
+        if entry:
+            resolve(members, _entry_to_result(entry, members[0]))
+            if entry['fresh_until'] <= timezone.now().timestamp():
+                _schedule_refresh(members[0])
+            continue
+        pending = []
+        for member in members:
+            failure = lookup_cache.get(_failure_key_for_imei(member))
+            if failure:
+                fail([member], failure['error'])
+            else:
+                pending.append(member)
+        if pending:
+            misses.append(pending)
+
+    limited = threading.Event()
+
+    def fetch(members: List[str]):
+        # Ошибка провайдера относится к одному IMEI: пробуем следующий IMEI той же модели,
+        # а первый успешный ответ отдаём всем оставшимся.
+        outcomes = []
+        for index, member in enumerate(members):
+            if limited.is_set():
+                return outcomes + [(members[index:], None)]
+            try:
+                result_dict = _fetch_single_flight(member, False, user_id, priority)
+                return outcomes + [(members[index:], result_dict)]
+            except ImeiLookupRateLimitError:
+                limited.set()
+                return outcomes + [(members[index:], None)]
+            except ImeiLookupError as exc:
+                outcomes.append(([member], exc))
+        return outcomes
+
+    workers = getattr(settings, 'IMEICHECK_BATCH_WORKERS', 4)
+    if workers <= 1 or len(misses) <= 1:
+        results = [fetch(members) for members in misses]
+    else:
+        def fetch_in_thread(members):
+            try:
+                return fetch(members)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(fetch_in_thread, misses))
+
+    for members, outcome in chain.from_iterable(results):
+        if outcome is None:
+            batch.deferred.extend(members)
+        elif isinstance(outcome, ImeiLookupError):
+            fail(members, str(outcome))
+        else:
+            resolve(members, outcome)
+    return batch
+
+
+# Ключ — только TAC: под WSGI у каждого запроса свой event loop, а ждать общий вызов
+# должны все. concurrent.futures.Future можно ждать из любого loop через asyncio.wrap_future.
+# Рядом с Future хранится IMEI лидера: его ошибку получают только запросы того же IMEI.
+_async_flights: Dict[str, Tuple[str, Future]] = {}
+
+
+async def _await_other_worker(normalized: str) -> Dict | None:
+    timeout = getattr(settings, 'IMEICHECK_INFLIGHT_TIMEOUT', 15)
+    cache = shared_cache()
+    lock_key = _inflight_lock_key(normalized)
+    deadline = timezone.now().timestamp() + timeout
+    while timezone.now().timestamp() < deadline:
+        await asyncio.sleep(0.1)
+        entry = await sync_to_async(_cached_entry)(normalized)
+        if entry:
+            return entry
+        if await sync_to_async(cache.get)(lock_key) is None:
+            return None
+    return None
+
+
+async def _afetch_and_store(
+    normalized: str,
+    force_refresh: bool,
+    user_id: Optional[int] = None,
+    priority: LookupPriority = LookupPriority.INTERACTIVE,
+) -> Dict:
+    """Async twin of _fetch_and_store: cache and locks via sync_to_async, HTTP via httpx."""
+    cache = shared_cache()
+    lock_key = _inflight_lock_key(normalized)
+    timeout = getattr(settings, 'IMEICHECK_INFLIGHT_TIMEOUT', 15)
+    if not await sync_to_async(cache.add)(lock_key, 1, timeout=timeout):
+        entry = await _await_other_worker(normalized)
+        if entry:
+            return _entry_to_result(entry, normalized)
+        await sync_to_async(cache.add)(lock_key, 1, timeout=timeout)
+    elif not force_refresh:
+        entry = await sync_to_async(_cached_entry)(normalized)
+        if entry:
+            await sync_to_async(cache.delete)(lock_key)
+            return _entry_to_result(entry, normalized)
+
+    try:
+        if await sync_to_async(_hit_rate_limit)(user_id, priority):
+            raise ImeiLookupRateLimitError('Достигнут лимит внешнего API. Повторите попытку через минуту.')
+        try:
+            result_dict = await _afetch_from_provider(normalized)
+        except ImeiLookupError as exc:
+            await sync_to_async(_store_failure)(normalized, exc)
+            raise
+        await sync_to_async(_store_result)(normalized, result_dict)
+        return result_dict
+    finally:
+        await sync_to_async(cache.delete)(lock_key)
+
+
+async def alookup_device_by_imei(
+    imei: str,
+    force_refresh: bool = False,
+    user_id: Optional[int] = None,
+    priority: LookupPriority = LookupPriority.INTERACTIVE,
+) -> ImeiLookupResult:
+    """Async version of lookup_device_by_imei for ASGI views.
+
+    Same caching rules; callers awaiting the same TAC share a single provider
+    call, also across event loops (each WSGI request runs its own).
+    """
+    normalized = _normalized_imei(imei)
+    if len(normalized) != 15:
+        raise ImeiLookupError('IMEI должен содержать 15 цифр.', error_class='invalid_imei')
+
+    if not force_refresh:
+        entry = await sync_to_async(_cached_entry)(normalized)
+        if entry:
+            result_dict = _entry_to_result(entry, normalized)
+            if entry['fresh_until'] <= timezone.now().timestamp():
+                await sync_to_async(_schedule_refresh)(normalized)
+            return ImeiLookupResult(**result_dict)
+
+    key = _lookup_key(normalized)
+    with _flights_lock:
+        entry = _async_flights.get(key)
+        leader = entry is None
+        if leader:
+            entry = _async_flights[key] = (normalized, Future())
+    leader_imei, flight = entry
+    if not leader:
+        try:
+            result_dict = await asyncio.shield(asyncio.wrap_future(flight))
+        except ImeiLookupError as exc:
+            # Отказ квоты и отмена относятся к лидеру, ошибка провайдера — к его IMEI.
+            if leader_imei == normalized and exc.error_class not in ('rate_limited', 'cancelled'):
+                raise
+            result_dict = await _afetch_and_store(normalized, force_refresh, user_id, priority)
+        return ImeiLookupResult(**{**result_dict, 'imei': normalized})
+
+    try:
+        result_dict = await _afetch_and_store(normalized, force_refresh, user_id, priority)
+        flight.set_result(result_dict)
+    except asyncio.CancelledError:
+        # Клиент лидера ушёл: ожидающие не должны получить его CancelledError и спросят сами.
+        flight.set_exception(ImeiLookupError('Запрос к IMEICheck отменён.', error_class='cancelled'))
+        raise
+    except Exception as exc:
+        flight.set_exception(exc)
+        raise
+    finally:
+        with _flights_lock:
+            _async_flights.pop(key, None)
+        if not flight.done():
+            flight.cancel()
     return ImeiLookupResult(**result_dict)
 
 
+def catalog_model_for(lookup: ImeiLookupResult) -> Optional[DeviceModel]:
+    """DeviceModel catalog entry for a lookup result, recording its model code and TAC."""
+    return DeviceModel.objects.resolve(
+        lookup.brand, lookup.model_name, model_code=lookup.model, tac=lookup.imei[:8]
+    )
+
+
+def device_search_q(search: str) -> Q:
+    """Search by IMEI, model or comment; a full IMEI goes through the integer index."""
+    imei_number = imei_to_int(search)
+    imei_q = Q(imei_number=imei_number) if imei_number is not None else Q(imei__icontains=search)
+    return imei_q | Q(model_name__icontains=search) | Q(comment__icontains=search)
+
+
 def apply_device_filters(queryset: QuerySet, params: Mapping[str, str]) -> QuerySet:
-    """Apply filtering by search, status, date range, and author."""
+    """Apply filtering by search, status, brand, date range, and author."""
     search = (params.get('search') or '').strip()
     status = (params.get('status') or '').strip()
     added_by = (params.get('added_by') or '').strip()
+    brand = (params.get('brand') or '').strip()
     date_from_raw = (params.get('date_from') or '').strip()
     date_to_raw = (params.get('date_to') or '').strip()
 
     if search:
-        queryset = queryset.filter(
-            Q(imei__icontains=search)
-            | Q(model_name__icontains=search)
-            | Q(comment__icontains=search)
-        )
+        queryset = queryset.filter(device_search_q(search))
 
     if status:
         queryset = queryset.filter(status=status)
@@ -150,6 +671,9 @@ def apply_device_filters(queryset: QuerySet, params: Mapping[str, str]) -> Query
     if added_by:
         queryset = queryset.filter(added_by__id=added_by)
 
+    if brand:
+        queryset = queryset.filter(device_model__in=DeviceModel.objects.brand_ids(brand))
+
     if date_from_raw:
         date_from = parse_date(date_from_raw)
         if date_from:
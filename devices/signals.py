@@ -1,18 +1,75 @@
 from __future__ import annotations
 
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from .models import UserProfile
+from .cache import bump_data_version
+from .db import apply_sqlite_pragmas
+from .events import record_device_event
+from .models import Device, DeviceEvent, DeviceHistory, UserProfile, imei_to_int
+from .rollups import record_device_added, record_history_entry
 
 User = get_user_model()
 
 
 @receiver(post_save, sender=User)
 def ensure_user_profile(sender, instance: User, created: bool, **kwargs):
+    # Только при создании: вход (last_login) и прочие сохранения пользователя профиль не трогают.
+    # Поля профиля можно задать заранее через user.profile_defaults — одна вставка вместо вставки и UPDATE.
     if created:
-        UserProfile.objects.create(user=instance)
-    else:
-        UserProfile.objects.get_or_create(user=instance)
+        UserProfile.objects.create(user=instance, **getattr(instance, 'profile_defaults', {}))
 
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    apply_sqlite_pragmas(connection)
+
+
+@receiver(pre_save, sender=Device)
+def fill_imei_number_on_raw_save(sender, instance: Device, raw: bool = False, **kwargs):
+    # loaddata сохраняет в обход Device.save(); фикстуры старых дампов не содержат imei_number.
+    if raw:
+        instance.imei_number = imei_to_int(instance.imei)
+
+
+@receiver(post_save, sender=Device)
+def log_device_created(sender, instance: Device, created: bool, **kwargs):
+    if created:
+        record_device_event(instance, DeviceEvent.Types.CREATED)
+
+
+@receiver(post_save, sender=Device)
+def count_device_added(sender, instance: Device, created: bool, raw: bool = False, **kwargs):
+    if created and not raw:
+        record_device_added(instance)
+
+
+@receiver(post_save, sender=DeviceHistory)
+def count_status_change(sender, instance: DeviceHistory, created: bool, raw: bool = False, **kwargs):
+    if created and not raw:
+        record_history_entry(instance)
+
+
+@receiver(post_delete, sender=Device)
+def log_device_deleted(sender, instance: Device, **kwargs):
+    record_device_event(instance, DeviceEvent.Types.DELETED)
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+@receiver(post_save, sender=DeviceHistory)
+@receiver(post_delete, sender=DeviceHistory)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_page_etags(sender, **kwargs):
+    bump_data_version()
+
+
+@receiver(post_save, sender=User)
+def invalidate_page_etags_for_user(sender, update_fields=None, **kwargs):
+    # Login only touches last_login, which no page displays.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_data_version()
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import base64
+from array import array
+from typing import Dict, Iterable, Optional
+
+from django.db.models import Min
+
+from .cache import shared_cache
+from .events import latest_event_id
+from .models import Device, DeviceEvent
+
+SNAPSHOT_CACHE_TIMEOUT = 60 * 60
+
+
+def pack_imeis(imeis: Iterable[str | int]) -> str:
+    """Sorted little-endian uint64 array, base64-encoded.
+
+    15-digit IMEIs are below 2**53, so the browser can read them as plain numbers.
+    """
+    packed = array('Q', sorted(int(imei) for imei in imeis if str(imei).isdigit()))
+    if packed.itemsize != 8:  # pragma: no cover - every supported platform has 8-byte 'Q'
+        raise RuntimeError('uint64 array type is not available')
+    if array('H', [1]).tobytes() != b'\x01\x00':  # pragma: no cover - big-endian host
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode('ascii')
+
+
+def unpack_imeis(data: str) -> list[int]:
+    packed = array('Q')
+    packed.frombytes(base64.b64decode(data))
+    if array('H', [1]).tobytes() != b'\x01\x00':  # pragma: no cover
+        packed.byteswap()
+    return packed.tolist()
+
+
+def full_snapshot() -> Dict:
+    version = latest_event_id()
+    cache_key = f'imei_snapshot:{version}'
+    cache = shared_cache()
+    snapshot = cache.get(cache_key)
+    if snapshot is None:
+        imeis = list(
+            Device.objects.filter(imei_number__isnull=False)
+            .values_list('imei_number', flat=True)
+            .iterator(chunk_size=5000)
+        )
+        snapshot = {'version': version, 'full': True, 'count': len(imeis), 'imeis': pack_imeis(imeis)}
+        cache.set(cache_key, snapshot, timeout=SNAPSHOT_CACHE_TIMEOUT)
+    return snapshot
+
+
+def snapshot_since(since: Optional[int]) -> Dict:
+    """Membership changes after event ``since``, or a full snapshot when the log can't cover it."""
+    if since is None:
+        return full_snapshot()
+    latest = latest_event_id()
+    oldest = DeviceEvent.objects.aggregate(oldest=Min('id'))['oldest']
+    if oldest is None or since < oldest - 1 or since > latest:
+        return full_snapshot()
+
+    added, removed = set(), set()
+    events = (
+        DeviceEvent.objects.filter(
+            id__gt=since,
+            id__lte=latest,
+            event_type__in=[DeviceEvent.Types.CREATED, DeviceEvent.Types.DELETED],
+        )
+        .order_by('id')
+        .values_list('event_type', 'payload')
+    )
+    for event_type, payload in events.iterator(chunk_size=5000):
+        imei = payload.get('imei', '')
+        if event_type == DeviceEvent.Types.CREATED:
+            added.add(imei)
+            removed.discard(imei)
+        else:
+            removed.add(imei)
+            added.discard(imei)
+    return {
+        'version': latest,
+        'full': False,
+        'added': pack_imeis(added),
+        'removed': pack_imeis(removed),
+    }
@@ -1,20 +1,81 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import json
+from io import BytesIO, StringIO
+import sys
+import tempfile
+import threading
 from datetime import timedelta
-from unittest.mock import patch
+from time import sleep
+from unittest.mock import AsyncMock, Mock, patch
+
+from asgiref.sync import async_to_sync
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from django.template.loader import render_to_string
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
-from .models import Device, UserProfile
-from .services import apply_device_filters
+from .audit import InvalidCursor, aiter_audit_rows, audit_queryset, decode_cursor, iter_audit_rows, keyset_page
+from .cache import TwoTierCache, data_version, shared_cache
+from .db import iter_pk_batches, maybe_optimize_after_purge
+from .events import latest_event_id, prune_device_events, record_device_event
+from .facets import facet_counts
+from .fragments import render_device_rows
+from .imports import lazy_import, parse_importtime
+from .staticfiles import BundleFinder
+from .middleware import PRIMARY_PIN_COOKIE
+from .pagination import EstimatedCountPaginator, format_count
+from .rollups import rebuild_rollups
+from .routers import REPLICA_DB_ALIAS, ReplicaRouter, reading_from_replica
+from .transitions import DeviceTransitionConflict, transition_device
+from .snapshot import pack_imeis, unpack_imeis
+from .utils import log_device_history
+from .inventory import day_deltas, take_snapshots
+from .models import (
+    Device,
+    DeviceEvent,
+    DeviceHistory,
+    DeviceModel,
+    InventorySnapshot,
+    OperatorDailyActivity,
+    UserProfile,
+    split_model_name,
+)
+from .services import (
+    ImeiLookupError,
+    ImeiLookupRateLimitError,
+    ImeiLookupResult,
+    _fetch_single_flight,
+    _hit_rate_limit,
+    LookupPriority,
+    _inflight_lock_key,
+    _refresh_stale_entry,
+    _store_result,
+    alookup_device_by_imei,
+    apply_device_filters,
+    catalog_model_for,
+    lookup_device_by_imei,
+    lookup_devices_batch,
+)
 
 User = get_user_model()
 
 
 class BaseTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        caches['local'].clear()
+
     def create_user(self, username='user', role=UserProfile.Roles.GUEST, can_delete=True, **kwargs):
         password = kwargs.pop('password', 'pass12345')
         user = User.objects.create_user(username=username, password=password, **kwargs)
@@ -75,7 +136,7 @@ class ImeiLookupViewTests(BaseTestCase):
         response = self.client.get(reverse('imei_lookup'), {'imei': '123456789012345'})
         self.assertEqual(response.status_code, 302)  # Redirect to login
 
-    @patch('devices.views.lookup_device_by_imei')
+    @patch('devices.views.alookup_device_by_imei')
     def test_lookup_returns_payload(self, mock_lookup):
         mock_lookup.return_value = type(
             'Resp',
@@ -93,3 +154,1101 @@ class ImeiLookupViewTests(BaseTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTrue(response.json()['success'])
         mock_lookup.assert_called_once()
+
+    @patch('devices.views.alookup_device_by_imei')
+    def test_duplicate_check_skips_the_provider(self, mock_lookup):
+        Device.objects.create(imei='356789012345678', added_by=self.operator)
+        self.client.login(username=self.operator.username, password=self.operator._plain_password)
+        url = reverse('imei_lookup')
+        self.assertTrue(self.client.get(url, {'imei': '356789012345678', 'check_exists': '1'}).json()['exists'])
+        self.assertFalse(self.client.get(url, {'imei': '356789012345679', 'check_exists': '1'}).json()['exists'])
+        mock_lookup.assert_not_called()
+
+
+class SqliteTuningTests(TestCase):
+    def test_connection_has_concurrency_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    @override_settings(SQLITE_OPTIMIZE_AFTER_PURGE=10)
+    def test_optimize_runs_only_after_large_purge(self):
+        self.assertFalse(maybe_optimize_after_purge(3))
+        self.assertTrue(maybe_optimize_after_purge(10))
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'imei_cache'},
+        'local': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker-a'},
+        'local_b': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker-b'},
+    }
+)
+class TwoTierCacheTests(TestCase):
+    def setUp(self):
+        caches['local'].clear()
+        caches['local_b'].clear()
+        self.worker_a = TwoTierCache(local_alias='local', check_interval=0)
+        self.worker_b = TwoTierCache(local_alias='local_b', check_interval=0)
+
+    def test_shared_value_is_promoted_to_local_tier(self):
+        self.worker_b.check_interval = 60
+        self.worker_a.set('k', {'v': 1}, timeout=60)
+        self.assertEqual(self.worker_b.get('k'), {'v': 1})
+        caches['default'].delete('k')
+        self.assertEqual(self.worker_b.get('k'), {'v': 1})
+
+    def test_write_in_one_worker_invalidates_the_other(self):
+        self.worker_a.set('k', 'old', timeout=60)
+        self.assertEqual(self.worker_b.get('k'), 'old')
+        self.worker_a.set('k', 'new', timeout=60)
+        self.assertEqual(self.worker_b.get('k'), 'new')
+        self.worker_a.delete('k')
+        self.assertIsNone(self.worker_b.get('k'))
+
+    def test_invalidation_leaves_other_local_entries_alone(self):
+        # В том же local лежат фрагменты строк и фасеты: запись в TwoTierCache не должна их стирать.
+        caches['local_b'].set('fragment', 'row')
+        self.assertIsNone(self.worker_b.get('k'))
+        self.worker_a.set('k', 'new', timeout=60)
+        self.assertEqual(self.worker_b.get('k'), 'new')
+        self.assertEqual(caches['local_b'].get('fragment'), 'row')
+
+    def test_write_invalidates_only_its_own_key(self):
+        self.worker_b.check_interval = 60
+        self.worker_a.set('k', 'old', timeout=60)
+        self.worker_a.set('other', 'kept', timeout=60)
+        self.worker_b.get('k')
+        self.worker_b.get('other')
+        self.worker_a.set('k', 'new', timeout=60)
+        with patch.object(caches['default'], 'get', wraps=caches['default'].get) as shared_get:
+            self.assertEqual(self.worker_b.get('other'), 'kept')
+        shared_get.assert_not_called()
+
+    @override_settings(IMEICHECK_RATE_LIMIT=2, IMEICHECK_OPERATOR_FLOOR=0)
+    @patch('devices.services._rate_limit_key', return_value='imeicheck:rate:test')
+    def test_rate_limit_counter_lives_in_shared_tier(self, _key):
+        self.assertFalse(_hit_rate_limit())
+        caches['local'].clear()
+        self.assertFalse(_hit_rate_limit())
+        self.assertTrue(_hit_rate_limit())
+
+
+def provider_response(payload, status_code=200):
+    return Mock(status_code=status_code, json=Mock(return_value=payload))
+
+
+SUCCESS_PAYLOAD = {'status': 'succes', 'object': {'brand': 'Apple', 'name': 'iPhone 13', 'model': 'A2633'}}
+
+
+class LookupCachingTests(BaseTestCase):
+    imei = '356789012345678'
+
+    @patch('devices.services.requests.get')
+    def test_provider_failures_are_negatively_cached(self, mock_get):
+        mock_get.return_value = provider_response({'status': 'error'})
+        for _ in range(2):
+            with self.assertRaises(ImeiLookupError) as ctx:
+                lookup_device_by_imei(self.imei)
+            self.assertEqual(ctx.exception.error_class, 'not_found')
+        mock_get.assert_called_once()
+
+    @patch('devices.services.requests.get')
+    def test_failure_of_one_imei_does_not_block_its_tac(self, mock_get):
+        mock_get.side_effect = [provider_response({'status': 'error'}), provider_response(SUCCESS_PAYLOAD)]
+        with self.assertRaises(ImeiLookupError):
+            lookup_device_by_imei(self.imei)
+        # Другой IMEI той же модели спрашиваем у провайдера, а не отдаём чужую ошибку.
+        result = lookup_device_by_imei('356789019999999')
+        self.assertEqual(result.formatted_name, '(Apple) - iPhone 13')
+        self.assertEqual(mock_get.call_count, 2)
+
+    @override_settings(IMEICHECK_CACHE_SOFT_TTL=0)
+    @patch('devices.services._schedule_refresh')
+    @patch('devices.services.requests.get')
+    def test_stale_entry_is_served_and_refreshed_in_background(self, mock_get, mock_schedule):
+        _store_result(self.imei, {
+            'imei': self.imei, 'brand': 'Old', 'model': '', 'model_name': 'Old',
+            'formatted_name': '(Old) - Old', 'raw_payload': {},
+        })
+        result = lookup_device_by_imei(self.imei)
+        self.assertEqual(result.brand, 'Old')
+        mock_get.assert_not_called()
+        mock_schedule.assert_called_once_with(self.imei)
+
+        mock_get.return_value = provider_response(SUCCESS_PAYLOAD)
+        _refresh_stale_entry(self.imei)
+        self.assertEqual(lookup_device_by_imei(self.imei).formatted_name, '(Apple) - iPhone 13')
+
+
+class SingleFlightTests(BaseTestCase):
+    def test_concurrent_callers_share_one_fetch(self):
+        release = threading.Event()
+        calls = []
+
+        def slow_fetch(normalized, force_refresh, *quota):
+            calls.append(normalized)
+            release.wait(5)
+            return {'imei': normalized, 'brand': 'Apple', 'model': '', 'model_name': 'iPhone',
+                    'formatted_name': '(Apple) - iPhone', 'raw_payload': {}}
+
+        results = []
+        with patch('devices.services._fetch_and_store', side_effect=slow_fetch):
+            threads = [
+                threading.Thread(target=lambda i=i: results.append(
+                    _fetch_single_flight(f'3567890100000{i:02d}', False)))
+                for i in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+            sleep(0.2)  # let every follower join the flight before the leader returns
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertEqual({r['imei'] for r in results}, {f'3567890100000{i:02d}' for i in range(5)})
+
+    def test_follower_is_not_refused_with_the_leaders_quota(self):
+        release = threading.Event()
+        calls = []
+
+        def fetch(normalized, force_refresh, user_id, priority):
+            calls.append(priority)
+            if priority == LookupPriority.BACKGROUND:
+                release.wait(5)
+                raise ImeiLookupRateLimitError('limit')
+            return {'imei': normalized, 'brand': 'Apple', 'model': '', 'model_name': 'iPhone',
+                    'formatted_name': '(Apple) - iPhone', 'raw_payload': {}}
+
+        outcome = {}
+        with patch('devices.services._fetch_and_store', side_effect=fetch):
+            leader = threading.Thread(target=lambda: self.assertRaises(
+                ImeiLookupRateLimitError, _fetch_single_flight, '356789010000001', False, 1,
+                LookupPriority.BACKGROUND))
+            leader.start()
+            sleep(0.1)
+            follower = threading.Thread(target=lambda: outcome.update(
+                _fetch_single_flight('356789010000002', False, 2, LookupPriority.INTERACTIVE)))
+            follower.start()
+            sleep(0.1)
+            release.set()
+            leader.join(5)
+            follower.join(5)
+
+        self.assertEqual(calls, [LookupPriority.BACKGROUND, LookupPriority.INTERACTIVE])
+        self.assertEqual(outcome['imei'], '356789010000002')
+
+    def test_follower_for_another_imei_does_not_get_the_leaders_error(self):
+        release = threading.Event()
+        calls = []
+
+        def fetch(normalized, force_refresh, *quota):
+            calls.append(normalized)
+            if normalized == '356789010000001':
+                release.wait(5)
+                raise ImeiLookupError('not found', error_class='not_found')
+            return {'imei': normalized, 'brand': 'Apple', 'model': '', 'model_name': 'iPhone',
+                    'formatted_name': '(Apple) - iPhone', 'raw_payload': {}}
+
+        outcome = {}
+        with patch('devices.services._fetch_and_store', side_effect=fetch):
+            leader = threading.Thread(target=lambda: self.assertRaises(
+                ImeiLookupError, _fetch_single_flight, '356789010000001', False))
+            leader.start()
+            sleep(0.1)
+            follower = threading.Thread(target=lambda: outcome.update(
+                _fetch_single_flight('356789010000002', False)))
+            follower.start()
+            sleep(0.1)
+            release.set()
+            leader.join(5)
+            follower.join(5)
+
+        self.assertEqual(calls, ['356789010000001', '356789010000002'])
+        self.assertEqual(outcome['imei'], '356789010000002')
+
+    @patch('devices.services.requests.get')
+    def test_waits_for_result_fetched_by_another_worker(self, mock_get):
+        imei = '356789012345678'
+        shared_cache().add(_inflight_lock_key(imei), 1, timeout=15)
+        _store_result('356789019999999', {
+            'imei': '356789019999999', 'brand': 'Apple', 'model': '', 'model_name': 'iPhone',
+            'formatted_name': '(Apple) - iPhone', 'raw_payload': {},
+        })
+        caches['local'].clear()
+        result = _fetch_single_flight(imei, force_refresh=True)
+        self.assertEqual(result['imei'], imei)
+        mock_get.assert_not_called()
+
+
+class AsyncLookupTests(BaseTestCase):
+    @patch('devices.services._afetch_from_provider', new_callable=AsyncMock)
+    def test_concurrent_async_lookups_share_one_call(self, mock_fetch):
+        async def fake_fetch(normalized):
+            await asyncio.sleep(0.05)
+            return {'imei': normalized, 'brand': 'Apple', 'model': '', 'model_name': 'iPhone',
+                    'formatted_name': '(Apple) - iPhone', 'raw_payload': {}}
+
+        mock_fetch.side_effect = fake_fetch
+
+        async def run():
+            return await asyncio.gather(
+                alookup_device_by_imei('356789011111111'),
+                alookup_device_by_imei('356789012222222'),
+            )
+
+        first, second = async_to_sync(run)()
+        self.assertEqual(mock_fetch.await_count, 1)
+        self.assertEqual(first.imei, '356789011111111')
+        self.assertEqual(second.imei, '356789012222222')
+
+    @patch('devices.services._afetch_from_provider', new_callable=AsyncMock)
+    def test_cancelled_leader_does_not_cancel_followers(self, mock_fetch):
+        async def fake_fetch(normalized):
+            if normalized == '356789011111111':
+                await asyncio.sleep(5)
+            return {'imei': normalized, 'brand': 'Apple', 'model': '', 'model_name': 'iPhone',
+                    'formatted_name': '(Apple) - iPhone', 'raw_payload': {}}
+
+        mock_fetch.side_effect = fake_fetch
+
+        async def run():
+            leader = asyncio.ensure_future(alookup_device_by_imei('356789011111111'))
+            await asyncio.sleep(0.1)
+            follower = asyncio.ensure_future(alookup_device_by_imei('356789012222222'))
+            await asyncio.sleep(0.1)
+            leader.cancel()
+            return await follower
+
+        result = async_to_sync(run)()
+        self.assertEqual(result.imei, '356789012222222')
+        self.assertEqual(mock_fetch.await_count, 2)
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'flights'},
+        'local': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'flights-local'},
+    })
+    @patch('devices.services._hit_rate_limit', return_value=False)
+    @patch('devices.services._afetch_from_provider', new_callable=AsyncMock)
+    def test_lookups_on_separate_event_loops_share_one_call(self, mock_fetch, _limit):
+        # Под WSGI каждый запрос крутит свой event loop (async_to_sync): общий вызов должен работать и так.
+        async def fake_fetch(normalized):
+            await asyncio.sleep(0.3)
+            return {'imei': normalized, 'brand': 'Apple', 'model': '', 'model_name': 'iPhone',
+                    'formatted_name': '(Apple) - iPhone', 'raw_payload': {}}
+
+        mock_fetch.side_effect = fake_fetch
+        results = {}
+        # Второй ждёт в процессе, а не через межпроцессную блокировку с опросом кэша.
+        waits = patch('devices.services._await_other_worker', new_callable=AsyncMock, return_value=None)
+        threads = [
+            threading.Thread(target=lambda imei=imei: results.update(
+                {imei: asyncio.run(alookup_device_by_imei(imei))}))
+            for imei in ('356789011111111', '356789012222222')
+        ]
+        with waits as other_worker:
+            for thread in threads:
+                thread.start()
+                sleep(0.1)
+            for thread in threads:
+                thread.join(5)
+
+        other_worker.assert_not_awaited()
+        self.assertEqual(mock_fetch.await_count, 1)
+        self.assertEqual({imei: result.imei for imei, result in results.items()},
+                         {'356789011111111': '356789011111111', '356789012222222': '356789012222222'})
+
+    @patch('devices.views.alookup_device_by_imei', new_callable=AsyncMock)
+    def test_scan_endpoint_creates_device_asynchronously(self, mock_lookup):
+        mock_lookup.return_value = ImeiLookupResult(
+            imei='356789012345678', brand='Apple', model='A2633', model_name='iPhone',
+            formatted_name='(Apple) - iPhone', raw_payload={},
+        )
+        operator = self.create_user(username='scanner', role=UserProfile.Roles.OPERATOR)
+        self.client.login(username=operator.username, password=operator._plain_password)
+        response = self.client.post(
+            reverse('add_from_scan'), {'imei': '356789012345678'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        device = Device.objects.get(imei='356789012345678', model_name='(Apple) - iPhone')
+        self.assertEqual(device.device_model.model_code, 'A2633')
+
+
+@override_settings(IMEICHECK_BATCH_WORKERS=1, IMEICHECK_RATE_LIMIT=1, IMEICHECK_OPERATOR_FLOOR=0)
+@patch('devices.services._rate_limit_key', return_value='imeicheck:rate:test')
+class BatchLookupTests(BaseTestCase):
+    @patch('devices.services.requests.get')
+    def test_batch_collapses_by_tac_and_defers_over_limit(self, mock_get, _key):
+        mock_get.return_value = provider_response(SUCCESS_PAYLOAD)
+        batch = lookup_devices_batch(['356789011111111', '356789012222222', '111111111111111', '123'])
+
+        mock_get.assert_called_once()
+        self.assertEqual(batch.results['356789012222222'].formatted_name, '(Apple) - iPhone 13')
+        self.assertEqual(batch.results['356789012222222'].imei, '356789012222222')
+        self.assertEqual(batch.deferred, ['111111111111111'])
+        self.assertIn('123', batch.errors)
+
+    @override_settings(
+        IMEICHECK_BATCH_WORKERS=4, IMEICHECK_RATE_LIMIT=30,
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'batch-cold'},
+            'local': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'batch-cold-local'},
+        },
+    )
+    def test_batch_on_cold_import_is_thread_safe(self, _key):
+        # Клиент, который ещё не импортирован: первый доступ к нему идёт сразу из четырёх потоков.
+        with tempfile.TemporaryDirectory() as path:
+            with open(f'{path}/cold_http_client.py', 'w') as module:
+                module.write(
+                    'import time\n'
+                    'from unittest.mock import Mock\n'
+                    'time.sleep(0.2)\n'
+                    'class RequestException(Exception):\n'
+                    '    pass\n'
+                    'def get(url, params=None, timeout=None):\n'
+                    f'    return Mock(status_code=200, json=Mock(return_value={SUCCESS_PAYLOAD!r}))\n'
+                )
+            sys.path.insert(0, path)
+            self.addCleanup(sys.path.remove, path)
+            self.addCleanup(sys.modules.pop, 'cold_http_client', None)
+            # Лимитер держит транзакцию в базе, а потоки тестов SQLite её не разделяют; здесь он не нужен.
+            with patch('devices.services.requests', lazy_import('cold_http_client')), \
+                    patch('devices.services._hit_rate_limit', return_value=False):
+                batch = lookup_devices_batch(
+                    ['356789011111111', '356789021111111', '356789031111111', '356789041111111']
+                )
+
+        self.assertEqual(batch.errors, {})
+        self.assertEqual(batch.deferred, [])
+        self.assertEqual(len(batch.results), 4)
+
+    def test_batch_endpoint_returns_per_imei_results(self, _key):
+        operator = self.create_user(username='operator', role=UserProfile.Roles.OPERATOR)
+        self.client.login(username=operator.username, password=operator._plain_password)
+        _store_result('356789011111111', {
+            'imei': '356789011111111', 'brand': 'Apple', 'model': '', 'model_name': 'iPhone',
+            'formatted_name': '(Apple) - iPhone', 'raw_payload': {},
+        })
+        response = self.client.post(
+            reverse('imei_lookup_batch'), {'imeis': ['356789019999999']}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['results']['356789019999999']['formatted_name'], '(Apple) - iPhone')
+        self.assertEqual(data['deferred'], [])
+
+
+@override_settings(DEVICE_EVENTS_POLL_INTERVAL=0, DEVICE_EVENTS_STREAM_TIMEOUT=0.05)
+class DeviceEventStreamTests(BaseTestCase):
+    def test_writes_are_logged_and_streamed_after_last_event_id(self):
+        user = self.create_user(username='admin', role=UserProfile.Roles.ADMIN)
+        device = Device.objects.create(imei='356789012345678', model_name='Phone', added_by=user)
+        first = DeviceEvent.objects.get()
+        self.assertEqual(first.event_type, DeviceEvent.Types.CREATED)
+
+        device.status = Device.STATUS_SOLD
+        device.save()
+        log_device_history(device, user, Device.STATUS_IN_STOCK, Device.STATUS_SOLD, '', '')
+
+        self.client.login(username=user.username, password=user._plain_password)
+        response = self.client.get(reverse('device_events'), HTTP_LAST_EVENT_ID=str(first.pk))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        # Под WSGI ответ короткий: события на сейчас и курсор для следующего переподключения.
+        self.assertFalse(response.streaming)
+        body = response.content.decode()
+        self.assertNotIn(f'"event_id": {first.pk},', body)
+        self.assertIn('"type": "status_changed"', body)
+        self.assertIn('"previous_status": "in_stock"', body)
+        latest = DeviceEvent.objects.latest('id').pk
+        self.assertTrue(body.rstrip().split('\n\n')[-1].startswith(f'id: {latest}:{first.pk}\n'))
+
+    def test_recent_events_below_the_cursor_are_sent_again(self):
+        user = self.create_user(username='admin', role=UserProfile.Roles.ADMIN)
+        start = latest_event_id()
+        late = Device.objects.create(imei='356789012345678', added_by=user)
+        Device.objects.create(imei='356789012345679', added_by=user)
+        cursor = DeviceEvent.objects.latest('id').pk
+
+        # Клиент уже на последнем событии, но событие с меньшим id могло закоммититься позже.
+        self.client.login(username=user.username, password=user._plain_password)
+        body = self.client.get(reverse('device_events'), HTTP_LAST_EVENT_ID=f'{cursor}:{start}').content.decode()
+        self.assertIn(f'"device_id": {late.pk},', body)
+
+        with override_settings(DEVICE_EVENTS_REORDER_WINDOW=0):
+            body = self.client.get(reverse('device_events'), HTTP_LAST_EVENT_ID=f'{cursor}:{start}').content.decode()
+        self.assertNotIn('event: device', body)
+        # Ниже начала потока страница уже отрисована с этими изменениями — повторять их нельзя.
+        body = self.client.get(reverse('device_events'), HTTP_LAST_EVENT_ID=f'{cursor}:{cursor}').content.decode()
+        self.assertNotIn('event: device', body)
+
+
+class ConditionalGetTests(BaseTestCase):
+    def test_unchanged_list_returns_304_until_a_device_changes(self):
+        user = self.create_user(username='guest')
+        self.client.login(username=user.username, password=user._plain_password)
+        url = reverse('device_list') + '?status=in_stock'
+
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.templates, [])
+
+        Device.objects.create(imei='356789012345678', added_by=user)
+        third = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third['ETag'], etag)
+
+
+class DeviceRowFragmentTests(BaseTestCase):
+    def test_rows_are_cached_until_the_device_is_saved(self):
+        user = self.create_user(username='admin', role=UserProfile.Roles.ADMIN)
+        device = Device.objects.create(imei='356789012345678', model_name='Before', added_by=user)
+        devices = lambda: Device.objects.select_related('added_by')  # noqa: E731
+
+        with patch('devices.fragments.render_to_string', wraps=render_to_string) as render:
+            first = render_device_rows(devices(), user, True, True)
+            render_device_rows(devices(), user, True, True)
+            self.assertEqual(render.call_count, 1)
+            self.assertIn('Before', first[0])
+
+            device.model_name = 'After'
+            device.save()
+            caches['local'].clear()
+            updated = render_device_rows(devices(), user, True, True)
+            self.assertEqual(render.call_count, 2)
+            self.assertIn('After', updated[0])
+
+
+class ImeiSnapshotTests(BaseTestCase):
+    def test_pack_round_trip_is_sorted(self):
+        packed = pack_imeis(['356789012345678', '012345678901234', 'not-an-imei'])
+        self.assertEqual(unpack_imeis(packed), [12345678901234, 356789012345678])
+
+    def test_endpoint_returns_full_snapshot_then_delta(self):
+        user = self.create_user(username='operator', role=UserProfile.Roles.OPERATOR)
+        kept = Device.objects.create(imei='356789012345678', added_by=user)
+        gone = Device.objects.create(imei='356789012345679', added_by=user)
+        self.client.login(username=user.username, password=user._plain_password)
+        url = reverse('imei_snapshot')
+
+        full = self.client.get(url).json()
+        self.assertTrue(full['full'])
+        self.assertEqual(unpack_imeis(full['imeis']), [int(kept.imei), int(gone.imei)])
+
+        gone.delete()
+        Device.objects.create(imei='356789012345680', added_by=user)
+        delta = self.client.get(url, {'since': full['version']}).json()
+        self.assertFalse(delta['full'])
+        self.assertGreater(delta['version'], full['version'])
+        self.assertEqual(unpack_imeis(delta['added']), [356789012345680])
+        self.assertEqual(unpack_imeis(delta['removed']), [356789012345679])
+
+
+class ImeiNumberTests(BaseTestCase):
+    def test_integer_column_backs_lookup_and_uniqueness(self):
+        user = self.create_user(role=UserProfile.Roles.ADMIN)
+        device = Device.objects.create(imei='012345678901234', model_name='Pixel', added_by=user)
+        self.assertEqual(device.imei_number, 12345678901234)
+        self.assertEqual(Device.objects.with_imei('012345678901234').get().imei, '012345678901234')
+        self.assertFalse(Device.objects.with_imei('12345').exists())
+
+        filtered = apply_device_filters(Device.objects.all(), {'search': '012345678901234'})
+        self.assertEqual(list(filtered), [device])
+
+        duplicate = Device(imei='012345678901234', added_by=user)
+        with self.assertRaises(ValidationError):
+            duplicate.validate_unique()
+
+    def test_bulk_paths_keep_the_number_and_the_duplicate_guard(self):
+        user = self.create_user(role=UserProfile.Roles.ADMIN)
+        Device.objects.bulk_create([
+            Device(imei='356789012345678', added_by=user),
+            Device(imei='356789012345679', added_by=user),
+        ])
+        self.assertEqual(Device.objects.with_imei('356789012345678').count(), 1)
+
+        Device.objects.filter(imei='356789012345679').update(imei='356789012345680')
+        self.assertEqual(Device.objects.with_imei('356789012345680').get().imei_number, 356789012345680)
+
+        # Уникальность — на самой строке IMEI, даже если число не заполнено (сырой SQL).
+        Device.objects.filter(imei='356789012345678').update(imei_number=None)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            QuerySet(model=Device).bulk_create([Device(imei='356789012345678', added_by=user)])
+
+
+class AdminScalingTests(BaseTestCase):
+    def test_history_changelist_queries_do_not_grow_with_rows(self):
+        admin_user = User.objects.create_superuser('root', 'root@example.com', 'pass12345')
+        self.client.force_login(admin_user)
+        device = Device.objects.create(imei='356789012345678', added_by=admin_user)
+        url = reverse('admin:devices_devicehistory_changelist')
+
+        log_device_history(device, admin_user, Device.STATUS_IN_STOCK, Device.STATUS_SOLD, '', '')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url, {'q': device.imei})
+        for _ in range(5):
+            log_device_history(device, admin_user, Device.STATUS_SOLD, Device.STATUS_IN_STOCK, '', '')
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url, {'q': device.imei})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 6)
+        self.assertEqual(len(many.captured_queries), len(few.captured_queries))
+
+    def test_device_comment_search_is_opt_in(self):
+        admin_user = User.objects.create_superuser('root', 'root@example.com', 'pass12345')
+        self.client.force_login(admin_user)
+        Device.objects.create(imei='356789012345678', comment='разбит экран', added_by=admin_user)
+        url = reverse('admin:devices_device_changelist')
+        self.assertEqual(len(self.client.get(url, {'q': 'экран'}).context['cl'].result_list), 0)
+        found = self.client.get(url, {'q': 'comment: экран'}).context['cl'].result_list
+        self.assertEqual([device.imei for device in found], ['356789012345678'])
+
+    def test_paginator_switches_to_estimate_above_limit(self):
+        user = self.create_user()
+        for offset in range(3):
+            Device.objects.create(imei=f'35678901234567{offset}', added_by=user)
+
+        exact = EstimatedCountPaginator(Device.objects.all(), 10, exact_limit=5)
+        self.assertEqual((exact.count, exact.is_estimated), (3, False))
+
+        capped = EstimatedCountPaginator(Device.objects.filter(status=Device.STATUS_IN_STOCK), 10, exact_limit=2)
+        self.assertEqual((capped.count, capped.is_estimated), (3, True))
+
+        with patch('devices.pagination.estimated_row_count', return_value=1_200_000):
+            estimated = EstimatedCountPaginator(Device.objects.all(), 10, exact_limit=2)
+            self.assertEqual((estimated.count, estimated.is_estimated), (1_200_000, True))
+
+
+class ApproximateCountTests(BaseTestCase):
+    def test_format_count(self):
+        self.assertEqual(format_count(1234), '1\xa0234')
+        self.assertEqual(format_count(1_234_567, approximate=True), '~1,2\xa0млн')
+        self.assertEqual(format_count(12_345, approximate=True), '~12,3\xa0тыс.')
+
+    @override_settings(EXACT_COUNT_LIMIT=2)
+    def test_device_list_shows_cached_approximate_count(self):
+        user = self.create_user()
+        for offset in range(3):
+            Device.objects.create(imei=f'35678901234567{offset}', added_by=user)
+        self.client.login(username=user.username, password=user._plain_password)
+
+        with patch.object(EstimatedCountPaginator, '_cached_count', wraps=lambda qs: 1_200_000) as counted:
+            response = self.client.get(reverse('device_list'), {'status': Device.STATUS_IN_STOCK})
+        counted.assert_called_once()
+        self.assertEqual(response.context['devices_count'], '~1,2\xa0млн')
+        self.assertContains(response, '~1,2\xa0млн')
+
+
+class ReplicaRoutingTests(BaseTestCase):
+    @patch('devices.routers.replica_configured', return_value=True)
+    def test_router_sends_only_scoped_app_reads_to_replica(self, _configured):
+        router = ReplicaRouter()
+        cache_model = caches['default'].cache_model_class
+        self.assertEqual(router.db_for_read(Device), 'default')
+        with reading_from_replica():
+            self.assertEqual(router.db_for_read(Device), REPLICA_DB_ALIAS)
+            self.assertEqual(router.db_for_read(User), REPLICA_DB_ALIAS)
+            self.assertEqual(router.db_for_read(cache_model), 'default')
+            self.assertEqual(router.db_for_write(Device), 'default')
+        self.assertFalse(router.allow_migrate(REPLICA_DB_ALIAS, 'devices'))
+
+    @patch('devices.views.replica_configured', return_value=True)
+    def test_write_pins_following_reads_to_primary(self, _configured):
+        user = self.create_user(username='admin', role=UserProfile.Roles.ADMIN)
+        device = Device.objects.create(imei='356789012345678', added_by=user)
+        self.client.login(username=user.username, password=user._plain_password)
+
+        with patch('devices.views.reading_from_replica', wraps=reading_from_replica) as replica:
+            self.client.get(reverse('device_list'))
+            self.assertEqual(replica.call_count, 1)
+
+            response = self.client.post(
+                reverse('device_status', args=[device.pk]), {'status': Device.STATUS_SOLD}
+            )
+            self.assertIn(PRIMARY_PIN_COOKIE, response.cookies)
+            self.client.get(reverse('device_list'))
+            self.assertEqual(replica.call_count, 1)
+
+    @patch('devices.views.replica_configured', return_value=True)
+    def test_pages_read_from_replica_carry_no_etag(self, _configured):
+        # Версия данных — с primary, а страница — с отстающей реплики: такой ETag закешировал бы старую страницу.
+        user = self.create_user(username='admin', role=UserProfile.Roles.ADMIN)
+        device = Device.objects.create(imei='356789012345678', added_by=user)
+        self.client.login(username=user.username, password=user._plain_password)
+        response = self.client.get(reverse('device_list'))
+        self.assertNotIn('ETag', response)
+        self.assertEqual(self.client.get(reverse('device_list'), HTTP_IF_NONE_MATCH='*').status_code, 200)
+
+        self.client.post(reverse('device_status', args=[device.pk]), {'status': Device.STATUS_SOLD})
+        self.assertIn('ETag', self.client.get(reverse('device_list')))
+
+
+class StreamingIterationTests(BaseTestCase):
+    @override_settings(DB_ITERATOR_CHUNK_SIZE=1)
+    def test_cleanup_trash_deletes_in_batches(self):
+        user = self.create_user()
+        old = timezone.now() - timedelta(days=31)
+        for offset in range(2):
+            Device.objects.create(
+                imei=f'35678901234567{offset}', status=Device.STATUS_TRASH, deleted_at=old, added_by=user
+            )
+        kept = Device.objects.create(imei='356789012345679', status=Device.STATUS_TRASH, deleted_at=timezone.now(), added_by=user)
+
+        with patch('devices.management.commands.cleanup_trash.iter_pk_batches', wraps=iter_pk_batches) as batches:
+            call_command('cleanup_trash', stdout=StringIO())
+        batches.assert_called_once()
+        self.assertEqual(list(Device.objects.values_list('pk', flat=True)), [kept.pk])
+        self.assertEqual(DeviceEvent.objects.filter(event_type=DeviceEvent.Types.DELETED).count(), 2)
+
+    def test_export_streams_rows_into_workbook(self):
+        from openpyxl import load_workbook
+
+        user = self.create_user(username='admin', role=UserProfile.Roles.ADMIN)
+        Device.objects.create(imei='356789012345678', model_name='Pixel', added_by=user)
+        self.client.login(username=user.username, password=user._plain_password)
+
+        response = self.client.get(reverse('export_devices'))
+        rows = list(load_workbook(BytesIO(response.content)).active.values)
+        self.assertEqual(rows[0][0], 'IMEI')
+        self.assertEqual(rows[1][:2], ('356789012345678', 'Pixel'))
+
+
+class StatusTransitionTests(BaseTestCase):
+    def test_transition_is_one_update_plus_history(self):
+        user = self.create_user(role=UserProfile.Roles.ADMIN)
+        device = Device.objects.create(imei='356789012345678', added_by=user)
+        version = data_version()
+
+        with CaptureQueriesContext(connection) as queries:
+            transition_device(device, Device.STATUS_SOLD, changed_by=user)
+        statements = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "devices_device"')]
+        self.assertEqual(len(statements), 1)
+        self.assertIn('"status" = ', statements[0].split('WHERE')[1])
+        self.assertEqual(Device.objects.get(pk=device.pk).status, Device.STATUS_SOLD)
+        self.assertEqual(device.history.get().new_status, Device.STATUS_SOLD)
+        self.assertNotEqual(data_version(), version)
+
+    def test_concurrent_change_is_reported_not_overwritten(self):
+        user = self.create_user(role=UserProfile.Roles.ADMIN)
+        device = Device.objects.create(imei='356789012345678', added_by=user)
+        stale = Device.objects.get(pk=device.pk)
+        transition_device(device, Device.STATUS_SOLD, changed_by=user)
+
+        with self.assertRaises(DeviceTransitionConflict) as conflict:
+            transition_device(stale, Device.STATUS_WRITTEN_OFF, changed_by=user)
+        self.assertEqual(conflict.exception.current_status, Device.STATUS_SOLD)
+        self.assertEqual(Device.objects.get(pk=device.pk).status, Device.STATUS_SOLD)
+        self.assertEqual(device.history.count(), 1)
+
+        self.client.login(username=user.username, password=user._plain_password)
+        response = self.client.post(
+            reverse('device_status', args=[device.pk]),
+            {'status': Device.STATUS_WRITTEN_OFF, 'expected_status': Device.STATUS_IN_STOCK},
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['status'], Device.STATUS_SOLD)
+
+    def test_edit_form_moves_status_through_transition(self):
+        user = self.create_user(role=UserProfile.Roles.ADMIN)
+        device = Device.objects.create(imei='356789012345672', model_name='iPhone', added_by=user)
+        self.client.login(username=user.username, password=user._plain_password)
+        response = self.client.post(reverse('device_edit', args=[device.pk]), {
+            'imei': device.imei, 'model_name': 'iPhone', 'status': Device.STATUS_SOLD, 'comment': 'продан',
+        })
+
+        self.assertRedirects(response, reverse('device_list'), fetch_redirect_response=False)
+        device.refresh_from_db()
+        self.assertEqual((device.status, device.comment), (Device.STATUS_SOLD, 'продан'))
+        history = list(device.history.order_by('pk').values_list('previous_status', 'new_status', 'new_comment'))
+        self.assertEqual(history, [
+            (Device.STATUS_IN_STOCK, Device.STATUS_IN_STOCK, 'продан'),
+            (Device.STATUS_IN_STOCK, Device.STATUS_SOLD, 'продан'),
+        ])
+
+    def test_edit_form_reports_conflict_and_saves_nothing(self):
+        user = self.create_user(role=UserProfile.Roles.ADMIN)
+        device = Device.objects.create(imei='356789012345672', model_name='iPhone', added_by=user)
+        self.client.login(username=user.username, password=user._plain_password)
+        conflict = DeviceTransitionConflict(device, Device.STATUS_IN_STOCK, Device.STATUS_WRITTEN_OFF)
+        with patch('devices.views.transition_device', side_effect=conflict):
+            response = self.client.post(reverse('device_edit', args=[device.pk]), {
+                'imei': device.imei, 'model_name': 'Другая', 'status': Device.STATUS_SOLD, 'comment': '',
+            })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(str(conflict), response.context['form'].errors['status'])
+        device.refresh_from_db()
+        self.assertEqual((device.status, device.model_name), (Device.STATUS_IN_STOCK, 'iPhone'))
+        self.assertFalse(device.history.exists())
+
+
+class OperatorActivityTests(BaseTestCase):
+    def _counters(self):
+        return set(OperatorDailyActivity.objects.values_list('user__username', 'kind', 'count'))
+
+    def test_writes_update_rollups_and_rebuild_agrees(self):
+        admin = self.create_user(username='admin', role=UserProfile.Roles.ADMIN)
+        operator = self.create_user(username='operator', role=UserProfile.Roles.OPERATOR)
+        first = Device.objects.create(imei='356789012345678', added_by=operator)
+        Device.objects.create(imei='356789012345679', added_by=operator)
+        transition_device(first, Device.STATUS_SOLD, changed_by=admin)
+
+        expected = {('operator', 'added', 2), ('admin', 'sold', 1)}
+        self.assertEqual(self._counters(), expected)
+        OperatorDailyActivity.objects.all().delete()
+        rebuild_rollups()
+        self.assertEqual(self._counters(), expected)
+
+    def test_full_rebuild_refuses_a_start_date(self):
+        operator = self.create_user(username='operator', role=UserProfile.Roles.OPERATOR)
+        Device.objects.create(imei='356789012345678', added_by=operator)
+        with self.assertRaises(CommandError):
+            call_command('rollup_activity', '--full', '--since', timezone.localdate().isoformat(), stdout=StringIO())
+        self.assertEqual(self._counters(), {('operator', 'added', 1)})
+
+    def test_json_endpoint_reads_rollups(self):
+        admin = self.create_user(username='admin', role=UserProfile.Roles.ADMIN)
+        Device.objects.create(imei='356789012345678', added_by=admin)
+        self.client.login(username=admin.username, password=admin._plain_password)
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse('operator_activity_json'), {'days': 7}).json()
+        self.assertEqual(data['totals'], [{'user_id': admin.pk, 'username': 'admin', 'added': 1, 'sold': 0, 'written_off': 0}])
+        self.assertEqual(data['rows'][0]['day'], timezone.localdate().isoformat())
+        touched = ' '.join(q['sql'] for q in queries.captured_queries)
+        self.assertNotIn('"devices_device"', touched)
+        self.assertNotIn('"devices_devicehistory"', touched)
+
+
+class InventorySnapshotTests(BaseTestCase):
+    def _snapshot(self, day):
+        return set(InventorySnapshot.objects.filter(day=day).values_list('model_name', 'status', 'count'))
+
+    def test_snapshots_bootstrap_backwards_and_continue_forwards(self):
+        user = self.create_user(role=UserProfile.Roles.ADMIN)
+        now = timezone.now()
+        today = timezone.localdate()
+        sold = Device.objects.create(imei='356789012345678', model_name='X', added_by=user)
+        kept = Device.objects.create(imei='356789012345679', model_name='X', added_by=user)
+        Device.objects.filter(pk=sold.pk).update(date_added=now - timedelta(days=3), status=Device.STATUS_SOLD)
+        Device.objects.filter(pk=kept.pk).update(date_added=now - timedelta(days=2))
+        DeviceHistory.objects.create(
+            device=sold, changed_by=user, previous_status=Device.STATUS_IN_STOCK,
+            new_status=Device.STATUS_SOLD, changed_at=now - timedelta(days=1),
+        )
+
+        yesterday, before = today - timedelta(days=1), today - timedelta(days=2)
+        self.assertEqual(take_snapshots(backfill_days=1), [yesterday, before])
+        expected_yesterday = {('X', Device.STATUS_IN_STOCK, 1), ('X', Device.STATUS_SOLD, 1)}
+        self.assertEqual(self._snapshot(yesterday), expected_yesterday)
+        self.assertEqual(self._snapshot(before), {('X', Device.STATUS_IN_STOCK, 2)})
+
+        InventorySnapshot.objects.filter(day=yesterday).delete()
+        self.assertEqual(take_snapshots(), [yesterday])
+        self.assertEqual(self._snapshot(yesterday), expected_yesterday)
+        self.assertEqual(take_snapshots(), [])
+
+    def test_backfill_does_not_drift_through_a_negative_day(self):
+        # История, записанная не по порядку: при откате вчерашнего дня «продано» уходит в минус,
+        # а позавчерашний день возвращает его в ноль. Обрезка на каждом шаге оставила бы лишнюю продажу.
+        user = self.create_user(role=UserProfile.Roles.ADMIN)
+        now = timezone.now()
+        today = timezone.localdate()
+        device = Device.objects.create(imei='356789012345678', model_name='Y', added_by=user)
+        Device.objects.filter(pk=device.pk).update(date_added=now - timedelta(days=10))
+        DeviceHistory.objects.create(
+            device=device, changed_by=user, previous_status=Device.STATUS_IN_STOCK,
+            new_status=Device.STATUS_SOLD, changed_at=now - timedelta(days=1),
+        )
+        DeviceHistory.objects.create(
+            device=device, changed_by=user, previous_status=Device.STATUS_SOLD,
+            new_status=Device.STATUS_IN_STOCK, changed_at=now - timedelta(days=2),
+        )
+
+        take_snapshots(backfill_days=2)
+        self.assertEqual(self._snapshot(today - timedelta(days=2)), {('Y', Device.STATUS_IN_STOCK, 2)})
+        self.assertEqual(self._snapshot(today - timedelta(days=3)), {('Y', Device.STATUS_IN_STOCK, 1)})
+
+    def test_hard_deletions_outlive_event_retention(self):
+        user = self.create_user(role=UserProfile.Roles.ADMIN)
+        device = Device.objects.create(
+            imei='356789012345678', model_name='Z', status=Device.STATUS_TRASH,
+            deleted_at=timezone.now() - timedelta(days=31), added_by=user,
+        )
+        record_device_event(device, DeviceEvent.Types.STATUS_CHANGED)
+        call_command('cleanup_trash', stdout=StringIO())
+        old = timezone.now() - timedelta(days=10)
+        DeviceEvent.objects.update(created_at=old)
+
+        prune_device_events()
+        self.assertEqual(
+            list(DeviceEvent.objects.values_list('event_type', flat=True)), [DeviceEvent.Types.DELETED]
+        )
+        self.assertEqual(day_deltas(timezone.localdate(old))[('Z', Device.STATUS_TRASH)], -1)
+
+
+class DeviceModelCatalogTests(BaseTestCase):
+    def test_devices_link_to_one_catalog_entry_per_model(self):
+        self.assertEqual(split_model_name('(Apple)  -  iPhone 13'), ('Apple', 'iPhone 13'))
+        self.assertEqual(split_model_name('Nokia 3310'), ('', 'Nokia 3310'))
+        user = self.create_user(role=UserProfile.Roles.OPERATOR)
+        first = Device.objects.create(imei='356789012345678', model_name='(Apple) - iPhone 13', added_by=user)
+        second = Device.objects.create(imei='356789012345679', model_name='(apple) - IPHONE 13', added_by=user)
+        other = Device.objects.create(imei='356789112345670', model_name='(Samsung) - Galaxy S21', added_by=user)
+
+        self.assertEqual(first.device_model_id, second.device_model_id)
+        self.assertEqual(DeviceModel.objects.count(), 2)
+        self.assertEqual(first.device_model.tacs, ['35678901'])
+
+        other.model_name = '(Apple) - iPhone 13'
+        other.save()
+        self.assertEqual(other.device_model_id, first.device_model_id)
+        filtered = apply_device_filters(Device.objects.all(), {'brand': 'APPLE'})
+        self.assertEqual(filtered.count(), 3)
+        self.assertEqual(DeviceModel.objects.brands(), ['Apple', 'Samsung'])
+
+    def test_lookup_result_records_model_code(self):
+        lookup = ImeiLookupResult(
+            imei='356789012345678', brand='Apple', model='A2633', model_name='iPhone 13',
+            formatted_name='(Apple) - iPhone 13', raw_payload={},
+        )
+        entry = catalog_model_for(lookup)
+        self.assertEqual((entry.brand, entry.name, entry.model_code), ('Apple', 'iPhone 13', 'A2633'))
+        self.assertEqual(catalog_model_for(lookup).pk, entry.pk)
+
+
+class FacetCountTests(BaseTestCase):
+    def test_facets_skip_own_selection_and_follow_writes(self):
+        alice = self.create_user(username='alice', role=UserProfile.Roles.OPERATOR)
+        bob = self.create_user(username='bob', role=UserProfile.Roles.OPERATOR)
+        Device.objects.create(imei='356789012345678', model_name='(Apple) - iPhone 13', added_by=alice)
+        Device.objects.create(imei='356789012345679', model_name='(Samsung) - S21', added_by=alice, status=Device.STATUS_SOLD)
+        Device.objects.create(imei='356789012345680', model_name='(Apple) - iPhone 12', added_by=bob)
+        base = Device.objects.exclude(status=Device.STATUS_TRASH)
+
+        facets = facet_counts(base, {'status': Device.STATUS_IN_STOCK, 'brand': 'APPLE'})
+        self.assertEqual(facets['status'], {Device.STATUS_IN_STOCK: 2})
+        self.assertEqual(facets['user'], {str(alice.pk): 1, str(bob.pk): 1})
+        self.assertEqual(facets['brand'], {'apple': 2})
+
+        with CaptureQueriesContext(connection) as queries:
+            facet_counts(base, {'user': str(bob.pk)})
+        self.assertNotIn('"devices_device"', ' '.join(q['sql'] for q in queries.captured_queries))
+        Device.objects.create(imei='356789012345681', model_name='(Apple) - iPhone 12', added_by=bob)
+        self.assertEqual(facet_counts(base, {'user': str(bob.pk)})['brand'], {'apple': 2})
+
+    def test_device_list_shows_counts_in_filters(self):
+        admin = self.create_user(username='admin', role=UserProfile.Roles.ADMIN)
+        Device.objects.create(imei='356789012345678', model_name='(Apple) - iPhone 13', added_by=admin)
+        self.client.login(username=admin.username, password=admin._plain_password)
+        response = self.client.get(reverse('device_list'), {'status': Device.STATUS_SOLD})
+        self.assertContains(response, 'Apple (0)')
+        self.assertEqual(response.context['statuses'][0][2], 1)
+
+
+class ImportProfileTests(TestCase):
+    def test_lazy_import_defers_module_code(self):
+        sys.modules.pop('colorsys', None)
+        self.addCleanup(sys.modules.pop, 'colorsys', None)
+        module = lazy_import('colorsys')
+        self.assertNotIn('colorsys', sys.modules)
+        self.assertEqual(module.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertIn('colorsys', sys.modules)
+
+    def test_parse_importtime_output(self):
+        timings = parse_importtime([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       120 |        120 |     devices.cache',
+            'import time:      1500 |       1620 |   devices.views',
+            'something else',
+        ])
+        self.assertEqual([(t.module, t.self_us, t.cumulative_us, t.depth) for t in timings], [
+            ('devices.cache', 120, 120, 2),
+            ('devices.views', 1500, 1620, 1),
+        ])
+
+
+class StaticBundleTests(BaseTestCase):
+    def test_bundle_concatenates_sources_in_order(self):
+        with override_settings(
+            STATIC_BUNDLES={'js/test.bundle.js': ['js/status.js', 'js/live.js']},
+            STATIC_BUNDLE_DIR=tempfile.mkdtemp(),
+        ):
+            finder = BundleFinder()
+            self.assertEqual(finder.check(), [])
+            self.assertIsNone(finder.find('js/status.js'))
+            with open(finder.find('js/test.bundle.js'), encoding='utf-8') as bundle:
+                content = bundle.read()
+        self.assertLess(content.index('/* js/status.js */'), content.index('/* js/live.js */'))
+        self.assertIn('window.LIVE_UPDATES', content)
+
+    def test_scan_page_loads_one_script(self):
+        operator = self.create_user(username='scanner', role=UserProfile.Roles.OPERATOR)
+        self.client.login(username=operator.username, password=operator._plain_password)
+        response = self.client.get(reverse('scan'))
+        self.assertContains(response, 'js/scan.bundle')
+        self.assertNotContains(response, 'js/scanner.js')
+
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class LeanWritesTests(BaseTestCase):
+    def test_plain_get_pages_do_not_write(self):
+        admin = self.create_user(username='admin', role=UserProfile.Roles.ADMIN)
+        device = Device.objects.create(imei='356789012345678', model_name='(Apple) - iPhone 13', added_by=admin)
+        self.client.login(username=admin.username, password=admin._plain_password)
+        urls = [
+            reverse('dashboard'),
+            reverse('device_list'),
+            reverse('device_list') + '?status=in_stock&search=iPhone',
+            reverse('device_history', args=[device.pk]),
+            reverse('scan'),
+            reverse('operator_activity'),
+        ]
+        # Холодный кэш: фрагменты строк, фасеты и счётчики при DatabaseCache живут в caches['local']
+        # (derived_cache), так что и первый GET ничего не пишет. Версия данных уже есть — её записало
+        # создание устройства, а не чтение.
+        for url in urls:
+            caches['local'].clear()
+            with self.subTest(url=url), CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            writes = [q['sql'] for q in queries.captured_queries if q['sql'].lstrip().upper().startswith(WRITE_PREFIXES)]
+            self.assertEqual(writes, [], url)
+
+    def test_login_and_registration_touch_profile_once(self):
+        user = self.create_user(username='guest')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.login(username=user.username, password=user._plain_password)
+        self.assertFalse(any('devices_userprofile' in q['sql'] for q in queries.captured_queries))
+        self.client.logout()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('register'), {
+                'username': 'newbie', 'email': 'newbie@example.com', 'first_name': 'New', 'last_name': 'Bie',
+                'password1': 'Str0ng-pass-42', 'password2': 'Str0ng-pass-42',
+            })
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        profile_writes = [
+            q['sql'] for q in queries.captured_queries
+            if 'devices_userprofile' in q['sql'] and q['sql'].lstrip().upper().startswith(WRITE_PREFIXES)
+        ]
+        self.assertEqual(len(profile_writes), 1)
+        profile = User.objects.get(username='newbie').profile
+        self.assertEqual((profile.role, profile.can_delete_devices), (UserProfile.Roles.GUEST, False))
+
+
+@override_settings(IMEICHECK_RATE_LIMIT=10, IMEICHECK_OPERATOR_FLOOR=2)
+@patch('devices.services._rate_limit_key', return_value='imeicheck:rate:test')
+class QuotaSchedulingTests(BaseTestCase):
+    def _admitted(self, calls, **kwargs):
+        return sum(not _hit_rate_limit(**kwargs) for _ in range(calls))
+
+    def test_bulk_operator_leaves_a_share_for_others(self, _key):
+        self.assertEqual(self._admitted(1, user_id=2), 1)
+        self.assertEqual(self._admitted(1, user_id=3), 1)
+        # Сверх своего резерва пакетный оператор берёт только то, что не зарезервировано за другими.
+        self.assertEqual(self._admitted(10, user_id=1), 4)
+        self.assertEqual(self._admitted(5, user_id=2), 1)
+        self.assertEqual(self._admitted(5, user_id=3), 1)
+        # Резерв для ещё не появившегося оператора тоже на месте.
+        self.assertEqual(self._admitted(5, user_id=4), 2)
+
+    def test_lower_priorities_take_only_their_share(self, _key):
+        # Прогрев без пользователя тоже оставляет резерв оператору, который ещё не появился.
+        self.assertEqual(self._admitted(10, priority=LookupPriority.WARMUP), 3)
+        self.assertEqual(self._admitted(10, priority=LookupPriority.BACKGROUND), 3)
+        self.assertEqual(self._admitted(10, priority=LookupPriority.INTERACTIVE), 2)
+
+    def test_anonymous_calls_leave_operator_floors_alone(self, _key):
+        self.assertEqual(self._admitted(1, user_id=1), 1)
+        self.assertEqual(self._admitted(10, priority=LookupPriority.INTERACTIVE), 6)
+        # Остаток резерва первого оператора и резерв нового — на месте.
+        self.assertEqual(self._admitted(5, user_id=1), 1)
+        self.assertEqual(self._admitted(5, user_id=2), 2)
+
+
+class AuditLogTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = self.create_user(username='admin', role=UserProfile.Roles.ADMIN)
+        self.operator = self.create_user(username='operator', role=UserProfile.Roles.OPERATOR)
+        device = Device.objects.create(imei='356789012345678', added_by=self.admin)
+        moment = timezone.now() - timedelta(days=1)
+        # Одинаковое время у нескольких записей: порядок держится на id.
+        for index in range(5):
+            DeviceHistory.objects.create(
+                device=device, changed_by=self.operator if index % 2 else self.admin,
+                previous_status=Device.STATUS_IN_STOCK, new_status=Device.STATUS_SOLD,
+                changed_at=moment if index < 3 else moment - timedelta(days=3),
+            )
+
+    def test_keyset_pages_cover_every_row_once(self):
+        queryset = DeviceHistory.objects.all()
+        seen, after = [], ''
+        while True:
+            page, after = keyset_page(queryset, after, limit=2)
+            seen += [entry.pk for entry in page]
+            if after is None:
+                break
+        self.assertEqual(seen, list(queryset.order_by('-changed_at', '-id').values_list('pk', flat=True)))
+
+        recent = audit_queryset({'user': str(self.operator.pk), 'to_status': 'sold',
+                                 'since': (timezone.localdate() - timedelta(days=2)).isoformat()})
+        self.assertEqual(recent.count(), 1)
+        with self.assertRaises(ValueError):
+            audit_queryset({'since': 'yesterday'})
+
+    def test_json_pages_and_ndjson_export(self):
+        self.client.login(username=self.admin.username, password=self.admin._plain_password)
+        first = self.client.get(reverse('audit_log_json'), {'limit': 3}).json()
+        second = self.client.get(reverse('audit_log_json'), {'limit': 3, 'after': first['next']}).json()
+        self.assertEqual(len(first['rows']) + len(second['rows']), 5)
+        self.assertIsNone(second['next'])
+        self.assertEqual(self.client.get(reverse('audit_log_json'), {'after': '!!'}).status_code, 400)
+
+        response = self.client.get(reverse('audit_log_ndjson'), {'user': self.operator.pk})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual([json.loads(line)['username'] for line in lines], ['operator', 'operator'])
+        self.assertContains(self.client.get(reverse('audit_log'), {'to_status': 'sold'}), '356789012345678')
+
+    def test_ndjson_export_streams_asynchronously_under_asgi(self):
+        queryset = DeviceHistory.objects.all()
+
+        async def collect():
+            return [row async for row in aiter_audit_rows(queryset, chunk_size=2)]
+
+        self.assertEqual(async_to_sync(collect)(), list(iter_audit_rows(queryset, chunk_size=2)))
+
+        self.async_client.force_login(self.admin)
+
+        async def export():
+            response = await self.async_client.get(reverse('audit_log_ndjson'), {'user': self.operator.pk})
+            return response, [chunk async for chunk in response.streaming_content]
+
+        response, chunks = async_to_sync(export)()
+        self.assertTrue(response.is_async)
+        self.assertEqual([json.loads(line)['username'] for line in b''.join(chunks).decode().splitlines()],
+                         ['operator', 'operator'])
+
+    def test_out_of_range_cursor_is_rejected_not_a_server_error(self):
+        self.client.login(username=self.admin.username, password=self.admin._plain_password)
+        device = Device.objects.get()
+        for raw in (f'{10 ** 30}:1', f'{-10 ** 30}:1', '1:99999999999999999999', '1:2:3'):
+            token = base64.urlsafe_b64encode(raw.encode()).decode()
+            with self.subTest(raw=raw):
+                self.assertRaises(InvalidCursor, decode_cursor, token)
+                self.assertEqual(self.client.get(reverse('audit_log_json'), {'after': token}).status_code, 400)
+                response = self.client.get(reverse('device_history', args=[device.pk]), {'after': token})
+                self.assertEqual(response.status_code, 404)
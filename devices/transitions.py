@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Device
+from .utils import log_device_history
+
+User = get_user_model()
+
+
+class DeviceTransitionConflict(Exception):
+    """The device's status changed since the caller read it; nothing was written."""
+
+    def __init__(self, device: Device, expected_status: str, current_status: Optional[str]):
+        self.device = device
+        self.expected_status = expected_status
+        self.current_status = current_status
+        super().__init__(
+            f'Статус устройства {device.imei} уже изменён другим пользователем.'
+            if current_status is not None
+            else f'Устройство {device.imei} уже удалено.'
+        )
+
+
+def transition_device(
+    device: Device,
+    new_status: str,
+    changed_by: Optional[User] = None,
+    expected_status: Optional[str] = None,
+) -> Device:
+    """Move ``device`` to ``new_status`` with one conditional UPDATE plus its history row.
+
+    The UPDATE only matches while the row still has ``expected_status``
+    (by default the status ``device`` was loaded with); otherwise
+    DeviceTransitionConflict is raised and the concurrent change is kept.
+    ``deleted_at`` is set on entering the trash and cleared on leaving it.
+    """
+    expected_status = expected_status or device.status
+    if new_status == expected_status:
+        return device
+
+    deleted_at = device.deleted_at
+    if new_status == Device.STATUS_TRASH:
+        deleted_at = timezone.now()
+    elif expected_status == Device.STATUS_TRASH:
+        deleted_at = None
+    # .update() обходит auto_now и post_save: updated_at ставим сами (ключ кэша строк),
+    # а версию данных и событие для SSE обновляет запись истории ниже.
+    updated_at = timezone.now()
+
+    with transaction.atomic():
+        updated = Device.objects.filter(pk=device.pk, status=expected_status).update(
+            status=new_status, deleted_at=deleted_at, updated_at=updated_at
+        )
+        if not updated:
+            current = Device.objects.filter(pk=device.pk).values_list('status', flat=True).first()
+            raise DeviceTransitionConflict(device, expected_status, current)
+        device.status = new_status
+        device.deleted_at = deleted_at
+        device.updated_at = updated_at
+        log_device_history(
+            device=device,
+            changed_by=changed_by,
+            previous_status=expected_status,
+            new_status=new_status,
+            previous_comment=device.comment,
+            new_comment=device.comment,
+        )
+    return device
@@ -2,16 +2,25 @@ from django.urls import path
 from . import views
 from .views import (
     AdminPanelView,
+    AuditLogJsonView,
+    AuditLogNdjsonView,
+    AuditLogView,
     DashboardView,
     DeviceCreateView,
     DeviceDeleteView,
+    DeviceEventStreamView,
     DeviceHistoryView,
     DeviceListView,
     DeviceRestoreView,
     DeviceStatusUpdateView,
     DeviceUpdateView,
     ExportDevicesView,
+    ImeiBatchLookupView,
     ImeiLookupView,
+    ImeiSnapshotView,
+    InventoryTrendJsonView,
+    OperatorActivityJsonView,
+    OperatorActivityView,
     ScanView,
     add_device_from_scan,
     DeviceSoftDeleteView,
@@ -36,6 +45,15 @@ urlpatterns = [
     path('export/', ExportDevicesView.as_view(), name='export_devices'),
     path('register/', RegisterView.as_view(), name='register'),
     path('imeis/lookup/', ImeiLookupView.as_view(), name='imei_lookup'),
+    path('imeis/lookup/batch/', ImeiBatchLookupView.as_view(), name='imei_lookup_batch'),
+    path('imeis/snapshot/', ImeiSnapshotView.as_view(), name='imei_snapshot'),
+    path('events/stream/', DeviceEventStreamView.as_view(), name='device_events'),
+    path('reports/activity/', OperatorActivityView.as_view(), name='operator_activity'),
+    path('reports/activity.json', OperatorActivityJsonView.as_view(), name='operator_activity_json'),
+    path('reports/inventory.json', InventoryTrendJsonView.as_view(), name='inventory_trend_json'),
+    path('reports/audit/', AuditLogView.as_view(), name='audit_log'),
+    path('reports/audit.json', AuditLogJsonView.as_view(), name='audit_log_json'),
+    path('reports/audit.ndjson', AuditLogNdjsonView.as_view(), name='audit_log_ndjson'),
     path('admin-panel/', AdminPanelView.as_view(), name='admin_panel'),
     path('devices/trash/', views.device_trash, name='device_trash'),
     path('user-management/', UserManagementView.as_view(), name='user_management'),
@@ -5,6 +5,7 @@ from typing import Optional
 from django.contrib.auth import get_user_model
 from django.db import transaction
 
+from .events import event_type_for_transition, record_device_event
 from .models import Device, DeviceHistory, UserProfile
 
 User = get_user_model()
@@ -82,6 +83,9 @@ def log_device_history(
             previous_comment=previous_comment or '',
             new_comment=new_comment or '',
         )
+        event_type = event_type_for_transition(previous_status, new_status)
+        if event_type:
+            record_device_event(device, event_type, previous_status=previous_status)
 
 def is_super_admin(user: User) -> bool:
     if not user or not user.is_authenticated:
@@ -1,5 +1,7 @@
+import hashlib
 import json
 from datetime import datetime
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib import messages
@@ -13,13 +15,17 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.models import User
-from django.core.paginator import Paginator
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
 from django.db.models import Q
-from django.http import HttpResponse, JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db import router, transaction
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
 from django.utils import timezone
-from django.views.decorators.http import require_POST
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_POST
 from django.views.generic import (
     CreateView,
     DeleteView,
@@ -39,13 +45,30 @@ from .utils import (
     is_super_admin,
     is_admin_or_super
 )
+from .audit import InvalidCursor, aiter_audit_rows, audit_page, audit_queryset, iter_audit_rows, keyset_page
+from .cache import data_version
+from .facets import facet_counts
+from .events import aevent_stream, event_poll, latest_event_id, parse_last_event_id, parse_stream_cursor
 from .forms import DeviceFilterForm, DeviceForm, DeviceStatusForm, UserProfileForm
-from .models import Device, UserProfile
+from .fragments import render_device_rows
+from .db import iterator_chunk_size
+from .middleware import is_pinned_to_primary
+from .pagination import EstimatedCountPaginator
+from .inventory import stock_trend
+from .rollups import activity_rows, activity_totals
+from .routers import reading_from_replica, replica_configured
+from .transitions import DeviceTransitionConflict, transition_device
+from .snapshot import snapshot_since
+from .models import Device, DeviceHistory, DeviceModel, UserProfile
 from .services import (
     ImeiLookupError,
     ImeiLookupRateLimitError,
+    alookup_device_by_imei,
     apply_device_filters,
+    catalog_model_for,
+    device_search_q,
     lookup_device_by_imei,
+    lookup_devices_batch,
 )
 from .utils import can_delete_devices, is_admin, is_guest, is_operator, log_device_history
 from django.contrib.auth import login
@@ -66,22 +89,11 @@ class RegisterView(View):
             
         form = UserRegistrationForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            
-            # Получаем профиль, который уже создан сигналом, и обновляем его
-            try:
-                profile = user.profile
-                # Обновляем роль на гостя (вместо дефолтной)
-                profile.role = UserProfile.Roles.GUEST
-                profile.can_delete_devices = False
-                profile.save()
-            except UserProfile.DoesNotExist:
-                # На всякий случай, если профиль не создался
-                UserProfile.objects.create(
-                    user=user,
-                    role=UserProfile.Roles.GUEST,
-                    can_delete_devices=False
-                )
+            user = form.save(commit=False)
+            # Профиль создаётся сигналом сразу с ролью гостя и без права удаления
+            user.profile_defaults = {'role': UserProfile.Roles.GUEST, 'can_delete_devices': False}
+            user.save()
+            form.save_m2m()
             
             # Автоматически входим пользователя после регистрации
             login(request, user)
@@ -91,8 +103,9 @@ class RegisterView(View):
         return render(request, self.template_name, {'form': form})
     
 @require_POST
-def add_device_from_scan(request):
-    if not request.user.is_authenticated or not is_operator(request.user):
+async def add_device_from_scan(request):
+    user = await request.auser()
+    if not user.is_authenticated or not await sync_to_async(is_operator)(user):
         return JsonResponse({'success': False, 'error': 'Доступ запрещен'}, status=403)
 
     try:
@@ -111,27 +124,30 @@ def add_device_from_scan(request):
     if len(imei) != 15 or not imei.isdigit():
         return JsonResponse({'success': False, 'error': 'IMEI должен содержать 15 цифр'}, status=400)
 
-    if Device.objects.filter(imei=imei).exists():
+    if await Device.objects.with_imei(imei).aexists():
         return JsonResponse({'success': False, 'error': 'Устройство с таким IMEI уже существует'}, status=400)
 
     if status not in dict(Device.PUBLIC_STATUS_CHOICES):
         status = Device.STATUS_IN_STOCK
 
+    device_model = None
     if not model_name:
         try:
-            lookup = lookup_device_by_imei(imei)
+            lookup = await alookup_device_by_imei(imei, user_id=user.pk)
             model_name = lookup.formatted_name
+            device_model = await sync_to_async(catalog_model_for)(lookup)
         except ImeiLookupRateLimitError as exc:
             return JsonResponse({'success': False, 'error': str(exc), 'rate_limited': True}, status=429)
         except ImeiLookupError:
             model_name = ''
 
-    device = Device.objects.create(
+    device = await Device.objects.acreate(
         imei=imei,
         model_name=model_name,
+        device_model=device_model,
         status=status,
         comment=comment,
-        added_by=request.user,
+        added_by=user,
     )
 
     return JsonResponse(
@@ -164,7 +180,87 @@ class DeletionPermissionMixin(OperatorRequiredMixin):
         return can_delete_devices(self.request.user)
 
 
-class DashboardView(GuestRequiredMixin, TemplateView):
+class AsyncOperatorRequiredMixin:
+    """OperatorRequiredMixin for views whose handlers are coroutines."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        if not await sync_to_async(is_operator)(user):
+            raise PermissionDenied
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class ReplicaReadMixin:
+    """Serve a read-only page from the replica unless the user has just written.
+
+    Place after the permission mixin so the role check still reads primary.
+    The response is rendered here, inside the routing context, because a
+    TemplateResponse would otherwise evaluate its querysets after dispatch.
+    """
+
+    def reads_from_replica(self, request) -> bool:
+        return (
+            request.method in ('GET', 'HEAD')
+            and replica_configured()
+            and not is_pinned_to_primary(request)
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.reads_from_replica(request):
+            return super().dispatch(request, *args, **kwargs)
+        with reading_from_replica():
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        return response
+
+
+def page_etag(request, *args, **kwargs):
+    """Weak ETag from the data version, the viewer and the full path.
+
+    Role changes bump the data version (UserProfile write), so the user id
+    stands in for the role without a profile query. The CSRF cookie is mixed
+    in so a cached page never carries a token from a previous session.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    # A 304 would swallow messages waiting to be displayed.
+    if request.COOKIES.get('messages') or request.session.get('_messages'):
+        return None
+    parts = [
+        data_version(),
+        str(user.pk),
+        '1' if user.is_superuser else '0',
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        request.get_full_path(),
+    ]
+    digest = hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest()
+    return f'W/"{digest}"'
+
+
+class ConditionalPageMixin:
+    """Answer 304 Not Modified before any ORM or template work when nothing changed.
+
+    The data version is bumped on the primary, and a replica that lags
+    behind would render an old page under the new version's ETag, which
+    the browser then keeps. Pages served from the replica (see
+    ReplicaReadMixin) therefore skip conditional handling.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        reads_from_replica = getattr(self, 'reads_from_replica', None)
+        if reads_from_replica is not None and reads_from_replica(request):
+            response = super().dispatch(request, *args, **kwargs)
+        else:
+            response = condition(etag_func=page_etag)(super().dispatch)(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class DashboardView(ConditionalPageMixin, GuestRequiredMixin, ReplicaReadMixin, TemplateView):
     template_name = 'dashboard.html'
 
     def get_context_data(self, **kwargs):
@@ -175,7 +271,7 @@ class DashboardView(GuestRequiredMixin, TemplateView):
         context['written_off_count'] = Device.objects.filter(status=Device.STATUS_WRITTEN_OFF).count()
 
         recent_qs = Device.objects.select_related('added_by')
-        paginator = Paginator(recent_qs, settings.RECENT_DEVICE_PAGE_SIZE)
+        paginator = EstimatedCountPaginator(recent_qs, settings.RECENT_DEVICE_PAGE_SIZE)
         page_number = self.request.GET.get('recent_page') or 1
         recent_page = paginator.get_page(page_number)
         context['recent_devices'] = recent_page
@@ -185,34 +281,22 @@ class DashboardView(GuestRequiredMixin, TemplateView):
         return context
 
 
-class DeviceListView(GuestRequiredMixin, ListView):
+class DeviceListView(ConditionalPageMixin, GuestRequiredMixin, ReplicaReadMixin, ListView):
     model = Device
     template_name = 'devices/device_list.html'
     context_object_name = 'devices'
     paginate_by = getattr(settings, 'DEVICE_LIST_PAGE_SIZE', 20)
+    paginator_class = EstimatedCountPaginator
     
-    def get_queryset(self):
+    def get_base_queryset(self):
+        """The list filtered by everything except the facets (status, user, brand)."""
         # ВАЖНО: Исключаем устройства в корзине
-        queryset = Device.objects.exclude(status='trash').select_related('added_by')
+        queryset = Device.objects.exclude(status='trash')
         
         # Поиск
         search = self.request.GET.get('search', '')
         if search:
-            queryset = queryset.filter(
-                Q(imei__icontains=search) |
-                Q(model_name__icontains=search) |
-                Q(comment__icontains(search))
-            )
-        
-        # Фильтр по статусу
-        status = self.request.GET.get('status', '')
-        if status:
-            queryset = queryset.filter(status=status)
-        
-        # Фильтр по пользователю
-        user_id = self.request.GET.get('user', '')
-        if user_id:
-            queryset = queryset.filter(added_by_id=user_id)
+            queryset = queryset.filter(device_search_q(search))
         
         # Фильтр по дате
         date_from = self.request.GET.get('date_from', '')
@@ -231,11 +315,31 @@ class DeviceListView(GuestRequiredMixin, ListView):
                 queryset = queryset.filter(date_added__lte=date_to)
             except ValueError:
                 pass
+
+        return queryset
+
+    def get_queryset(self):
+        queryset = self.get_base_queryset().select_related('added_by')
+        
+        # Фильтр по статусу
+        status = self.request.GET.get('status', '')
+        if status:
+            queryset = queryset.filter(status=status)
+        
+        # Фильтр по пользователю
+        user_id = self.request.GET.get('user', '')
+        if user_id:
+            queryset = queryset.filter(added_by_id=user_id)
+
+        # Фильтр по бренду: сравнение по ключам справочника, без сканирования model_name
+        brand = self.request.GET.get('brand', '')
+        if brand:
+            queryset = queryset.filter(device_model__in=DeviceModel.objects.brand_ids(brand))
         
         # Сортировка
         sort = self.request.GET.get('sort', 'date_desc')
         if sort == 'imei':
-            queryset = queryset.order_by('imei')
+            queryset = queryset.order_by('imei_number')
         elif sort == 'model':
             queryset = queryset.order_by('model_name')
         elif sort == 'status':
@@ -250,14 +354,21 @@ class DeviceListView(GuestRequiredMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
+        # Счётчики рядом с вариантами фильтров: один сгруппированный запрос, кэш до следующей записи
+        facets = facet_counts(self.get_base_queryset(), self.request.GET)
+
         # Статусы для фильтра (исключаем trash)
         context['statuses'] = [
-            (key, label) for key, label in Device.STATUS_CHOICES 
+            (key, label, facets['status'][key]) for key, label in Device.STATUS_CHOICES 
             if key != 'trash'
         ]
         
         # Упорядоченный список пользователей с логинами
-        context['users'] = User.objects.order_by('username')
+        users = list(User.objects.order_by('username'))
+        for user in users:
+            user.facet_count = facets['user'][str(user.pk)]
+        context['users'] = users
+        context['brands'] = [(brand, facets['brand'][brand.casefold()]) for brand in DeviceModel.objects.brands()]
         
         # Сохраняем параметры фильтра для пагинации
         querystring = self.request.GET.copy()
@@ -267,12 +378,18 @@ class DeviceListView(GuestRequiredMixin, ListView):
         
         # Информация о фильтрах
         context['active_filters'] = bool(self.request.GET)
-        context['devices_count'] = context['paginator'].count if hasattr(context, 'paginator') else context['devices'].count()
+        # Счёт уже сделан пагинатором: точный до EXACT_COUNT_LIMIT, дальше оценка «~1,2 млн».
+        paginator, page = context['paginator'], context['page_obj']
+        context['devices_count'] = paginator.count_display
+        context['page_numbers'] = paginator.nearby_pages(page.number)
         
         # Права доступа
         context['is_manager'] = is_admin(self.request.user)
         context['is_operator'] = is_operator(self.request.user)
         context['can_delete'] = can_delete_devices(self.request.user)
+        context['device_rows'] = render_device_rows(
+            context['devices'], self.request.user, context['is_manager'], context['can_delete']
+        )
         
         # Статистика по корзине
         context['trash_count'] = Device.objects.filter(status='trash').count()
@@ -295,8 +412,9 @@ class DeviceCreateView(OperatorRequiredMixin, CreateView):
         form.instance.added_by = self.request.user
         if not form.instance.model_name:
             try:
-                lookup = lookup_device_by_imei(form.instance.imei)
+                lookup = lookup_device_by_imei(form.instance.imei, user_id=self.request.user.pk)
                 form.instance.model_name = lookup.formatted_name
+                form.instance.device_model = catalog_model_for(lookup)
             except ImeiLookupRateLimitError as exc:
                 messages.warning(self.request, f'Лимит IMEICheck: {exc}')
             except ImeiLookupError as exc:
@@ -313,20 +431,33 @@ class DeviceUpdateView(AdminRequiredMixin, UpdateView):
     success_url = reverse_lazy('device_list')
 
     def form_valid(self, form):
+        # Форма уже перенесла введённые значения в instance: прежние берём из initial.
         device = form.instance
-        previous_status = device.status
-        previous_comment = device.comment
-        response = super().form_valid(form)
-        log_device_history(
-            device=device,
-            changed_by=self.request.user,
-            previous_status=previous_status,
-            new_status=device.status,
-            previous_comment=previous_comment,
-            new_comment=device.comment,
-        )
+        previous_status = form.initial['status']
+        previous_comment = form.initial.get('comment')
+        changed_fields = [name for name in form.changed_data if name != 'status']
+        try:
+            with transaction.atomic():
+                if changed_fields:
+                    device.save(update_fields=[*changed_fields, 'updated_at'])
+                    log_device_history(
+                        device=device,
+                        changed_by=self.request.user,
+                        previous_status=previous_status,
+                        new_status=previous_status,
+                        previous_comment=previous_comment,
+                        new_comment=device.comment,
+                    )
+                # Статус — только условным UPDATE: при конфликте откатываются и остальные поля.
+                if device.status != previous_status:
+                    transition_device(
+                        device, device.status, changed_by=self.request.user, expected_status=previous_status
+                    )
+        except DeviceTransitionConflict as exc:
+            form.add_error('status', str(exc))
+            return self.form_invalid(form)
         messages.success(self.request, 'Изменения сохранены.')
-        return response
+        return redirect(self.get_success_url())
 
 
 class DeviceDeleteView(DeletionPermissionMixin, DeleteView):
@@ -334,13 +465,14 @@ class DeviceDeleteView(DeletionPermissionMixin, DeleteView):
     template_name = 'devices/device_confirm_delete.html'
     success_url = reverse_lazy('device_list')
 
-    def delete(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        
-        # Мягкое удаление вместо полного
-        self.object.soft_delete(user=request.user)
-        
-        messages.success(request, 'Устройство перемещено в корзину.')
+    def form_valid(self, form):
+        # Мягкое удаление вместо полного (DeleteView с Django 4.0 вызывает form_valid, а не delete)
+        try:
+            self.object.soft_delete(user=self.request.user)
+        except DeviceTransitionConflict as exc:
+            messages.error(self.request, str(exc))
+        else:
+            messages.success(self.request, 'Устройство перемещено в корзину.')
         return redirect(self.get_success_url())
 
 
@@ -357,25 +489,25 @@ class ScanView(OperatorRequiredMixin, TemplateView):
 class DeviceStatusUpdateView(AdminRequiredMixin, View):
     def post(self, request, pk):
         device = get_object_or_404(Device, pk=pk)
+        # Статус, который видел пользователь: если его уже поменяли, вернём 409, а не перезапишем.
+        expected_status = request.POST.get('expected_status') or device.status
         form = DeviceStatusForm(request.POST, instance=device)
         if form.is_valid():
-            previous_status = device.status
-            form.save()
-            log_device_history(
-                device=device,
-                changed_by=request.user,
-                previous_status=previous_status,
-                new_status=device.status,
-                previous_comment=device.comment,
-                new_comment=device.comment,
-            )
+            try:
+                transition_device(
+                    device, form.cleaned_data['status'], changed_by=request.user, expected_status=expected_status
+                )
+            except DeviceTransitionConflict as exc:
+                return JsonResponse(
+                    {'success': False, 'error': str(exc), 'status': exc.current_status}, status=409
+                )
             return JsonResponse(
                 {'success': True, 'status': device.status, 'status_label': device.get_status_display()}
             )
         return JsonResponse({'success': False, 'errors': form.errors}, status=400)
 
 
-class ExportDevicesView(AdminRequiredMixin, View):
+class ExportDevicesView(AdminRequiredMixin, ReplicaReadMixin, View):
     def get(self, request):
         from openpyxl import Workbook
 
@@ -385,11 +517,7 @@ class ExportDevicesView(AdminRequiredMixin, View):
         # Применяем все фильтры
         search = request.GET.get('search', '')
         if search:
-            queryset = queryset.filter(
-                Q(imei__icontains=search) |
-                Q(model_name__icontains=search) |
-                Q(comment__icontains=search)
-            )
+            queryset = queryset.filter(device_search_q(search))
         
         status = request.GET.get('status', '')
         if status:
@@ -398,6 +526,10 @@ class ExportDevicesView(AdminRequiredMixin, View):
         user_id = request.GET.get('user', '')
         if user_id:
             queryset = queryset.filter(added_by_id=user_id)
+
+        brand = request.GET.get('brand', '')
+        if brand:
+            queryset = queryset.filter(device_model__in=DeviceModel.objects.brand_ids(brand))
         
         date_from = request.GET.get('date_from', '')
         date_to = request.GET.get('date_to', '')
@@ -419,7 +551,7 @@ class ExportDevicesView(AdminRequiredMixin, View):
         # Сортировка
         sort = request.GET.get('sort', 'date_desc')
         if sort == 'imei':
-            queryset = queryset.order_by('imei')
+            queryset = queryset.order_by('imei_number')
         elif sort == 'model':
             queryset = queryset.order_by('model_name')
         elif sort == 'status':
@@ -429,14 +561,15 @@ class ExportDevicesView(AdminRequiredMixin, View):
         else:
             queryset = queryset.order_by('-date_added')
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = 'Устройства'
+        # write_only: строки не копятся в памяти, а .iterator() на PostgreSQL
+        # читает их серверным курсором пачками по DB_ITERATOR_CHUNK_SIZE.
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet('Устройства')
         
         # Заголовки
         ws.append(['IMEI', 'Модель', 'Статус', 'Комментарий', 'Добавлено', 'Добавил'])
         
-        for device in queryset:
+        for device in queryset.iterator(chunk_size=iterator_chunk_size()):
             ws.append([
                 device.imei,
                 device.model_name or '',
@@ -453,14 +586,21 @@ class ExportDevicesView(AdminRequiredMixin, View):
         wb.save(response)
         return response
     
-class DeviceHistoryView(GuestRequiredMixin, TemplateView):
+class DeviceHistoryView(ConditionalPageMixin, GuestRequiredMixin, ReplicaReadMixin, TemplateView):
     template_name = 'devices/device_history.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         device = get_object_or_404(Device, pk=self.kwargs['pk'])
         context['device'] = device
-        context['history'] = device.history.select_related('changed_by')
+        try:
+            context['history'], context['next_cursor'] = keyset_page(
+                device.history.select_related('changed_by'),
+                self.request.GET.get('after', ''),
+                getattr(settings, 'DEVICE_HISTORY_PAGE_SIZE', 50),
+            )
+        except InvalidCursor:
+            raise Http404('Некорректный курсор')
         return context
 
 
@@ -468,32 +608,28 @@ class DeviceRestoreView(AdminRequiredMixin, View):
     def post(self, request, pk):
         device = get_object_or_404(Device, pk=pk, status='trash')
         
-        # Восстанавливаем устройство
-        device.status = 'in_stock'  # Возвращаем в "В наличии"
-        device.deleted_at = None    # Очищаем время удаления
-        device.save()
-        
-        # Логируем восстановление
-        log_device_history(
-            device=device,
-            changed_by=request.user,
-            previous_status='trash',
-            new_status='in_stock',
-            previous_comment=device.comment,
-            new_comment=device.comment,
-        )
-        
-        messages.success(request, f'Устройство {device.imei} восстановлено из корзины.')
+        # Восстанавливаем устройство в "В наличии" и логируем в одной транзакции
+        try:
+            device.restore(user=request.user)
+        except DeviceTransitionConflict as exc:
+            messages.error(request, str(exc))
+        else:
+            messages.success(request, f'Устройство {device.imei} восстановлено из корзины.')
         return redirect('device_trash')
     
-class ImeiLookupView(OperatorRequiredMixin, View):
-    def get(self, request):
+class ImeiLookupView(AsyncOperatorRequiredMixin, View):
+    async def get(self, request):
         imei = (request.GET.get('imei') or '').strip()
         force_refresh = request.GET.get('refresh') == '1'
         if not imei:
             return JsonResponse({'success': False, 'error': 'IMEI обязателен'}, status=400)
+        if request.GET.get('check_exists') == '1':
+            # Сканер спрашивает только о дубликате: без похода к IMEICheck и без расхода квоты.
+            exists = await Device.objects.with_imei(imei).aexists()
+            return JsonResponse({'success': True, 'imei': imei, 'exists': exists})
+        user = await request.auser()
         try:
-            lookup = lookup_device_by_imei(imei, force_refresh=force_refresh)
+            lookup = await alookup_device_by_imei(imei, force_refresh=force_refresh, user_id=user.pk)
         except ImeiLookupRateLimitError as exc:
             return JsonResponse({'success': False, 'error': str(exc), 'rate_limited': True}, status=429)
         except ImeiLookupError as exc:
@@ -511,6 +647,70 @@ class ImeiLookupView(OperatorRequiredMixin, View):
         )
 
 
+class ImeiBatchLookupView(OperatorRequiredMixin, View):
+    def post(self, request):
+        try:
+            payload = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': 'Некорректный формат данных'}, status=400)
+
+        imeis = payload.get('imeis') if isinstance(payload, dict) else None
+        if not isinstance(imeis, list) or not all(isinstance(imei, str) for imei in imeis):
+            return JsonResponse({'success': False, 'error': 'Ожидается список IMEI'}, status=400)
+        limit = getattr(settings, 'IMEICHECK_BATCH_MAX', 500)
+        if len(imeis) > limit:
+            return JsonResponse({'success': False, 'error': f'Не более {limit} IMEI за запрос'}, status=400)
+
+        batch = lookup_devices_batch(imeis, user_id=request.user.pk)
+        results = {
+            imei: {
+                'success': True,
+                'brand': lookup.brand,
+                'model': lookup.model,
+                'model_name': lookup.model_name,
+                'formatted_name': lookup.formatted_name,
+            }
+            for imei, lookup in batch.results.items()
+        }
+        results.update({imei: {'success': False, 'error': error} for imei, error in batch.errors.items()})
+        return JsonResponse({'success': True, 'results': results, 'deferred': batch.deferred})
+
+
+class ImeiSnapshotView(OperatorRequiredMixin, View):
+    """Packed set of all known IMEIs, or the changes since ``?since=<version>``."""
+
+    def get(self, request):
+        response = JsonResponse(snapshot_since(parse_last_event_id(request.GET.get('since'))))
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class DeviceEventStreamView(GuestRequiredMixin, View):
+    """Server-sent events with device changes for the dashboard and the list.
+
+    Under ASGI the connection stays open and the log is polled by an async
+    generator. Under WSGI (the gunicorn sync workers in the Procfile) each
+    request answers at once and closes, and EventSource polls every
+    DEVICE_EVENTS_POLL_INTERVAL: a sync worker held for the whole stream
+    lifetime would take one worker per open tab.
+    """
+
+    def get(self, request):
+        position = parse_stream_cursor(
+            request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        )
+        if position is None:
+            latest = latest_event_id()
+            position = (latest, latest)
+        if isinstance(request, ASGIRequest):
+            response = StreamingHttpResponse(aevent_stream(*position), content_type='text/event-stream')
+            response['X-Accel-Buffering'] = 'no'
+        else:
+            response = HttpResponse(event_poll(*position), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
 class AdminPanelView(AdminRequiredMixin, TemplateView):
     template_name = 'admin_panel.html'
 
@@ -546,6 +746,152 @@ class AdminPanelView(AdminRequiredMixin, TemplateView):
             messages.error(request, 'Не удалось обновить профиль пользователя.')
         return redirect('admin_panel')
     
+class ReportPeriodMixin:
+    """Период отчёта: ?days=N последних дней (по умолчанию 30, не больше года)."""
+
+    default_days = 30
+    max_days = 366
+
+    def get_period(self):
+        try:
+            days = int(self.request.GET.get('days') or self.default_days)
+        except ValueError:
+            days = self.default_days
+        days = min(max(days, 1), self.max_days)
+        end = timezone.localdate()
+        return end - timedelta(days=days - 1), end, days
+
+
+class InventoryTrendJsonView(AdminRequiredMixin, ReportPeriodMixin, View):
+    """Остатки по дням из снимков: ?status=in_stock&days=365[&model=...]."""
+
+    default_days = 365
+
+    def get(self, request):
+        start, end, _ = self.get_period()
+        status = request.GET.get('status') or Device.STATUS_IN_STOCK
+        if status not in dict(Device.STATUS_CHOICES):
+            return JsonResponse({'success': False, 'error': 'Неизвестный статус'}, status=400)
+        rows = stock_trend(start, end, status=status, model_name=request.GET.get('model'))
+        for row in rows:
+            row['day'] = row['day'].isoformat()
+        return JsonResponse({'from': start.isoformat(), 'to': end.isoformat(), 'status': status, 'rows': rows})
+
+
+class OperatorActivityView(AdminRequiredMixin, ReportPeriodMixin, TemplateView):
+    template_name = 'devices/operator_activity.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        start, end, days = self.get_period()
+        context.update(
+            {
+                'period_start': start,
+                'period_end': end,
+                'days': days,
+                'period_choices': [7, 30, 90, 365],
+                'totals': activity_totals(start, end),
+                'daily_rows': activity_rows(start, end),
+            }
+        )
+        return context
+
+
+class OperatorActivityJsonView(AdminRequiredMixin, ReportPeriodMixin, View):
+    def get(self, request):
+        start, end, _ = self.get_period()
+        return JsonResponse(
+            {
+                'from': start.isoformat(),
+                'to': end.isoformat(),
+                'totals': activity_totals(start, end),
+                'rows': activity_rows(start, end),
+            }
+        )
+
+
+class AuditLogMixin:
+    """Журнал изменений по всем устройствам: ?user, ?from_status, ?to_status, ?since, ?until, ?after."""
+
+    def get_audit_queryset(self):
+        queryset = audit_queryset(self.request.GET)
+        if not is_pinned_to_primary(self.request):
+            # Алиас выбираем сразу: потоковый ответ читается уже после выхода из dispatch.
+            with reading_from_replica():
+                queryset = queryset.using(router.db_for_read(DeviceHistory))
+        return queryset
+
+    def get_limit(self):
+        default = getattr(settings, 'AUDIT_PAGE_SIZE', 100)
+        try:
+            limit = int(self.request.GET.get('limit') or default)
+        except ValueError:
+            limit = default
+        return min(max(limit, 1), 1000)
+
+
+class AuditLogView(AdminRequiredMixin, AuditLogMixin, TemplateView):
+    template_name = 'devices/audit_log.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        entries, next_cursor, error = [], None, None
+        try:
+            entries, next_cursor = keyset_page(
+                self.get_audit_queryset().select_related('device', 'changed_by'),
+                self.request.GET.get('after', ''),
+                self.get_limit(),
+            )
+        except ValueError as exc:
+            error = str(exc)
+        querystring = self.request.GET.copy()
+        querystring.pop('after', None)
+        context.update(
+            {
+                'entries': entries,
+                'next_cursor': next_cursor,
+                'error': error,
+                'querystring': querystring.urlencode(),
+                'users': User.objects.order_by('username'),
+                'statuses': Device.STATUS_CHOICES,
+            }
+        )
+        return context
+
+
+class AuditLogJsonView(AdminRequiredMixin, AuditLogMixin, View):
+    def get(self, request):
+        try:
+            rows, next_cursor = audit_page(self.get_audit_queryset(), request.GET.get('after', ''), self.get_limit())
+        except ValueError as exc:
+            return JsonResponse({'success': False, 'error': str(exc)}, status=400)
+        return JsonResponse({'rows': rows, 'next': next_cursor})
+
+
+class AuditLogNdjsonView(AdminRequiredMixin, AuditLogMixin, View):
+    """Весь отобранный журнал одной выгрузкой, по строке JSON на запись."""
+
+    def get(self, request):
+        try:
+            queryset = self.get_audit_queryset()
+        except ValueError as exc:
+            return JsonResponse({'success': False, 'error': str(exc)}, status=400)
+        if isinstance(request, ASGIRequest):
+            # Синхронный итератор ASGI-обработчик Django сначала вычитывает целиком.
+            lines = (
+                json.dumps(row, ensure_ascii=False) + '\n'
+                async for row in aiter_audit_rows(queryset, iterator_chunk_size())
+            )
+        else:
+            lines = (
+                json.dumps(row, ensure_ascii=False) + '\n'
+                for row in iter_audit_rows(queryset, iterator_chunk_size())
+            )
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="audit_{timezone.localdate():%Y%m%d}.ndjson"'
+        return response
+
+
 class DeviceSoftDeleteView(DeletionPermissionMixin, UpdateView):
     model = Device
     template_name = 'devices/device_confirm_delete.html'  # Используем существующий шаблон
@@ -553,69 +899,17 @@ class DeviceSoftDeleteView(DeletionPermissionMixin, UpdateView):
     success_url = reverse_lazy('device_list')
     
     def form_valid(self, form):
-        device = form.save(commit=False)
-        print(f"=== DEBUG SOFT DELETE ===")
-        print(f"До удаления: статус={device.status}, deleted_at={device.deleted_at}")
-        
-        previous_status = device.status
-        device.status = 'trash'  # Явно указываем строку
-        device.deleted_at = timezone.now()
-        device.save()
-        
-        print(f"После удаления: статус={device.status}, deleted_at={device.deleted_at}")
-        print("=== END DEBUG ===")
-        
-        # Проверяем, что устройство действительно в корзине
-        device.refresh_from_db()
-        print(f"Проверка после save: статус={device.status}")
-        
-        # Логируем изменение статуса
-        log_device_history(
-            device=device,
-            changed_by=self.request.user,
-            previous_status=previous_status,
-            new_status=device.status,
-            previous_comment=device.comment,
-            new_comment=device.comment,
-        )
-        
-        messages.success(self.request, f'Устройство {device.imei} перемещено в корзину. Оно будет храниться там 30 дней.')
+        device = self.object
+        try:
+            device.soft_delete(user=self.request.user)
+        except DeviceTransitionConflict as exc:
+            messages.error(self.request, str(exc))
+        else:
+            messages.success(self.request, f'Устройство {device.imei} перемещено в корзину. Оно будет храниться там 30 дней.')
         return redirect(self.get_success_url())
     
-# Добавляем URL для ручного добавления устройства
-class DeviceAddManualView(OperatorRequiredMixin, View):
-    def post(self, request):
-        imei = request.POST.get('imei', '').strip()
-        
-        if not imei:
-            messages.error(request, 'IMEI не может быть пустым')
-            return redirect('scan')
-        
-        if len(imei) != 15 or not imei.isdigit():
-            messages.error(request, 'IMEI должен содержать ровно 15 цифр')
-            return redirect('scan')
-        
-        if Device.objects.filter(imei=imei).exists():
-            messages.error(request, 'Устройство с таким IMEI уже существует')
-            return redirect('scan')
-        
-        # Создаем устройство
-        device = Device.objects.create(
-            imei=imei,
-            model_name='',  # Можно добавить автоматическое определение
-            status=Device.STATUS_IN_STOCK,
-            added_by=request.user
-        )
-        
-        messages.success(request, f'Устройство с IMEI {imei} успешно добавлено')
-        return redirect('device_list')
-    
-
-# Добавляем эти классы в конец views.py (после существующих классов)
-
-
-class DeviceAddManualView(OperatorRequiredMixin, View):
-    def post(self, request):
+class DeviceAddManualView(AsyncOperatorRequiredMixin, View):
+    async def post(self, request):
         imei = request.POST.get('imei', '').strip()
         
         if not imei:
@@ -626,25 +920,29 @@ class DeviceAddManualView(OperatorRequiredMixin, View):
             messages.error(request, 'IMEI должен содержать ровно 15 цифр')
             return redirect('scan')
         
-        if Device.objects.filter(imei=imei).exists():
+        if await Device.objects.with_imei(imei).aexists():
             messages.error(request, 'Устройство с таким IMEI уже существует')
             return redirect('scan')
         
         # Пытаемся определить модель по IMEI
         model_name = ''
+        device_model = None
+        user = await request.auser()
         try:
-            lookup = lookup_device_by_imei(imei)
+            lookup = await alookup_device_by_imei(imei, user_id=user.pk)
             model_name = lookup.formatted_name
+            device_model = await sync_to_async(catalog_model_for)(lookup)
         except (ImeiLookupError, ImeiLookupRateLimitError):
             # Если не удалось определить модель, оставляем пустым
             pass
         
         # Создаем устройство
-        device = Device.objects.create(
+        device = await Device.objects.acreate(
             imei=imei,
             model_name=model_name,
+            device_model=device_model,
             status=Device.STATUS_IN_STOCK,
-            added_by=request.user
+            added_by=user
         )
         
         messages.success(request, f'Устройство с IMEI {imei} успешно добавлено')
@@ -27,13 +27,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    # 'whitenoise.middleware.WhiteNoiseMiddleware',  # ДОБАВИТЬ ДЛЯ СТАТИЧЕСКИХ ФАЙЛОВ
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'devices.middleware.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'imei_manager.urls'
@@ -62,20 +63,95 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # BEGIN IMMEDIATE: пишущая транзакция сразу берёт блокировку и ждёт busy_timeout,
+            # а не падает с "database is locked" при попытке повысить блокировку.
+            'transaction_mode': os.getenv('SQLITE_TRANSACTION_MODE', 'IMMEDIATE') or None,
+        },
+    }
+}
+
+# PostgreSQL для продакшена: DB_ENGINE=postgresql (нужен psycopg 3, см. requirements.txt).
+if os.getenv('DB_ENGINE', 'sqlite') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'imei_manager'),
+            'USER': os.getenv('DB_USER', 'postgres'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            # Постоянные соединения: запрос не платит за connect и аутентификацию.
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 600)),  # seconds
+            'CONN_HEALTH_CHECKS': True,
+            # За PgBouncer в режиме transaction серверные курсоры .iterator() ломаются.
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_DISABLE_SERVER_SIDE_CURSORS', 'false').lower() == 'true',
+            'OPTIONS': {},
+        }
     }
+    # Встроенный пул psycopg (Django 5.1+) вместо постоянных соединений: DB_POOL_MAX_SIZE=10.
+    if int(os.getenv('DB_POOL_MAX_SIZE', 0)):
+        DATABASES['default']['CONN_MAX_AGE'] = 0  # пул несовместим с CONN_MAX_AGE
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE')),
+            'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),  # seconds
+        }
+
+# Реплика только для чтения: список, дашборд, история и экспорт читают с неё (devices.routers).
+# Локально достаточно второго файла SQLite с копией базы: DB_REPLICA_NAME=/path/to/replica.sqlite3
+# Для PostgreSQL обычно хватает DB_REPLICA_HOST.
+if os.getenv('DB_REPLICA_NAME') or os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME') or DATABASES['default']['NAME'],
+        'HOST': os.getenv('DB_REPLICA_HOST') or DATABASES['default'].get('HOST', ''),
+        # Отдельная тестовая база для реплики не создаётся. Тесты запускаются без DB_REPLICA_NAME:
+        # TestCase держит данные в незакоммиченной транзакции primary, реплике их не видно.
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['devices.routers.ReplicaRouter']
+# Сколько секунд после записи (POST и т.п.) чтения пользователя идут на primary.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+
+# Размер пачки для построчных проходов (экспорт, очистка корзины);
+# на PostgreSQL строки читаются серверным курсором.
+DB_ITERATOR_CHUNK_SIZE = int(os.getenv('DB_ITERATOR_CHUNK_SIZE', 2000))
+
+# Профиль SQLite для нескольких воркеров gunicorn (применяется в devices.db на connection_created).
+# Пустое значение переменной окружения отключает соответствующую прагму.
+SQLITE_PRAGMAS = {
+    # auto_vacuum вступает в силу только для новой базы (или после одного VACUUM).
+    'auto_vacuum': os.getenv('SQLITE_AUTO_VACUUM', 'incremental'),
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'normal'),
+    'busy_timeout': os.getenv('SQLITE_BUSY_TIMEOUT', '5000'),  # ms
+    'mmap_size': os.getenv('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024)),  # bytes
+    'cache_size': os.getenv('SQLITE_CACHE_SIZE', '-20000'),  # KiB when negative
 }
+# После удаления стольких строк за раз запускаются PRAGMA optimize и incremental_vacuum.
+SQLITE_OPTIMIZE_AFTER_PURGE = int(os.getenv('SQLITE_OPTIMIZE_AFTER_PURGE', 500))
 
-# ДОБАВИТЬ ДЛЯ ПРОДАКШЕНА (раскомментировать при деплое):
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'NAME': os.getenv('DB_NAME', 'imei_manager'),
-#         'USER': os.getenv('DB_USER', 'postgres'),
-#         'PASSWORD': os.getenv('DB_PASSWORD', ''),
-#         'HOST': os.getenv('DB_HOST', 'localhost'),
-#         'PORT': os.getenv('DB_PORT', '5432'),
-#     }
-# }
+# Cache: общий уровень (default) виден всем воркерам gunicorn и не требует внешних сервисов.
+# Таблица создаётся командой `python manage.py createcachetable`. На PostgreSQL incr в DatabaseCache
+# не атомарен (чтение + запись), и лимит IMEICheck может быть превышен на пару вызовов — там лучше
+# CACHE_BACKEND с атомарным incr (Redis, Memcached).
+# Уровень local — небольшой LRU внутри процесса перед общим (см. devices.cache.TwoTierCache).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'imei_cache'),
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 50000))},
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'imei-local',
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('LOCAL_CACHE_MAX_ENTRIES', 1000)), 'CULL_FREQUENCY': 10},
+    },
+}
+LOCAL_CACHE_TIMEOUT = int(os.getenv('LOCAL_CACHE_TIMEOUT', 300))  # seconds
+LOCAL_CACHE_CHECK_INTERVAL = float(os.getenv('LOCAL_CACHE_CHECK_INTERVAL', 2))  # seconds
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -106,8 +182,23 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
-# ДОБАВИТЬ ДЛЯ СТАТИЧЕСКИХ ФАЙЛОВ В ПРОДАКШЕНЕ:
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# collectstatic пишет имена с хешем и готовые .gz/.br; whitenoise отдаёт их с Cache-Control: immutable.
+# STATICFILES_STORAGE в Django 5.1 больше не читается — только STORAGES.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'devices.staticfiles.StaticFilesStorage'},
+}
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    'devices.staticfiles.BundleFinder',
+]
+# Один скрипт на страницу: порядок файлов в списке — порядок выполнения.
+STATIC_BUNDLES = {
+    'js/scan.bundle.js': ['js/html5-qrcode.min.js', 'js/imeicheck.js', 'js/scanner.js'],
+    'js/list.bundle.js': ['js/status.js', 'js/live.js'],
+}
+STATIC_BUNDLE_DIR = BASE_DIR / '.bundles'
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -124,8 +215,32 @@ CRISPY_TEMPLATE_PACK = 'bootstrap5'
 # Custom pagination defaults
 DEVICE_LIST_PAGE_SIZE = int(os.getenv('DEVICE_LIST_PAGE_SIZE', 50))
 RECENT_DEVICE_PAGE_SIZE = int(os.getenv('RECENT_DEVICE_PAGE_SIZE', 20))
+DEVICE_HISTORY_PAGE_SIZE = int(os.getenv('DEVICE_HISTORY_PAGE_SIZE', 50))
+AUDIT_PAGE_SIZE = int(os.getenv('AUDIT_PAGE_SIZE', 100))
+DEVICE_ROW_CACHE_TIMEOUT = int(os.getenv('DEVICE_ROW_CACHE_TIMEOUT', 24 * 60 * 60))  # seconds
+# Выше этого числа строк пагинаторы показывают оценку вместо точного COUNT(*).
+EXACT_COUNT_LIMIT = int(os.getenv('EXACT_COUNT_LIMIT', 10000))
+COUNT_CACHE_TIMEOUT = int(os.getenv('COUNT_CACHE_TIMEOUT', 300))  # seconds
+
+# Живая лента событий (SSE): период опроса журнала, время жизни одного соединения, хранение.
+# Долгое соединение держится только под ASGI (uvicorn/daphne). Под WSGI — gunicorn из Procfile —
+# каждый запрос отвечает сразу, и браузер переподключается раз в DEVICE_EVENTS_POLL_INTERVAL:
+# синхронный воркер не занят открытой вкладкой. Окно перечитывания ловит события, закоммиченные
+# позже событий с бо́льшим id; оно должно быть длиннее самой долгой транзакции с записью события.
+DEVICE_EVENTS_POLL_INTERVAL = float(os.getenv('DEVICE_EVENTS_POLL_INTERVAL', 2))  # seconds
+DEVICE_EVENTS_STREAM_TIMEOUT = int(os.getenv('DEVICE_EVENTS_STREAM_TIMEOUT', 300))  # seconds
+DEVICE_EVENTS_RETENTION_DAYS = int(os.getenv('DEVICE_EVENTS_RETENTION_DAYS', 7))
+DEVICE_EVENTS_REORDER_WINDOW = int(os.getenv('DEVICE_EVENTS_REORDER_WINDOW', 10))  # seconds
 
-MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
+# Сообщения живут в cookie, в сессию попадают только не поместившиеся — обычный запрос сессию не пишет.
+MESSAGE_STORAGE = 'django.contrib.messages.storage.fallback.FallbackStorage'
+# Сессии читаются из кэша. Если сам кэш лежит в базе (DatabaseCache), cached_db на промахе писал бы
+# в таблицу кэша при каждом GET, поэтому тогда остаёмся на обычных сессиях в БД.
+SESSION_ENGINE = os.getenv('SESSION_ENGINE') or (
+    'django.contrib.sessions.backends.db'
+    if CACHES['default']['BACKEND'].endswith('DatabaseCache')
+    else 'django.contrib.sessions.backends.cached_db'
+)
 
 # IMEICheck API integration
 IMEICHECK_API_KEY = os.getenv('IMEICHECK_API_KEY', 'E8A7-735F-D0C3-EB25-C1A4-44ZE')
@@ -135,6 +250,32 @@ IMEICHECK_API_URL = os.getenv(
 )
 IMEICHECK_RATE_LIMIT = int(os.getenv('IMEICHECK_RATE_LIMIT', 30))
 IMEICHECK_RATE_WINDOW = int(os.getenv('IMEICHECK_RATE_WINDOW', 60))  # seconds
+# Справедливое деление лимита: пакетный поиск и фоновое обновление берут не больше своей доли,
+# а каждому оператору минуты (и одному новому) зарезервировано OPERATOR_FLOOR вызовов —
+# сверх резерва оператор берёт только то, что не нужно резервам других (см. services._hit_rate_limit).
+IMEICHECK_PRIORITY_SHARES = {
+    'interactive': 1.0,
+    'background': float(os.getenv('IMEICHECK_BACKGROUND_SHARE', 0.8)),
+    'warmup': float(os.getenv('IMEICHECK_WARMUP_SHARE', 0.5)),
+}
+IMEICHECK_OPERATOR_FLOOR = int(os.getenv('IMEICHECK_OPERATOR_FLOOR', max(1, IMEICHECK_RATE_LIMIT // 10)))
+# Успешный ответ свежий SOFT_TTL секунд, затем отдаётся устаревшим (с фоновым обновлением) до HARD_TTL.
+IMEICHECK_CACHE_SOFT_TTL = int(os.getenv('IMEICHECK_CACHE_SOFT_TTL', 24 * 60 * 60))
+IMEICHECK_CACHE_HARD_TTL = int(os.getenv('IMEICHECK_CACHE_HARD_TTL', 30 * 24 * 60 * 60))
+IMEICHECK_BACKGROUND_REFRESH = os.getenv('IMEICHECK_BACKGROUND_REFRESH', 'true').lower() == 'true'
+# Одновременные запросы одной модели (TAC — первые 8 цифр IMEI) объединяются в один вызов API.
+IMEICHECK_SHARE_BY_TAC = os.getenv('IMEICHECK_SHARE_BY_TAC', 'true').lower() == 'true'
+IMEICHECK_INFLIGHT_TIMEOUT = int(os.getenv('IMEICHECK_INFLIGHT_TIMEOUT', 15))  # seconds
+# Пакетный поиск: параллельные запросы к API и максимальный размер пакета.
+IMEICHECK_BATCH_WORKERS = int(os.getenv('IMEICHECK_BATCH_WORKERS', 4))
+IMEICHECK_BATCH_MAX = int(os.getenv('IMEICHECK_BATCH_MAX', 500))
+# Негативный кэш ошибок по классу ошибки (секунды, 0 — не кэшировать).
+IMEICHECK_NEGATIVE_TTL = {
+    'not_found': int(os.getenv('IMEICHECK_NEGATIVE_TTL_NOT_FOUND', 6 * 60 * 60)),
+    'bad_response': int(os.getenv('IMEICHECK_NEGATIVE_TTL_BAD_RESPONSE', 5 * 60)),
+    'unavailable': int(os.getenv('IMEICHECK_NEGATIVE_TTL_UNAVAILABLE', 60)),
+    'network': int(os.getenv('IMEICHECK_NEGATIVE_TTL_NETWORK', 30)),
+}
 
 # ДОБАВИТЬ НАСТРОЙКИ БЕЗОПАСНОСТИ ДЛЯ ПРОДАКШЕНА:
 if not DEBUG:
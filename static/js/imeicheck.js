@@ -27,8 +27,52 @@
         return payload;
     }
 
+    function csrfToken() {
+        const match = document.cookie.split(';').map(c => c.trim()).find(c => c.startsWith('csrftoken='));
+        return match ? decodeURIComponent(match.substring('csrftoken='.length)) : '';
+    }
+
+    // Пакетный поиск: один запрос на весь список, сервер сам группирует по TAC.
+    // Возвращает { results, deferred }; deferred — IMEI, отложенные из-за лимита API.
+    async function lookupMany(imeis, endpoint) {
+        const pending = [...new Set((imeis || []).map(imei => (imei || '').trim()))]
+            .filter(imei => !cache.has(imei));
+        let deferred = [];
+
+        if (pending.length) {
+            const response = await fetch(new URL(endpoint, window.location.origin), {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': csrfToken()
+                },
+                body: JSON.stringify({ imeis: pending })
+            });
+            const payload = await response.json();
+            if (!response.ok || !payload.success) {
+                throw new Error(payload.error || 'Не удалось выполнить пакетный поиск');
+            }
+            Object.entries(payload.results).forEach(([imei, item]) => {
+                if (item.success) {
+                    cache.set(imei, item);
+                }
+            });
+            deferred = payload.deferred || [];
+        }
+
+        const results = {};
+        (imeis || []).forEach(imei => {
+            const normalized = (imei || '').trim();
+            if (cache.has(normalized)) {
+                results[normalized] = cache.get(normalized);
+            }
+        });
+        return { results, deferred };
+    }
+
     window.ImeiLookup = {
         lookup,
+        lookupMany,
         clearCache: () => cache.clear()
     };
 })();
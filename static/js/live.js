@@ -0,0 +1,109 @@
+// Живые обновления дашборда и списка устройств через server-sent events.
+(() => {
+    const config = window.LIVE_UPDATES;
+    if (!config || !window.EventSource) return;
+
+    const escapeHtml = (value) => String(value ?? '').replace(/[&<>"']/g, (ch) => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    }[ch]));
+
+    const badgeClass = {
+        in_stock: 'bg-success',
+        sold: 'bg-primary',
+        trash: 'bg-warning'
+    };
+
+    // Счётчики дашборда: data-live-counter="total|in_stock|sold|written_off|trash"
+    function bumpCounter(name, delta) {
+        document.querySelectorAll(`[data-live-counter="${name}"]`).forEach((elem) => {
+            const value = parseInt(elem.textContent, 10);
+            if (!Number.isNaN(value)) {
+                elem.textContent = Math.max(0, value + delta);
+            }
+        });
+    }
+
+    function prependRecentRow(event) {
+        const body = document.getElementById('recentDevicesBody');
+        if (!body || !config.recentLimit) return;
+        const row = document.createElement('tr');
+        row.dataset.deviceId = event.device_id;
+        row.innerHTML = `
+            <td><code>${escapeHtml(event.imei)}</code></td>
+            <td>${escapeHtml(event.model_name || 'Не указана')}</td>
+            <td><span class="badge badge-status ${badgeClass[event.status] || 'bg-secondary'}">${escapeHtml(event.status_label)}</span></td>
+            <td>${escapeHtml(event.date_added)}</td>
+            <td>${escapeHtml(event.added_by)}</td>
+        `;
+        body.prepend(row);
+        if (config.recentLimit && body.children.length > config.recentLimit) {
+            body.lastElementChild.remove();
+        }
+    }
+
+    function updateRow(event) {
+        document.querySelectorAll(`tr[data-device-id="${event.device_id}"]`).forEach((row) => {
+            if (event.type === 'trashed' && config.hideTrashed) {
+                row.remove();
+                return;
+            }
+            const select = row.querySelector('.status-selector');
+            if (select) {
+                select.value = event.status;
+                select.dataset.originalValue = event.status;
+            }
+            const badge = row.querySelector('.badge');
+            if (badge && !select) {
+                badge.className = `badge badge-status ${badgeClass[event.status] || 'bg-secondary'}`;
+                badge.textContent = event.status_label;
+            }
+        });
+    }
+
+    function announceNewDevices() {
+        const banner = document.getElementById('liveUpdatesBanner');
+        if (!banner) return;
+        const count = (parseInt(banner.dataset.count || '0', 10) || 0) + 1;
+        banner.dataset.count = count;
+        banner.querySelector('[data-live-count]').textContent = count;
+        banner.hidden = false;
+    }
+
+    function handle(event) {
+        if (event.type === 'created') {
+            bumpCounter('total', 1);
+            bumpCounter(event.status, 1);
+            prependRecentRow(event);
+            announceNewDevices();
+        } else if (event.type === 'deleted') {
+            bumpCounter('total', -1);
+            bumpCounter(event.status, -1);
+            document.querySelectorAll(`tr[data-device-id="${event.device_id}"]`).forEach((row) => row.remove());
+        } else {
+            bumpCounter(event.previous_status, -1);
+            bumpCounter(event.status, 1);
+            updateRow(event);
+        }
+    }
+
+    // Сервер повторно присылает недавние события (поздние коммиты), применяем каждое один раз.
+    const applied = new Set();
+    function firstTime(event) {
+        if (applied.has(event.event_id)) return false;
+        applied.add(event.event_id);
+        if (applied.size > 1000) {
+            applied.delete(applied.values().next().value);
+        }
+        return true;
+    }
+
+    const source = new EventSource(config.endpoint);
+    source.addEventListener('device', (message) => {
+        try {
+            const event = JSON.parse(message.data);
+            if (firstTime(event)) handle(event);
+        } catch (error) {
+            console.error('Ошибка обработки события:', error);
+        }
+    });
+})();
@@ -1,4 +1,103 @@
 // Сканер IMEI с подтверждением и автозаполнением
+// Локальная копия множества IMEI из базы: мгновенная проверка дубликатов при сканировании.
+// Сервер всё равно проверяет уникальность при добавлении.
+class ImeiSnapshot {
+    static STORAGE_KEY = 'imeiSnapshot';
+    static REFRESH_MS = 60000;
+
+    constructor(endpoint) {
+        this.endpoint = endpoint;
+        this.version = null;
+        this.imeis = new Float64Array(0);
+        this.restore();
+        if (this.endpoint) {
+            this.refresh();
+            setInterval(() => this.refresh(), ImeiSnapshot.REFRESH_MS);
+        }
+    }
+
+    static decode(data) {
+        const binary = atob(data || '');
+        const view = new DataView(new ArrayBuffer(binary.length));
+        for (let i = 0; i < binary.length; i++) {
+            view.setUint8(i, binary.charCodeAt(i));
+        }
+        const values = new Float64Array(binary.length / 8);
+        for (let i = 0; i < values.length; i++) {
+            values[i] = Number(view.getBigUint64(i * 8, true));
+        }
+        return values;
+    }
+
+    restore() {
+        try {
+            const stored = JSON.parse(localStorage.getItem(ImeiSnapshot.STORAGE_KEY) || 'null');
+            if (stored) {
+                this.version = stored.version;
+                this.imeis = Float64Array.from(stored.imeis);
+            }
+        } catch (error) {
+            localStorage.removeItem(ImeiSnapshot.STORAGE_KEY);
+        }
+    }
+
+    persist() {
+        try {
+            localStorage.setItem(ImeiSnapshot.STORAGE_KEY, JSON.stringify({
+                version: this.version,
+                imeis: Array.from(this.imeis)
+            }));
+        } catch (error) {
+            // Переполнение localStorage: просто работаем без сохранения.
+        }
+    }
+
+    async refresh() {
+        const url = this.version === null ? this.endpoint : `${this.endpoint}?since=${this.version}`;
+        try {
+            const response = await fetch(url, { credentials: 'same-origin' });
+            if (!response.ok) return;
+            this.apply(await response.json());
+        } catch (error) {
+            console.warn('Не удалось обновить список IMEI:', error);
+        }
+    }
+
+    apply(data) {
+        if (data.full) {
+            this.imeis = ImeiSnapshot.decode(data.imeis);
+        } else {
+            const removed = new Set(ImeiSnapshot.decode(data.removed));
+            const merged = Array.from(this.imeis).filter((value) => !removed.has(value));
+            merged.push(...ImeiSnapshot.decode(data.added));
+            this.imeis = Float64Array.from(new Set(merged)).sort();
+        }
+        this.version = data.version;
+        this.persist();
+    }
+
+    add(imei) {
+        if (this.has(imei)) return;
+        const merged = Array.from(this.imeis);
+        merged.push(Number(imei));
+        this.imeis = Float64Array.from(merged).sort();
+    }
+
+    has(imei) {
+        const target = Number(imei);
+        let low = 0;
+        let high = this.imeis.length - 1;
+        while (low <= high) {
+            const mid = (low + high) >> 1;
+            const value = this.imeis[mid];
+            if (value === target) return true;
+            if (value < target) low = mid + 1;
+            else high = mid - 1;
+        }
+        return false;
+    }
+}
+
 class IMEIScanner {
     constructor() {
         this.scannedIMEIs = new Set();
@@ -6,6 +105,7 @@ class IMEIScanner {
         this.isScanning = false;
         this.bootstrapModal = null;
         this.currentIMEI = null;
+        this.knownIMEIs = new ImeiSnapshot(window.SCANNER_ENDPOINTS?.snapshot);
 
         this.initializeElements();
         this.initializeEventListeners();
@@ -164,6 +264,11 @@ class IMEIScanner {
             this.showStatus(`⚠️ IMEI ${imei} уже был добавлен`, 'warning');
             return;
         }
+        // Снимок может отставать (устройство удалили): отказываем, только если сервер подтвердил дубликат.
+        if (this.knownIMEIs.has(imei) && await this.confirmDuplicate(imei)) {
+            this.showStatus(`⚠️ IMEI ${imei} уже есть в базе`, 'warning');
+            return;
+        }
 
         this.currentIMEI = imei;
         this.modalImei.value = imei;
@@ -182,6 +287,21 @@ class IMEIScanner {
         this.lookupModelByImei(imei);
     }
 
+    async confirmDuplicate(imei) {
+        if (!window.SCANNER_ENDPOINTS) return false;
+        const url = new URL(window.SCANNER_ENDPOINTS.lookup, window.location.origin);
+        url.searchParams.set('imei', imei);
+        url.searchParams.set('check_exists', '1');
+        try {
+            const response = await fetch(url);
+            const payload = await response.json();
+            return Boolean(response.ok && payload.exists);
+        } catch (error) {
+            // Нет связи: пусть решает сервер при сохранении, он дубликат не пропустит.
+            return false;
+        }
+    }
+
     async lookupModelByImei(imei) {
         if (!window.ImeiLookup || !window.SCANNER_ENDPOINTS) return;
 
@@ -232,6 +352,7 @@ class IMEIScanner {
                 throw new Error(response.error || 'Не удалось сохранить устройство');
             }
             this.scannedIMEIs.add(this.currentIMEI);
+            this.knownIMEIs.add(this.currentIMEI);
             this.flashScreen();
             this.addToScannedList(this.currentIMEI, response.model_name);
             this.showStatus(`✅ Устройство ${this.currentIMEI} успешно добавлено!`, 'success');
@@ -31,7 +31,7 @@ document.addEventListener('change', (event) => {
             'Content-Type': 'application/x-www-form-urlencoded',
             'X-CSRFToken': getCookie('csrftoken') || '',
         },
-        body: new URLSearchParams({status: value}),
+        body: new URLSearchParams({status: value, expected_status: previousValue}),
     })
         .then((response) => {
             if (!response.ok) throw response;
@@ -45,11 +45,18 @@ document.addEventListener('change', (event) => {
         })
         .catch(async (error) => {
             select.value = previousValue;
-            showToast('Ошибка при обновлении статуса', true);
-            if (error.json) {
-                const info = await error.json();
-                console.error(info);
+            const info = error.json ? await error.json() : null;
+            if (error.status === 409 && info) {
+                // Кто-то уже поменял статус: показываем актуальный вместо перезаписи.
+                if (info.status) {
+                    select.value = info.status;
+                    select.dataset.originalValue = info.status;
+                }
+                showToast(info.error, true);
+                return;
             }
+            showToast('Ошибка при обновлении статуса', true);
+            if (info) console.error(info);
         });
 });
 